@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Scaling report for data-parallel CPU training of the BERT classifier.
+
+Runs trainBertclassifier.py under torchrun with 1, 2, 4 and 8 local processes
+(gloo backend), one epoch each, and reports training throughput, speedup and
+parallel efficiency relative to the single-process run.
+
+Run with:
+    python3 bert_scaling_report.py --procs 1 2 4 8 --epochs 1
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "benchmark_results")
+
+
+def run_training(nproc, epochs, workdir):
+    """Train with nproc local processes; returns the rank-0 metrics dict."""
+    metrics_path = os.path.join(workdir, f"metrics_{nproc}.json")
+    model_dir = os.path.join(workdir, f"model_{nproc}")
+    cmd = [
+        sys.executable, "-m", "torch.distributed.run", "--standalone", f"--nproc_per_node={nproc}",
+        os.path.join(HERE, "trainBertclassifier.py"),
+        "--epochs", str(epochs),
+        "--output-dir", model_dir,
+        "--metrics-out", metrics_path,
+        # keep the project's label_encoder.joblib, which the clustering scripts load
+        "--label-encoder-out", os.path.join(model_dir, "label_encoder.joblib"),
+    ]
+    print(f"🚀 {' '.join(cmd)}")
+    subprocess.run(cmd, cwd=HERE, check=True)
+    with open(metrics_path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BERT data-parallel CPU scaling report")
+    parser.add_argument("--procs", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--epochs", type=float, default=1)
+    parser.add_argument("--output", default=None, help="JSON report path (default: benchmark_results/bert_scaling_<ts>.json)")
+    args = parser.parse_args()
+
+    started = datetime.now(timezone.utc)
+    rows = []
+    # checkpoints from the runs are throwaway; the real one comes from a normal training run
+    with tempfile.TemporaryDirectory(prefix="bert_scaling_") as workdir:
+        for n in args.procs:
+            m = run_training(n, args.epochs, workdir)
+            rows.append({
+                "processes": n,
+                "samples_per_sec": m["train"].get("train_samples_per_second", 0.0),
+                "runtime_s": m["train"].get("train_runtime", 0.0),
+                "eval_accuracy": m["eval"].get("eval_accuracy"),
+            })
+
+    base = next((r for r in rows if r["processes"] == 1), rows[0])
+    for r in rows:
+        r["speedup"] = r["samples_per_sec"] / base["samples_per_sec"] if base["samples_per_sec"] else 0.0
+        r["efficiency"] = r["speedup"] * base["processes"] / r["processes"]
+
+    print(f"\n📊 BERT data-parallel scaling ({os.cpu_count()} CPUs, {args.epochs} epoch(s))")
+    print(f"{'procs':>5} {'samples/s':>10} {'runtime':>9} {'speedup':>8} {'eff':>6} {'acc':>6}")
+    for r in rows:
+        acc = f"{r['eval_accuracy']:.3f}" if r["eval_accuracy"] is not None else "-"
+        print(f"{r['processes']:>5} {r['samples_per_sec']:>10.1f} {r['runtime_s']:>8.1f}s "
+              f"{r['speedup']:>7.2f}x {r['efficiency']:>5.0%} {acc:>6}")
+
+    output = args.output or os.path.join(RESULTS_DIR, "bert_scaling_" + started.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"started_at": started.isoformat(), "cpu_count": os.cpu_count(),
+                   "epochs": args.epochs, "results": rows}, f, indent=2)
+    print(f"\n✅ Saved scaling report to {output}")
+
+
+if __name__ == "__main__":
+    main()
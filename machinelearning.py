@@ -1,20 +1,31 @@
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
 import numpy as np
+import scipy.sparse as sp
+import sys
+from server.cluster_selection import select_cluster_count
+from server.cluster_model import ClusterModel, KEYWORD_CLUSTERS_PATH, place_transactions, append_csv, print_drift
 
 FILENAME = "stmt.csv"
+OUTPUT = "stmt_clustered_labeled.csv"
 MAX_CLUSTERS = 10
 
 def get_top_keywords_per_cluster(tfidf_matrix, labels, vectorizer, top_n=3):
-    df = pd.DataFrame(tfidf_matrix.todense()).groupby(labels).mean()
+    # per-cluster mean TF-IDF via a sparse (clusters x rows) indicator product: memory scales with non-zeros
+    clusters, codes = np.unique(np.asarray(labels), return_inverse=True)
+    indicator = sp.csr_matrix((np.ones(len(codes)), (codes, np.arange(len(codes)))),
+                              shape=(len(clusters), tfidf_matrix.shape[0]))
+    sizes = np.asarray(indicator.sum(axis=1))
+    means = (indicator @ tfidf_matrix).toarray() / sizes
     terms = vectorizer.get_feature_names_out()
+    n = min(top_n, means.shape[1])
     top_keywords = {}
-    for i, row in df.iterrows():
-        top_indices = row.argsort()[::-1][:top_n]
-        keywords = [terms[idx] for idx in top_indices]
-        top_keywords[i] = ", ".join(keywords)
+    for cluster, row in zip(clusters, means):
+        top = np.argpartition(-row, n - 1)[:n] if n < len(row) else np.arange(len(row))
+        # highest mean first; ties go to the later term, as with a reversed argsort
+        top = top[np.lexsort((-top, -row[top]))]
+        top_keywords[cluster] = ", ".join(terms[idx] for idx in top)
     return top_keywords
 
 def generate_cluster_label(keywords):
@@ -48,15 +59,8 @@ def cluster_descriptions():
     X = vectorizer.fit_transform(descriptions)
 
     # Determine best number of clusters
-    best_k = 2
-    best_score = -1
-    for k in range(2, min(MAX_CLUSTERS, len(descriptions)) + 1):
-        kmeans = KMeans(n_clusters=k, random_state=42)
-        labels = kmeans.fit_predict(X)
-        score = silhouette_score(X, labels)
-        if score > best_score:
-            best_k = k
-            best_score = score
+    best_k, _ = select_cluster_count(X, range(2, MAX_CLUSTERS + 1), verbose=False)
+    best_k = best_k or 2
 
     print(f"\nBest number of clusters: {best_k}")
     kmeans = KMeans(n_clusters=best_k, random_state=42)
@@ -80,8 +84,27 @@ def cluster_descriptions():
             print(f" - {desc}")
 
     # Save to CSV
-    df.to_csv("stmt_clustered_labeled.csv", index=False)
-    print("\nClustered and labeled data saved to stmt_clustered_labeled.csv")
+    df.to_csv(OUTPUT, index=False)
+    print(f"\nClustered and labeled data saved to {OUTPUT}")
+
+    # Keep the fitted clusters so later statements can be added without reclustering
+    labels = [generate_cluster_label(top_keywords[c].split(", ")) for c in range(best_k)]
+    ClusterModel.from_fit(vectorizer, kmeans, X, labels).save(KEYWORD_CLUSTERS_PATH)
+    print(f"Cluster model saved to {KEYWORD_CLUSTERS_PATH}")
+
+def add_transactions(filename):
+    """Place the rows of filename into the saved clusters and append them to the labeled CSV."""
+    df = pd.read_csv(filename, on_bad_lines='skip')
+    model, clusters, drift = place_transactions(KEYWORD_CLUSTERS_PATH, df["Description"].fillna(""))
+    df["Cluster"] = clusters
+    df["Cluster_Label"] = [model.labels[c] for c in clusters]
+    append_csv(df, OUTPUT)
+    print(f"Added {len(df)} transactions to {OUTPUT}")
+    print_drift(drift)
 
 if __name__ == "__main__":
-    cluster_descriptions()
+    # python machinelearning.py --add new.csv: assign new rows to the saved clusters instead of refitting
+    if len(sys.argv) > 2 and sys.argv[1] == "--add":
+        add_transactions(sys.argv[2])
+    else:
+        cluster_descriptions()
@@ -10,27 +10,76 @@ import joblib
 from collections import Counter
 from sklearn.metrics import silhouette_score
 import sys
+import os
+from server.embedding_cache import EmbeddingCache, cached_forward, model_version, CACHE_DIR
+from server.inference_client import InferenceClient
+from server.bert_stream import classify_streaming, progress_path, discard_progress
 
 # ✅ Accept filename from command-line
 FILENAME = sys.argv[1] if len(sys.argv) > 1 else "stmt.csv"
+OUTPUT = "stmt_clustered_labeled.csv"
 MIN_SUBCLUSTERS = 2
 MAX_SUBCLUSTERS = 5
+# processes for per-category subclustering (0 = one per core)
+SUBCLUSTER_WORKERS = int(os.environ.get("SUBCLUSTER_WORKERS", 0)) or (os.cpu_count() or 1)
 
 bert_model_dir = "./bert_expense_classifier"
-bert_tokenizer = AutoTokenizer.from_pretrained(bert_model_dir)
-bert_model = AutoModelForSequenceClassification.from_pretrained(bert_model_dir)
-bert_model.eval()
-
 label_encoder = joblib.load("label_encoder.joblib")
 
-def classify_with_bert(descriptions):
-    inputs = bert_tokenizer(list(descriptions), padding=True, truncation=True, max_length=128, return_tensors="pt")
+# Loaded lazily: when the shared inference daemon is running we never need our own copy
+bert_tokenizer = None
+bert_model = None
+bert_cache = None
+bert_use_daemon = True  # cleared once the daemon fails, so later chunks go straight to the local model
+BERT_BATCH_SIZE = 64
+
+def _load_bert():
+    global bert_tokenizer, bert_model, bert_cache
+    if bert_model is not None:
+        return
+    bert_tokenizer = AutoTokenizer.from_pretrained(bert_model_dir)
+    bert_model = AutoModelForSequenceClassification.from_pretrained(bert_model_dir)
+    bert_model.eval()
+    # Shared with the API's BERT refiner: descriptions seen before are served from disk
+    bert_cache = EmbeddingCache(
+        os.path.join(CACHE_DIR, model_version(bert_model_dir) + ".bin"),
+        dim=bert_model.config.hidden_size,
+        n_labels=len(label_encoder.classes_),
+    )
+
+def _bert_forward(texts):
+    embs, logits = [], []
     with torch.no_grad():
-        outputs = bert_model(**inputs)
-        preds = torch.argmax(outputs.logits, dim=1).cpu().numpy()
+        for start in range(0, len(texts), BERT_BATCH_SIZE):
+            inputs = bert_tokenizer(texts[start:start + BERT_BATCH_SIZE], padding=True, truncation=True, max_length=128, return_tensors="pt")
+            outputs = bert_model(**inputs, output_hidden_states=True)
+            embs.append(outputs.hidden_states[-1][:, 0, :].cpu().numpy())
+            logits.append(outputs.logits.cpu().numpy())
+    return np.vstack(embs), np.vstack(logits)
+
+def _classify_chunk(descriptions):
+    global bert_use_daemon
+    client = InferenceClient.connect_if_running() if bert_use_daemon else None
+    if client is not None:
+        try:
+            labels, logits, _ = client.encode(descriptions)
+            return np.asarray(labels, dtype=object)[logits.argmax(axis=1)]
+        except (OSError, RuntimeError) as e:
+            print(f"Inference daemon unavailable ({e}); loading BERT locally")
+            bert_use_daemon = False
+    _load_bert()
+    _, logits = cached_forward(descriptions, _bert_forward, bert_cache)
+    preds = logits.argmax(axis=1)
     categories = label_encoder.inverse_transform(preds)
     return categories
 
+def classify_with_bert(descriptions, progress=None):
+    """BERT category per description, streamed in bounded chunks; with a progress file an interrupted run resumes."""
+    return classify_streaming(descriptions, _classify_chunk, progress)
+
+def bert_progress_path(descriptions):
+    return progress_path(descriptions, model_version(bert_model_dir))
+
 def choose_optimal_clusters(features, min_k=MIN_SUBCLUSTERS, max_k=MAX_SUBCLUSTERS):
     best_k = min_k
     best_score = -1
@@ -59,6 +108,39 @@ def cluster_subgroups_within_category(category_df, category_name):
 
     return pd.Series([f"{category_name}_Sub{label}" for label in cluster_labels]), kmeans
 
+def _init_subcluster_worker(threads):
+    # KMeans is multi-threaded itself; split the cores between the worker processes
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(threads)
+
+def _subcluster_task(item):
+    category, category_df = item
+    labels, _ = cluster_subgroups_within_category(category_df, category)
+    return category, labels.tolist()
+
+def subcluster_all_categories(df):
+    """Subcluster label per row of df, computed per BERT category in a process pool."""
+    groups = [(category, df.loc[df["BERT_Category"] == category, ["Description"]])
+              for category in df["BERT_Category"].unique()]
+    # biggest categories first, so the longest fits start right away and small ones fill in around them
+    groups.sort(key=lambda g: len(g[1]), reverse=True)
+    index = {category: category_df.index for category, category_df in groups}
+    workers = min(SUBCLUSTER_WORKERS, len(groups))
+
+    labels = pd.Series(index=df.index, dtype=object)
+    def collect(results):
+        for category, category_labels in results:
+            labels.loc[index[category]] = category_labels
+
+    if workers <= 1:
+        collect(map(_subcluster_task, groups))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_subcluster_worker,
+                                 initargs=(max(1, (os.cpu_count() or 1) // workers),)) as pool:
+            collect(pool.map(_subcluster_task, groups))
+    return labels
+
 def summarize_by_category(df):
     print("\n📊 Category Summary:")
     summary = []
@@ -117,25 +199,22 @@ def classify_and_subcluster():
     df["Amount"] = pd.to_numeric(df["Amount"], errors='coerce').fillna(0)
 
     print("🔍 Running BERT classification for main categories...")
-    df["BERT_Category"] = classify_with_bert(df["Description"])
+    progress = bert_progress_path(df["Description"])
+    df["BERT_Category"] = classify_with_bert(df["Description"], progress)
 
     print("\n✅ Predicted Main Categories:")
     for cat in sorted(df["BERT_Category"].unique()):
         print(f" - {cat}")
 
     print("\n🔍 Running subclustering within each BERT category...")
-    all_subcluster_labels = []
-    for category in df["BERT_Category"].unique():
-        category_df = df[df["BERT_Category"] == category]
-        subcluster_labels, _ = cluster_subgroups_within_category(category_df, category)
-        all_subcluster_labels.extend(subcluster_labels)
-
-    df["Subcluster_Label"] = all_subcluster_labels
+    # labels are written back by row index, so rows keep their own category's labels
+    df["Subcluster_Label"] = subcluster_all_categories(df)
 
     summarize_by_category(df)
-    df.to_csv("stmt_clustered_labeled.csv", index=False)
+    df.to_csv(OUTPUT, index=False)
+    discard_progress(progress)
 
-    print("\n✅ Saved transactions with BERT categories + subclusters to stmt_clustered_labeled.csv")
+    print(f"\n✅ Saved transactions with BERT categories + subclusters to {OUTPUT}")
 
 if __name__ == "__main__":
     classify_and_subcluster()
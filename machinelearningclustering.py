@@ -4,45 +4,93 @@ import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import OneHotEncoder
-from sklearn.metrics import silhouette_score
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 import joblib
 from collections import Counter, defaultdict
 import sys
-
-FILENAME = sys.argv[1] if len(sys.argv) > 1 else "stmt.csv"
+import os
+from server.embedding_cache import EmbeddingCache, cached_forward, model_version, CACHE_DIR
+from server.inference_client import InferenceClient
+from server.bert_stream import classify_streaming, progress_path, discard_progress
+from server.cluster_selection import select_cluster_count
+from server.cluster_model import ClusterModel, CATEGORY_CLUSTERS_PATH, place_transactions, append_csv, print_drift
+
+# python machinelearningclustering.py --add new.csv: assign new rows to the saved clusters instead of refitting
+# --verbose: print every first-word subgroup
+VERBOSE = "--verbose" in sys.argv
+ARGS = [a for a in sys.argv[1:] if a != "--verbose"]
+ADD_MODE = len(ARGS) > 1 and ARGS[0] == "--add"
+FILENAME = ARGS[1] if ADD_MODE else (ARGS[0] if ARGS else "stmt.csv")
+OUTPUT = "stmt_clusetered_labeled.csv"
 NUM_SAMPLES = 5
 MIN_CLUSTERS = 5
 MAX_CLUSTERS = 15
 
 bert_model_dir = "./bert_expense_classifier"  # your path here
-bert_tokenizer = AutoTokenizer.from_pretrained(bert_model_dir)
-bert_model = AutoModelForSequenceClassification.from_pretrained(bert_model_dir)
-bert_model.eval()
-
 label_encoder = joblib.load("label_encoder.joblib")  # your path here
 
-def classify_with_bert(descriptions):
-    inputs = bert_tokenizer(list(descriptions), padding=True, truncation=True, max_length=128, return_tensors="pt")
+# Loaded lazily: when the shared inference daemon is running we never need our own copy
+bert_tokenizer = None
+bert_model = None
+bert_cache = None
+bert_use_daemon = True  # cleared once the daemon fails, so later chunks go straight to the local model
+BERT_BATCH_SIZE = 64
+
+def _load_bert():
+    global bert_tokenizer, bert_model, bert_cache
+    if bert_model is not None:
+        return
+    bert_tokenizer = AutoTokenizer.from_pretrained(bert_model_dir)
+    bert_model = AutoModelForSequenceClassification.from_pretrained(bert_model_dir)
+    bert_model.eval()
+    # Shared with the API's BERT refiner: descriptions seen before are served from disk
+    bert_cache = EmbeddingCache(
+        os.path.join(CACHE_DIR, model_version(bert_model_dir) + ".bin"),
+        dim=bert_model.config.hidden_size,
+        n_labels=len(label_encoder.classes_),
+    )
+
+def _bert_forward(texts):
+    embs, logits = [], []
     with torch.no_grad():
-        outputs = bert_model(**inputs)
-        preds = torch.argmax(outputs.logits, dim=1).cpu().numpy()
+        for start in range(0, len(texts), BERT_BATCH_SIZE):
+            inputs = bert_tokenizer(texts[start:start + BERT_BATCH_SIZE], padding=True, truncation=True, max_length=128, return_tensors="pt")
+            outputs = bert_model(**inputs, output_hidden_states=True)
+            embs.append(outputs.hidden_states[-1][:, 0, :].cpu().numpy())
+            logits.append(outputs.logits.cpu().numpy())
+    return np.vstack(embs), np.vstack(logits)
+
+def _classify_chunk(descriptions):
+    global bert_use_daemon
+    client = InferenceClient.connect_if_running() if bert_use_daemon else None
+    if client is not None:
+        try:
+            labels, logits, _ = client.encode(descriptions)
+            return np.asarray(labels, dtype=object)[logits.argmax(axis=1)]
+        except (OSError, RuntimeError) as e:
+            print(f"Inference daemon unavailable ({e}); loading BERT locally")
+            bert_use_daemon = False
+    _load_bert()
+    _, logits = cached_forward(descriptions, _bert_forward, bert_cache)
+    preds = logits.argmax(axis=1)
     categories = label_encoder.inverse_transform(preds)
     return categories
 
+def classify_with_bert(descriptions, progress=None):
+    """BERT category per description, streamed in bounded chunks; with a progress file an interrupted run resumes."""
+    return classify_streaming(descriptions, _classify_chunk, progress)
+
+def bert_progress_path(descriptions):
+    return progress_path(descriptions, model_version(bert_model_dir))
+
 def choose_optimal_clusters(features, min_k=MIN_CLUSTERS, max_k=MAX_CLUSTERS):
-    best_k = min_k
-    best_score = -1
-    for k in range(min_k, max_k + 1):
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        labels = kmeans.fit_predict(features)
-        score = silhouette_score(features, labels)
-        print(f"Silhouette score for k={k}: {score:.4f}")
-        if score > best_score:
-            best_score = score
-            best_k = k
-    print(f"Chosen number of clusters: {best_k} with silhouette score {best_score:.4f}")
+    best_k, scores = select_cluster_count(features, range(min_k, max_k + 1))
+    if best_k is None:
+        best_k = min(min_k, features.shape[0])
+        print(f"Too few rows to compare cluster counts; using {best_k}")
+        return best_k
+    print(f"Chosen number of clusters: {best_k} with silhouette score {scores[best_k]:.4f}")
     return best_k
 
 def most_common_category(categories):
@@ -52,6 +100,50 @@ def most_common_category(categories):
     cat, count = c.most_common(1)[0]
     return cat, count
 
+def first_word_keys(descriptions):
+    """Lowercase first word of each description ('unknown' when empty): the subcluster merchant key."""
+    return descriptions.str.split().str[0].str.lower().fillna("unknown")
+
+def label_subclusters(df, verbose=VERBOSE):
+    """
+    Set df["Subcluster_Label"] to the most common BERT category of each row's
+    (main cluster, first word) group, in one grouped pass over all rows.
+    Returns the per-group stats, indexed by (Cluster, First_Word).
+    """
+    keys = pd.DataFrame({"Cluster": df["Cluster"].values, "First_Word": first_word_keys(df["Description"]).values})
+    amount = df["Amount"].values
+    frame = keys.assign(BERT_Category=df["BERT_Category"].values, Amount=amount,
+                        Withdrawals=np.where(amount < 0, amount, 0.0), Deposits=np.where(amount >= 0, amount, 0.0))
+
+    # most common category per group; the stable sort keeps the first-seen category on ties, like Counter
+    category_counts = frame.groupby(["Cluster", "First_Word", "BERT_Category"], sort=False).size()
+    top = (category_counts.rename("category_count").reset_index()
+           .sort_values("category_count", ascending=False, kind="stable")
+           .drop_duplicates(["Cluster", "First_Word"])
+           .set_index(["Cluster", "First_Word"])
+           .rename(columns={"BERT_Category": "most_common_category"}))
+    stats = frame.groupby(["Cluster", "First_Word"]).agg(
+        transaction_count=("Amount", "size"), total_amount=("Amount", "sum"),
+        withdrawals=("Withdrawals", "sum"), deposits=("Deposits", "sum"),
+    ).join(top)
+
+    df["Subcluster_Label"] = stats["most_common_category"].reindex(pd.MultiIndex.from_frame(keys)).values
+
+    if verbose:
+        for main_cluster, groups in stats.groupby(level="Cluster"):
+            print(f"\nMain Cluster {main_cluster} Subgroups by first word:")
+            for (_, first_word), g in groups.iterrows():
+                print(f"  Label: {g['most_common_category']}")
+                print(f"    First word group: '{first_word}'")
+                print(f"    Transactions: {g['transaction_count']}")
+                print(f"    Category Count: {g['category_count']}")
+                print(f"    Total Amount: ${g['total_amount']:.2f}")
+                print(f"    Total Withdrawals: ${g['withdrawals']:.2f}")
+                print(f"    Total Deposits: ${g['deposits']:.2f}")
+    else:
+        print(f"\n{len(stats)} first-word subgroups across {stats.index.get_level_values('Cluster').nunique()} main clusters (--verbose to list them)")
+    return stats
+
 def cluster_descriptions():
     df = pd.read_csv(FILENAME, on_bad_lines='skip')
     df["Description"] = df["Description"].fillna("")
@@ -72,7 +164,8 @@ def cluster_descriptions():
     descriptions = df["Description"].tolist()
 
     print("🔍 Running BERT classification on descriptions...")
-    df["BERT_Category"] = classify_with_bert(descriptions)
+    progress = bert_progress_path(descriptions)
+    df["BERT_Category"] = classify_with_bert(descriptions, progress)
 
     encoder = OneHotEncoder(sparse_output=True)
     bert_cat_encoded = encoder.fit_transform(df[["BERT_Category"]])
@@ -117,61 +210,47 @@ def cluster_descriptions():
         print(f"  Total Amount: ${stats['total_amount']:.2f}")
 
     # Subclusters grouped by first word of description inside each main cluster
-    subcluster_labels = {}
-    subcluster_stats = {}
-
-    for main_cluster in sorted(df["Cluster"].unique()):
-        cluster_df = df[df["Cluster"] == main_cluster].copy()
-        # Extract first word (lowercase) from description or 'Unknown'
-        cluster_df["First_Word"] = cluster_df["Description"].str.split().str[0].str.lower().fillna("unknown")
-
-        # Group by this first word
-        grouped = cluster_df.groupby("First_Word")
-
-        print(f"\nMain Cluster {main_cluster} Subgroups by first word:")
-
-        for first_word, group in grouped:
-            cats = group["BERT_Category"]
-            cat, cat_count = most_common_category(cats)
-            count = len(group)
-            total_spent = group["Amount"].sum()
-            withdrawals = group[group["Amount"] < 0]["Amount"].sum()
-            deposits = group[group["Amount"] >= 0]["Amount"].sum()
-
-            label = cat  # Label subcluster by most common BERT category
-
-            print(f"  Label: {label}")
-            print(f"    First word group: '{first_word}'")
-            print(f"    Transactions: {count}")
-            print(f"    Category Count: {cat_count}")
-            print(f"    Total Amount: ${total_spent:.2f}")
-            print(f"    Total Withdrawals: ${withdrawals:.2f}")
-            print(f"    Total Deposits: ${deposits:.2f}")
-
-            # Save subcluster stats for later if needed
-            subcluster_labels[(main_cluster, first_word)] = label
-            subcluster_stats[(main_cluster, first_word)] = {
-                "most_common_category": label,
-                "category_count": cat_count,
-                "transaction_count": count,
-                "total_amount": total_spent,
-                "withdrawals": withdrawals,
-                "deposits": deposits,
-            }
-
-    # Save detailed output CSV with main cluster and subcluster (first word) labels
-    # Map subcluster label per row
-    def get_subcluster_label(row):
-        return subcluster_labels.get(
-            (row["Cluster"], row["Description"].split()[0].lower() if len(row["Description"].split()) > 0 else "unknown"),
-            "Unknown"
-        )
-
-    df["Subcluster_Label"] = df.apply(get_subcluster_label, axis=1)
-
-    df.to_csv("stmt_clusetered_labeled.csv", index=False)
+    subcluster_stats = label_subclusters(df)
+    subcluster_labels = subcluster_stats["most_common_category"].to_dict()
+
+    df.to_csv(OUTPUT, index=False)
+    discard_progress(progress)
 
     print("\n✅ Saved detailed transactions with first-word subclusters to stmt_bert_tfidf_clusters_firstword_subclusters.csv")
 
+    # Keep the fitted clusters so later statements can be added without reclustering
+    model = ClusterModel.from_fit(
+        vectorizer, kmeans, combined_features,
+        [cluster_labels[c] for c in range(num_main_clusters)],
+        categories=[str(c) for c in encoder.categories_[0]],
+        meta={"subclusters": {f"{c} {word}": label for (c, word), label in subcluster_labels.items()}},
+    )
+    model.save(CATEGORY_CLUSTERS_PATH)
+    print(f"💾 Cluster model saved to {CATEGORY_CLUSTERS_PATH}")
+
+def add_transactions(filename):
+    """BERT-classify only the rows of filename, place them into the saved clusters and append them."""
+    df = pd.read_csv(filename, on_bad_lines='skip')
+    df["Description"] = df["Description"].fillna("")
+    df["Amount"] = pd.to_numeric(df["Amount"], errors='coerce').fillna(0)
+
+    print("🔍 Running BERT classification on new descriptions...")
+    progress = bert_progress_path(df["Description"])
+    df["BERT_Category"] = classify_with_bert(df["Description"].tolist(), progress)
+    model, clusters, drift = place_transactions(CATEGORY_CLUSTERS_PATH, df["Description"], df["BERT_Category"])
+    df["Cluster"] = clusters
+    df["Cluster_Label"] = [model.labels[c] for c in clusters]
+    first_words = first_word_keys(df["Description"])
+    subclusters = model.meta.get("subclusters", {})
+    df["Subcluster_Label"] = [subclusters.get(f"{c} {w}", "Unknown") for c, w in zip(clusters, first_words)]
+
+    append_csv(df, OUTPUT)
+    discard_progress(progress)
+    print(f"\n✅ Added {len(df)} transactions to {OUTPUT}")
+    print_drift(drift)
+
 if __name__ == "__main__":
-    cluster_descriptions()
+    if ADD_MODE:
+        add_transactions(FILENAME)
+    else:
+        cluster_descriptions()
@@ -1,27 +1,41 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import io, csv
+import io, csv, os
 import pandas as pd
 import numpy as np
 
 # Handle both relative and absolute imports
 try:
     # Try relative imports first (when running as package)
-    from .nlp_refiner import predict_descriptions, learn_feedback, labels as nlp_labels
+    from .nlp_refiner import (predict_descriptions, learn_feedback, labels as nlp_labels, start_model_watcher,
+                              index_descriptions, similar_transactions)
+    from .similarity import format_id, parse_id
+    from .retrain import RetrainScheduler
     from .savings import get_savings_suggestions
     from .machinelearningclassification import predict_categories
     from .spending_analyzer import SpendingAnalyzer
     from .web_scraper import WebScraper
     from .bert_refiner import refine_uncategorized_with_bert, get_bert_model_info
+    from .microbatch import MicroBatcher
+    from .jobs import JobRunner
+    from .clustering import (prepare_rows, dataset_key, cached_result, run_clustering, mark_pending, is_pending,
+                             failure)
     BERT_AVAILABLE = True
 except ImportError:
     # Fall back to absolute imports (when running directly)
-    from nlp_refiner import predict_descriptions, learn_feedback, labels as nlp_labels
+    from nlp_refiner import (predict_descriptions, learn_feedback, labels as nlp_labels, start_model_watcher,
+                             index_descriptions, similar_transactions)
+    from similarity import format_id, parse_id
+    from retrain import RetrainScheduler
     from savings import get_savings_suggestions
     from machinelearningclassification import predict_categories
     from spending_analyzer import SpendingAnalyzer
     from web_scraper import WebScraper
     from bert_refiner import refine_uncategorized_with_bert, get_bert_model_info
+    from microbatch import MicroBatcher
+    from jobs import JobRunner
+    from clustering import (prepare_rows, dataset_key, cached_result, run_clustering, mark_pending, is_pending,
+                            failure)
     BERT_AVAILABLE = True
 
 app = Flask(__name__)
@@ -109,8 +123,9 @@ def upload_csv():
     # Build ML-based summary
     category_summary = summarize_by_category(df, "PredictedCategory")
 
-    # Return also per-row predictions (handy for a table)
-    entries_with_pred = df[["Date", "Description", "Amount", "PredictedCategory"]].to_dict(orient="records")
+    # Return also per-row predictions (handy for a table); TransactionId feeds /transactions/<id>/similar
+    df["TransactionId"] = [format_id(k) for k in index_descriptions(df["Description"])]
+    entries_with_pred = df[["Date", "Description", "Amount", "PredictedCategory", "TransactionId"]].to_dict(orient="records")
     
     # Add confidence scores if available
     if "Confidence" in df.columns:
@@ -122,20 +137,52 @@ def upload_csv():
         "entries_with_pred": entries_with_pred,
     })
 
+def _predict_refine_batch(frames):
+    """Run one vectorized predict_descriptions over every /nlp/refine frame queued together."""
+    combined = pd.concat(
+        [pd.DataFrame({
+            "Description": f["Description"] if "Description" in f.columns else "",
+            "Amount": f["Amount"] if "Amount" in f.columns else 0,
+        }, index=f.index) for f in frames],
+        ignore_index=True,
+    )
+    out = predict_descriptions(combined)
+    pieces, start = [], 0
+    for f in frames:
+        piece = out.iloc[start:start + len(f)].copy()
+        piece.index = f.index
+        pieces.append(piece)
+        start += len(f)
+    return pieces
+
+# Concurrent refine calls (several tabs/users) share one vectorize + predict pass
+_REFINE_BATCHER = MicroBatcher(
+    _predict_refine_batch,
+    max_batch=int(os.environ.get("REFINE_BATCH_MAX_ROWS", 4096)),
+    max_wait_ms=float(os.environ.get("REFINE_BATCH_WAIT_MS", 5)),
+)
+
+# Pick up NLP models published by the retrain scheduler (or other workers' feedback) in the background
+start_model_watcher(float(os.environ.get("MODEL_WATCH_INTERVAL_S", 30)))
+if float(os.environ.get("RETRAIN_INTERVAL_S", 0)) > 0:
+    RetrainScheduler(float(os.environ["RETRAIN_INTERVAL_S"])).start()
+
 @app.post("/nlp/refine")
 def nlp_refine():
     """
     Body: { rows: [{Description, Amount}], threshold?: 0.45 }
-    Returns: [{ PredictedCategory, Confidence }]
+    Returns: [{ PredictedCategory, Confidence, TransactionId }]
     """
     payload = request.get_json(silent=True) or {}
     rows = payload.get("rows", [])
     threshold = float(payload.get("threshold", 0.45))
 
     df = pd.DataFrame(rows).fillna("")
+    if df.empty:
+        return jsonify([])
     
-    # First try the existing NLP refiner
-    out = predict_descriptions(df)  # PredictedCategory + Confidence
+    # First try the existing NLP refiner (micro-batched with concurrent requests)
+    out = _REFINE_BATCHER.submit(df)  # PredictedCategory + Confidence
     
     # If below threshold -> keep as 'Uncategorized'
     below = out["Confidence"] < threshold
@@ -145,10 +192,13 @@ def nlp_refine():
     if below.any():
         print("🤖 Applying BERT refinement to low-confidence predictions...")
         if BERT_AVAILABLE:
+            out["Description"] = df.get("Description", pd.Series([""] * len(df), index=df.index))
             out = refine_uncategorized_with_bert(out, confidence_threshold=0.15)
         # Skip BERT refinement for faster deployment
 
-    return jsonify(out.to_dict(orient="records"))
+    out["TransactionId"] = [format_id(k) for k in index_descriptions(
+        df.get("Description", pd.Series([""] * len(df), index=df.index)))]
+    return jsonify(out[["PredictedCategory", "Confidence", "TransactionId"]].to_dict(orient="records"))
 
 @app.post("/nlp/feedback")
 def nlp_feedback():
@@ -167,6 +217,66 @@ def nlp_feedback():
 def nlp_get_labels():
     return jsonify({"labels": nlp_labels()})
 
+# KMeans runs here, never on the request thread; the same statement submitted twice shares one job
+_CLUSTER_JOBS = JobRunner(workers=int(os.environ.get("CLUSTER_JOB_WORKERS", 1)), name="clusters")
+
+def _cluster_response(key, job=None):
+    result = cached_result(key)
+    if result is not None:
+        return jsonify({"job_id": key, "status": "done", "result": result})
+    if job is None:
+        if is_pending(key):  # submitted to another worker, still running there
+            return jsonify({"job_id": key, "status": "pending"}), 202
+        error = failure(key)  # failed in another worker
+        if error is not None:
+            return jsonify({"job_id": key, "status": "failed", "error": error}), 500
+        return jsonify({"job_id": key, "status": "unknown"}), 404
+    if job["status"] == "failed":
+        return jsonify({"job_id": key, "status": "failed", "error": job.get("error")}), 500
+    return jsonify({"job_id": key, "status": job["status"]}), 202
+
+@app.post("/clusters")
+def clusters():
+    """
+    Body: { rows: [{Description, Amount, PredictedCategory?}] } or a CSV "file" upload
+    Returns the cached clustering (200) or starts a background job (202, poll /clusters/<job_id>).
+    """
+    if "file" in request.files:
+        content = request.files["file"].read().decode("utf-8", errors="ignore")
+        df = pd.read_csv(io.StringIO(content), on_bad_lines="skip", dtype=str).fillna("")
+    else:
+        df = pd.DataFrame((request.get_json(silent=True) or {}).get("rows", [])).fillna("")
+    if df.empty:
+        return jsonify({"error": "rows or file required"}), 400
+
+    rows = prepare_rows(df)
+    key = dataset_key(rows)
+    if cached_result(key) is not None:
+        return _cluster_response(key)
+    mark_pending(key)
+    return _cluster_response(key, _CLUSTER_JOBS.submit(key, run_clustering, key, rows))
+
+@app.get("/clusters/<job_id>")
+def cluster_job(job_id):
+    return _cluster_response(job_id, _CLUSTER_JOBS.status(job_id))
+
+@app.get("/transactions/<transaction_id>/similar")
+def transactions_similar(transaction_id):
+    """
+    Query: ?k=10
+    Returns: { transaction_id, similar: [{ TransactionId, Description, Similarity }] }
+    """
+    key = parse_id(transaction_id)
+    k = max(1, min(request.args.get("k", 10, type=int), 100))
+    similar = similar_transactions(key, k) if key is not None else None
+    if similar is None:
+        return jsonify({"error": "unknown transaction id"}), 404
+    return jsonify({
+        "transaction_id": transaction_id,
+        "similar": [{"TransactionId": format_id(sk), "Description": text, "Similarity": round(score, 4)}
+                    for sk, text, score in similar],
+    })
+
 @app.post("/savings/suggestions")
 def savings_suggestions():
     try:
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Benchmark and evaluation harness for the transaction classifiers.
+
+Runs every classifier (rules fallback, predict_categories, the online NLP model and,
+when available, BERT) over the repo's labelled CSVs and over larger scale sets, and
+reports macro-F1, p50/p99 latency per row and per batch size, rows/sec and peak RSS.
+Scale sets come from the seeded synthetic generator in synthetic_data.py.
+Each classifier runs in its own fresh process so peak RSS is attributable to it.
+Results are written as JSON so runs can be compared over time.
+
+Run with:
+    PYTHONPATH=. python3 -m server.benchmark --scale-sizes 10000 100000
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmark_results")
+
+CLASSIFIERS = ["rules_fallback", "predict_categories", "predict_descriptions", "bert"]
+LABELLED_SETS = {
+    "descriptions": os.path.join(PROJECT_ROOT, "descriptions.csv"),
+    "sample_transactions_1000": os.path.join(PROJECT_ROOT, "sample_transactions_1000.csv"),
+}
+DEFAULT_BATCH_SIZES = [1, 32, 512, 0]  # 0 = whole dataset in one call
+DEFAULT_SCALE_SIZES = [10_000, 100_000]
+SEED = 42
+
+
+def _import_server_module(name):
+    try:
+        return __import__(f"server.{name}", fromlist=[name])
+    except ImportError:
+        return __import__(name)
+
+
+def _load_classifier(name):
+    """Return fn(df) -> pd.Series[str], or raise RuntimeError if unavailable here."""
+    if name == "rules_fallback":
+        mlc = _import_server_module("machinelearningclassification")
+        return lambda df: mlc._rules_fallback(
+            df["Description"].astype(str), pd.to_numeric(df["Amount"], errors="coerce").fillna(0.0))
+    if name == "predict_categories":
+        return _import_server_module("machinelearningclassification").predict_categories
+    if name == "predict_descriptions":
+        nlp = _import_server_module("nlp_refiner")
+        return lambda df: nlp.predict_descriptions(df, return_conf=False)["PredictedCategory"]
+    if name == "bert":
+        bert = _import_server_module("bert_refiner")
+        labels, _ = bert._predict_logits(["warmup"])
+        if labels is None:
+            raise RuntimeError(bert.get_bert_model_info().get("message", "BERT unavailable"))
+
+        def predict(df):
+            labels, logits = bert._predict_logits(df["Description"].astype(str).tolist())
+            return pd.Series(np.asarray(labels, dtype=object)[logits.argmax(axis=1)], index=df.index)
+        return predict
+    raise ValueError(f"unknown classifier: {name}")
+
+
+def _read_labelled(path):
+    df = pd.read_csv(path, on_bad_lines="skip").dropna(subset=["Description"])
+    if "Amount" not in df.columns:
+        df["Amount"] = 0.0
+    df["Amount"] = pd.to_numeric(df["Amount"].astype(str).str.replace(",", ""), errors="coerce").fillna(0.0)
+    return df.reset_index(drop=True)
+
+
+def _scale_set(n_rows):
+    """Seeded synthetic statement of n_rows (see synthetic_data.py)."""
+    synthetic = _import_server_module("synthetic_data")
+    return synthetic.generate_frame(n_rows, seed=SEED)
+
+
+def load_datasets(scale_sizes):
+    datasets = {name: _read_labelled(path) for name, path in LABELLED_SETS.items() if os.path.exists(path)}
+    for n in scale_sizes:
+        datasets[f"scale_{n}"] = _scale_set(n)
+    return datasets
+
+
+def _macro_f1(y_true, y_pred):
+    from sklearn.metrics import f1_score
+    labels = sorted(set(y_true))
+    return float(f1_score(y_true, y_pred, labels=labels, average="macro", zero_division=0))
+
+
+def _latency_stats(fn, df, batch_size, max_batches):
+    size = len(df) if batch_size <= 0 else batch_size
+    starts = list(range(0, len(df), size))[:max_batches]
+    batch_ms, row_ms, rows = [], [], 0
+    for start in starts:
+        chunk = df.iloc[start:start + size]
+        t0 = time.perf_counter()
+        fn(chunk)
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        batch_ms.append(elapsed)
+        row_ms.append(elapsed / len(chunk))
+        rows += len(chunk)
+    total_s = sum(batch_ms) / 1000.0
+    return {
+        "batch_size": size,
+        "batches": len(batch_ms),
+        "batch_ms_p50": float(np.percentile(batch_ms, 50)),
+        "batch_ms_p99": float(np.percentile(batch_ms, 99)),
+        "row_ms_p50": float(np.percentile(row_ms, 50)),
+        "row_ms_p99": float(np.percentile(row_ms, 99)),
+        # a batch faster than the timer resolution has no measurable rate; null keeps the JSON valid
+        "rows_per_sec": rows / total_s if total_s > 0 else None,
+    }
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def bench_classifier(name, scale_sizes, batch_sizes, max_batches):
+    """Benchmark one classifier over all datasets (meant to run in a fresh process)."""
+    rss_start = _peak_rss_mb()
+    try:
+        t0 = time.perf_counter()
+        fn = _load_classifier(name)
+        load_s = time.perf_counter() - t0
+    except Exception as e:
+        return {"classifier": name, "skipped": str(e)}
+
+    datasets = load_datasets(scale_sizes)
+    fn(next(iter(datasets.values())).head(8))  # warm up lazy init / caches
+    results = {}
+    for ds_name, df in datasets.items():
+        preds = fn(df).astype(str).values
+        entry = {"rows": int(len(df))}
+        if "Category" in df.columns:
+            entry["macro_f1"] = _macro_f1(df["Category"].astype(str).values, preds)
+        entry["latency"] = [_latency_stats(fn, df, b, max_batches) for b in batch_sizes]
+        results[ds_name] = entry
+    return {
+        "classifier": name,
+        "load_seconds": load_s,
+        "peak_rss_mb": _peak_rss_mb(),
+        "baseline_rss_mb": rss_start,
+        "datasets": results,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def _environment():
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "cpu_count": os.cpu_count(),
+        "git_commit": _git_commit(),
+    }
+
+
+def _print_summary(report):
+    for res in report["results"]:
+        if "skipped" in res:
+            print(f"\n⏭️  {res['classifier']}: skipped ({res['skipped']})")
+            continue
+        print(f"\n📊 {res['classifier']}  (load {res['load_seconds']:.2f}s, peak RSS {res['peak_rss_mb']:.0f} MB)")
+        for ds_name, entry in res["datasets"].items():
+            f1 = f"macro-F1 {entry['macro_f1']:.3f}" if "macro_f1" in entry else "unlabelled"
+            print(f"  {ds_name} ({entry['rows']} rows, {f1})")
+            for lat in entry["latency"]:
+                rate = f"{lat['rows_per_sec']:.0f} rows/s" if lat["rows_per_sec"] is not None else "rate n/a"
+                print(f"    batch {lat['batch_size']:>7}: row p50 {lat['row_ms_p50']:.4f} ms, "
+                      f"row p99 {lat['row_ms_p99']:.4f} ms, {rate}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark transaction classifiers")
+    parser.add_argument("--classifiers", nargs="+", default=CLASSIFIERS, choices=CLASSIFIERS)
+    parser.add_argument("--scale-sizes", nargs="*", type=int, default=DEFAULT_SCALE_SIZES,
+                        help="row counts for synthetic scale sets")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=DEFAULT_BATCH_SIZES,
+                        help="batch sizes to time (0 = whole dataset)")
+    parser.add_argument("--max-batches", type=int, default=200, help="cap on timed batches per batch size")
+    parser.add_argument("--output", default=None, help="JSON results path (default: benchmark_results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    started = datetime.now(timezone.utc)
+    results = []
+    ctx = get_context("spawn")
+    for name in args.classifiers:
+        print(f"⏱️  Benchmarking {name}...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            results.append(pool.submit(bench_classifier, name, args.scale_sizes,
+                                       args.batch_sizes, args.max_batches).result())
+
+    report = {
+        "started_at": started.isoformat(),
+        "environment": _environment(),
+        "config": vars(args),
+        "results": results,
+    }
+    _print_summary(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, started.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Saved benchmark results to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
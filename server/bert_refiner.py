@@ -1,26 +1,199 @@
 """
-Minimal BERT refiner module to avoid import errors.
-This is a placeholder - the actual BERT functionality can be implemented later.
+BERT refiner: re-classifies rows the fast models left as "Uncategorized" using the
+fine-tuned model saved in bert_expense_classifier/.
+When the local inference daemon (inference_server.py) is running, this module is a
+thin client and the daemon's single model copy does the work; otherwise the model is
+loaded in-process. Outputs are served from the on-disk embedding cache where
+possible, so merchants we've already seen skip tokenization and the forward pass.
+If torch/transformers or the model weights are missing, refinement is a no-op.
 """
 
+import os
+import numpy as np
 import pandas as pd
 
-def refine_uncategorized_with_bert(df: pd.DataFrame, confidence_threshold: float = 0.15) -> pd.DataFrame:
+try:
+    from .embedding_cache import EmbeddingCache, cached_forward, model_version, CACHE_DIR
+    from .inference_client import InferenceClient, DEFAULT_SOCKET
+    from .model_bundle import LABELS_BUNDLE_NAME, open_bundle
+except ImportError:
+    from embedding_cache import EmbeddingCache, cached_forward, model_version, CACHE_DIR
+    from inference_client import InferenceClient, DEFAULT_SOCKET
+    from model_bundle import LABELS_BUNDLE_NAME, open_bundle
+
+try:
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    _TORCH_AVAILABLE = True
+except ImportError:
+    _TORCH_AVAILABLE = False
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+BERT_MODEL_DIR = os.environ.get("BERT_MODEL_DIR", os.path.join(PROJECT_ROOT, "bert_expense_classifier"))
+LABELS_BUNDLE_PATH = os.path.join(BERT_MODEL_DIR, LABELS_BUNDLE_NAME)
+LABEL_ENCODER_PATH = os.path.join(PROJECT_ROOT, "label_encoder.joblib")  # legacy
+
+BATCH_SIZE = 64
+MAX_LENGTH = 128
+UNCATEGORIZED = {"", "nan", "none", "uncategorized"}
+
+_TOKENIZER = None
+_MODEL = None
+_LABELS = None
+_CACHE = None
+_LOAD_ERROR = None
+_CLIENT = None
+
+
+def _weights_present() -> bool:
+    return any(os.path.exists(os.path.join(BERT_MODEL_DIR, name))
+               for name in ("model.safetensors", "pytorch_model.bin"))
+
+
+def _load_labels(model):
+    bundle = open_bundle(LABELS_BUNDLE_PATH)
+    if bundle is not None:
+        return [str(c) for c in bundle.labels]
+    if os.path.exists(LABEL_ENCODER_PATH):
+        import joblib
+        return [str(c) for c in joblib.load(LABEL_ENCODER_PATH).classes_]
+    return [model.config.id2label[i] for i in range(model.config.num_labels)]
+
+
+def load_model() -> bool:
+    """Lazily load tokenizer, model, labels and cache. Returns True when ready."""
+    global _TOKENIZER, _MODEL, _LABELS, _CACHE, _LOAD_ERROR
+    if _MODEL is not None:
+        return True
+    if _LOAD_ERROR is not None:
+        return False
+    if not _TORCH_AVAILABLE:
+        _LOAD_ERROR = "torch/transformers not installed"
+        return False
+    if not _weights_present():
+        _LOAD_ERROR = f"no model weights in {BERT_MODEL_DIR}"
+        return False
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(BERT_MODEL_DIR)
+        model = AutoModelForSequenceClassification.from_pretrained(BERT_MODEL_DIR)
+        model.eval()
+        labels = _load_labels(model)
+        cache_path = os.path.join(CACHE_DIR, model_version(BERT_MODEL_DIR) + ".bin")
+        _CACHE = EmbeddingCache(cache_path, dim=model.config.hidden_size, n_labels=len(labels))
+        _TOKENIZER, _MODEL, _LABELS = tokenizer, model, labels
+    except Exception as e:
+        _LOAD_ERROR = str(e)
+        return False
+    return True
+
+
+def _forward(texts):
+    """Run the model over texts in batches → ([CLS] embeddings, logits) as float32 arrays."""
+    embs, logits = [], []
+    with torch.no_grad():
+        for start in range(0, len(texts), BATCH_SIZE):
+            batch = texts[start:start + BATCH_SIZE]
+            inputs = _TOKENIZER(batch, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="pt")
+            out = _MODEL(**inputs, output_hidden_states=True)
+            embs.append(out.hidden_states[-1][:, 0, :].float().numpy())
+            logits.append(out.logits.float().numpy())
+    return np.vstack(embs), np.vstack(logits)
+
+
+def model_labels():
+    return list(_LABELS) if _LABELS is not None else []
+
+
+def encode_local(descriptions):
     """
-    Placeholder function for BERT-based refinement.
-    For now, just returns the dataframe unchanged.
+    Return ([CLS] embeddings, logits) for descriptions from the in-process model,
+    using the cache first. Raises RuntimeError when the BERT model is unavailable.
     """
-    print("🤖 BERT refinement placeholder - returning data unchanged")
-    return df
+    if not load_model():
+        raise RuntimeError(f"BERT model unavailable: {_LOAD_ERROR}")
+    return cached_forward([str(d) for d in descriptions], _forward, _CACHE)
 
-def get_bert_model_info():
+
+def _daemon():
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = InferenceClient.connect_if_running(DEFAULT_SOCKET)
+    return _CLIENT
+
+
+def _predict_logits(descriptions):
+    """Return (labels, logits) via the shared daemon if running, else in-process; (None, None) if unavailable."""
+    client = _daemon()
+    if client is not None:
+        try:
+            labels, logits, _ = client.encode(descriptions)
+            return labels, logits
+        except (OSError, RuntimeError) as e:
+            print(f"🤖 Inference daemon unavailable ({e}); using in-process model")
+    if not load_model():
+        return None, None
+    _, logits = cached_forward(descriptions, _forward, _CACHE)
+    return _LABELS, logits
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    z = logits - logits.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def refine_uncategorized_with_bert(df: pd.DataFrame, confidence_threshold: float = 0.15) -> pd.DataFrame:
     """
-    Placeholder function for BERT model info.
+    Fill PredictedCategory/Confidence for uncategorized rows with BERT predictions
+    whose confidence is at least confidence_threshold. Other rows are left as-is.
     """
-    return {
-        "model_loaded": False,
-        "model_type": "placeholder",
-        "message": "BERT model not implemented yet"
-    }
+    if df.empty or "Description" not in df.columns:
+        return df
+
+    pred = df["PredictedCategory"] if "PredictedCategory" in df.columns else pd.Series([""] * len(df), index=df.index)
+    mask = pred.isna() | pred.astype(str).str.strip().str.lower().isin(UNCATEGORIZED)
+    if not mask.any():
+        return df
+
+    labels, logits = _predict_logits(df.loc[mask, "Description"].astype(str).tolist())
+    if labels is None:
+        print(f"🤖 BERT refinement skipped: {_LOAD_ERROR}")
+        return df
+    proba = _softmax(logits)
+    conf = proba.max(axis=1)
+    best = proba.argmax(axis=1)
+    accept = conf >= confidence_threshold
+
+    df = df.copy()
+    if "Confidence" not in df.columns:
+        df["Confidence"] = None
+    rows = df.index[mask][accept]
+    df.loc[rows, "PredictedCategory"] = np.asarray(labels, dtype=object)[best[accept]]
+    df.loc[rows, "Confidence"] = conf[accept].astype(float)
+    print(f"🤖 BERT refined {int(accept.sum())} of {int(mask.sum())} uncategorized rows")
+    return df
 
 
+def get_bert_model_info():
+    """Report model/cache state without forcing a load (the daemon's state when it is running)."""
+    client = _daemon()
+    if client is not None and _MODEL is None:
+        try:
+            return dict(client.info(), served_by=client.path)
+        except (OSError, RuntimeError):
+            pass
+    info = {
+        "model_loaded": _MODEL is not None,
+        "model_type": "bert-sequence-classification",
+        "model_dir": BERT_MODEL_DIR,
+        "torch_available": _TORCH_AVAILABLE,
+        "weights_present": _weights_present(),
+    }
+    if _MODEL is not None:
+        info["labels"] = list(_LABELS)
+        info["cache_entries"] = len(_CACHE)
+        info["cache_path"] = _CACHE.path
+    if _LOAD_ERROR is not None:
+        info["message"] = _LOAD_ERROR
+    return info
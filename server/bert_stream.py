@@ -0,0 +1,95 @@
+# bert_stream.py
+# Streams a statement's descriptions through BERT in bounded chunks for the offline
+# scripts, so memory stays flat however many rows the file has:
+# - the classifier only ever sees STREAM_CHUNK_ROWS descriptions at a time and only
+#   the predicted labels are kept, never embeddings or logits
+# - every finished chunk is appended to a progress file (one JSON label per line) under
+#   models/bert_progress/, named after the model version and the input descriptions,
+#   with a progress line every PROGRESS_INTERVAL_S seconds
+# - rerunning after an interruption picks up where the progress file ends; a changed
+#   file or model gives a different name, so stale labels are never reused
+# - the caller discards the progress file once its own output is written
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+
+try:
+    from .embedding_cache import PROJECT_ROOT
+except ImportError:
+    from embedding_cache import PROJECT_ROOT
+
+PROGRESS_DIR = os.path.join(PROJECT_ROOT, "models", "bert_progress")
+STREAM_CHUNK_ROWS = int(os.environ.get("BERT_STREAM_ROWS", 2048))
+PROGRESS_INTERVAL_S = 5.0
+
+
+def progress_path(descriptions, version: str, directory: str = PROGRESS_DIR) -> str:
+    """Progress file for classifying descriptions (in this order) with model version."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(version).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(pd.Series(descriptions, dtype=object).astype(str), index=False).values.tobytes())
+    return os.path.join(directory, f"{h.hexdigest()}.jsonl")
+
+
+def _read_progress(path: str) -> list:
+    """Labels of the complete lines of path; a line cut off by a crash is dropped from the file."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return []
+    end = raw.rfind(b"\n") + 1
+    if end < len(raw):
+        with open(path, "r+b") as f:
+            f.truncate(end)
+    return [json.loads(line) for line in raw[:end].decode("utf-8").splitlines()]
+
+
+def _eta(seconds: float) -> str:
+    m, s = divmod(int(seconds), 60)
+    return f"{m // 60}h{m % 60:02d}m" if m >= 60 else f"{m}m{s:02d}s"
+
+
+def classify_streaming(descriptions, classify_fn, path: str = None, chunk_rows: int = STREAM_CHUNK_ROWS) -> np.ndarray:
+    """
+    Labels for descriptions, running classify_fn(list of str) -> labels on at most
+    chunk_rows of them at a time. With path, finished chunks are appended to it and
+    rows it already holds are not classified again.
+    """
+    descriptions = pd.Series(descriptions, dtype=object).fillna("").astype(str).tolist()
+    total = len(descriptions)
+    labels = _read_progress(path)[:total] if path else []
+    if labels:
+        print(f"🔁 Resuming BERT classification at row {len(labels):,} of {total:,}")
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    start, resumed_at = time.time(), len(labels)
+    last_report = start
+    while len(labels) < total:
+        chunk = descriptions[len(labels):len(labels) + chunk_rows]
+        chunk_labels = [str(label) for label in classify_fn(chunk)]
+        if path:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(label) + "\n" for label in chunk_labels))
+        labels.extend(chunk_labels)
+
+        now = time.time()
+        if now - last_report >= PROGRESS_INTERVAL_S or len(labels) == total:
+            rate = (len(labels) - resumed_at) / max(now - start, 1e-9)
+            print(f"   🔄 BERT {len(labels):,}/{total:,} rows ({rate:,.0f} rows/s, "
+                  f"ETA {_eta((total - len(labels)) / max(rate, 1e-9))})", flush=True)
+            last_report = now
+    return np.asarray(labels, dtype=object)
+
+
+def discard_progress(path: str):
+    """Remove a progress file once the run's output is safely written."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
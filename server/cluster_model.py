@@ -0,0 +1,153 @@
+# cluster_model.py
+# Persisted k-means cluster models for the clustering scripts (machinelearning.py,
+# machinelearningclustering.py), so new transactions are placed into the existing
+# clusters instead of reclustering the whole history:
+# - one model bundle (model_bundle.py) holds the fitted TF-IDF vectorizer, the
+#   centroids, the number of rows behind each centroid, the cluster labels and the
+#   distance statistics of the original fit
+# - assign() puts rows into the nearest centroid; update() moves the centroids
+#   towards the new rows like a MiniBatchKMeans step (per-cluster running mean)
+# - drift() compares new rows against the original fit: mean squared distance to
+#   their centroid relative to the fit's, share of rows beyond the fit's 95th
+#   percentile distance, and share of rows with no known vocabulary. Any of them
+#   past its threshold means the clusters no longer describe the data and a full
+#   recluster is due.
+
+import os
+import numpy as np
+from scipy import sparse
+
+try:
+    from .model_bundle import MODEL_DIR, BundleError, ModelBundle, write_bundle, _vectorizer_to_bundle, _vectorizer_from_bundle
+except ImportError:
+    from model_bundle import MODEL_DIR, BundleError, ModelBundle, write_bundle, _vectorizer_to_bundle, _vectorizer_from_bundle
+
+CLUSTER_MODEL_KIND = "cluster_model"
+KEYWORD_CLUSTERS_PATH = os.path.join(MODEL_DIR, "keyword_clusters.bundle")     # machinelearning.py
+CATEGORY_CLUSTERS_PATH = os.path.join(MODEL_DIR, "category_clusters.bundle")   # machinelearningclustering.py
+OUTLIER_QUANTILE = 0.95
+DRIFT_LIMITS = {"distance_ratio": 1.5, "outlier_rate": 0.2, "unknown_rate": 0.2}
+
+
+class ClusterModel:
+    """Vectorizer + centroids of a fitted k-means clustering, with online assignment."""
+
+    def __init__(self, vectorizer, centroids, counts, labels, categories=None, baseline=None, meta=None):
+        self.vectorizer = vectorizer
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.float64)
+        self.labels = [str(l) for l in labels]
+        # extra one-hot columns after the text features (e.g. the BERT category)
+        self.categories = list(categories) if categories is not None else None
+        self.baseline = baseline or {}
+        self.meta = meta or {}
+
+    @classmethod
+    def from_fit(cls, vectorizer, kmeans, X, labels, categories=None, meta=None):
+        """Model for a KMeans already fitted on X (the features built by vectorizer [+ categories])."""
+        assigned = kmeans.labels_
+        sq = kmeans.transform(X)[np.arange(X.shape[0]), assigned] ** 2
+        baseline = {
+            "rows": int(X.shape[0]),
+            "mean_sq_distance": float(sq.mean()),
+            "outlier_sq_distance": float(np.quantile(sq, OUTLIER_QUANTILE)),
+        }
+        counts = np.bincount(assigned, minlength=kmeans.n_clusters)
+        return cls(vectorizer, kmeans.cluster_centers_, counts, labels, categories, baseline, meta)
+
+    @property
+    def n_clusters(self) -> int:
+        return self.centroids.shape[0]
+
+    def features(self, descriptions, categories=None):
+        X = self.vectorizer.transform([str(d) for d in descriptions])
+        if self.categories is None:
+            return sparse.csr_matrix(X)
+        col = {c: i for i, c in enumerate(self.categories)}
+        idx = np.array([col.get(c, -1) for c in categories])
+        known = np.flatnonzero(idx >= 0)
+        onehot = sparse.csr_matrix((np.ones(len(known)), (known, idx[known])), shape=(len(idx), len(self.categories)))
+        return sparse.hstack([X, onehot], format="csr")
+
+    def assign(self, X):
+        """→ (cluster index, squared distance to its centroid) per row."""
+        from sklearn.metrics.pairwise import euclidean_distances
+        d2 = euclidean_distances(X, self.centroids, squared=True)
+        cluster = d2.argmin(axis=1)
+        return cluster, d2[np.arange(len(cluster)), cluster]
+
+    def update(self, X, cluster):
+        """Fold rows X (assigned to cluster) into the centroids as per-cluster running means."""
+        batch = np.bincount(cluster, minlength=self.n_clusters).astype(np.float64)
+        onehot = sparse.csr_matrix((np.ones(len(cluster)), (cluster, np.arange(len(cluster)))),
+                                   shape=(self.n_clusters, X.shape[0]))
+        sums = np.asarray((onehot @ X).todense())
+        hit = batch > 0
+        total = self.counts + batch
+        self.centroids[hit] += (sums[hit] - batch[hit, None] * self.centroids[hit]) / total[hit, None]
+        self.counts = total
+        self.meta["rows_added"] = int(self.meta.get("rows_added", 0)) + int(len(cluster))
+
+    def drift(self, X, sq_distance) -> dict:
+        """How well the clusters fit rows X; needs_recluster when any measure passes DRIFT_LIMITS."""
+        n_text = X.shape[1] - len(self.categories or [])
+        text_nnz = np.diff(X[:, :n_text].tocsr().indptr)
+        report = {
+            "rows": int(X.shape[0]),
+            "distance_ratio": float(np.mean(sq_distance) / max(self.baseline.get("mean_sq_distance", 0.0), 1e-12)),
+            "outlier_rate": float(np.mean(sq_distance > self.baseline.get("outlier_sq_distance", np.inf))),
+            "unknown_rate": float(np.mean(text_nnz == 0)),
+        }
+        report["needs_recluster"] = bool(any(report[k] > limit for k, limit in DRIFT_LIMITS.items()))
+        return report
+
+    def save(self, path: str) -> dict:
+        vec_settings, vec_arrays = _vectorizer_to_bundle(self.vectorizer)
+        arrays = {f"vectorizer.{k}": v for k, v in vec_arrays.items()}
+        arrays.update(centroids=self.centroids, counts=self.counts)
+        meta = dict(self.meta, vectorizer=vec_settings, categories=self.categories, baseline=self.baseline)
+        return write_bundle(path, CLUSTER_MODEL_KIND, arrays, labels=self.labels, meta=meta)
+
+    @classmethod
+    def load(cls, path: str):
+        bundle = ModelBundle(path)
+        if bundle.kind != CLUSTER_MODEL_KIND:
+            raise BundleError(f"{path}: {bundle.kind!r} bundle is not a cluster model")
+        meta = dict(bundle.meta)
+        vec_arrays = {k[len("vectorizer."):]: v for k, v in bundle.arrays.items() if k.startswith("vectorizer.")}
+        vectorizer = _vectorizer_from_bundle(meta.pop("vectorizer"), vec_arrays)
+        return cls(vectorizer, np.array(bundle.arrays["centroids"]), np.array(bundle.arrays["counts"]),
+                   bundle.labels, meta.pop("categories"), meta.pop("baseline"), meta)
+
+
+def place_transactions(path: str, descriptions, categories=None, update: bool = True):
+    """
+    Assign new rows to the persisted clusters at path; with update, fold them into the
+    centroids and save the model back. Returns (model, cluster index per row, drift report).
+    """
+    model = ClusterModel.load(path)
+    X = model.features(descriptions, categories)
+    cluster, sq_distance = model.assign(X)
+    report = model.drift(X, sq_distance)
+    if update and len(cluster):
+        model.update(X, cluster)
+        model.meta["last_drift"] = report
+        model.save(path)
+    return model, cluster, report
+
+
+def append_csv(df, path: str):
+    """Append df to the CSV at path in that file's column order (creating it if missing)."""
+    if not os.path.exists(path):
+        df.to_csv(path, index=False)
+        return
+    import pandas as pd
+    columns = pd.read_csv(path, nrows=0).columns
+    df.reindex(columns=columns).to_csv(path, mode="a", header=False, index=False)
+
+
+def print_drift(report: dict):
+    print(f"Cluster drift over {report['rows']} new rows: distance ratio {report['distance_ratio']:.2f}, "
+          f"outliers {report['outlier_rate']:.1%}, unknown vocabulary {report['unknown_rate']:.1%}")
+    if report["needs_recluster"]:
+        print("⚠️ New transactions no longer fit the saved clusters; run a full recluster")
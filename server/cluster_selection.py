@@ -0,0 +1,113 @@
+# cluster_selection.py
+# Picks the number of k-means clusters for the clustering scripts
+# (machinelearning.py, machinelearningclustering.py) without a full KMeans fit and
+# an O(n²) silhouette over every row for each candidate k:
+# - statements repeat the same descriptions, so everything runs on the distinct
+#   feature rows weighted by how often each occurs
+# - up to EXACT_ROWS distinct rows the criterion is still exact: weighted
+#   KMeans(n_init=10) optimizes the same objective as KMeans on all rows, and the
+#   weighted silhouette equals the silhouette over all rows
+# - beyond that, MiniBatchKMeans fits the distinct rows and every k is scored on the
+#   same fixed random sample of SILHOUETTE_SAMPLE rows, so scores stay comparable
+# - candidate k values are evaluated in parallel worker processes
+# Ties go to the smaller k, like the original loops.
+
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+EXACT_ROWS = 2000
+SILHOUETTE_SAMPLE = 3000
+MINIBATCH_SIZE = 1024
+MINIBATCH_N_INIT = 3
+
+_TASK = None
+
+
+def _init_worker(task):
+    global _TASK
+    _TASK = task
+
+
+def _distinct_rows(X):
+    """(unique rows, inverse index, counts) of a feature matrix; statements repeat descriptions a lot."""
+    X = sparse.csr_matrix(X)
+    X.sort_indices()
+    keys = pd.Series([X.indices[a:b].tobytes() + X.data[a:b].tobytes() for a, b in zip(X.indptr[:-1], X.indptr[1:])])
+    codes, uniques = pd.factorize(keys)
+    first = np.zeros(len(uniques), dtype=np.int64)
+    first[codes[::-1]] = np.arange(len(codes))[::-1]
+    return X[first], codes, np.bincount(codes)
+
+
+def weighted_silhouette(X, labels, weights) -> float:
+    """
+    Mean silhouette of a dataset given as distinct rows X, each repeated weights[i]
+    times; equals silhouette_score on the expanded data at O(distinct²) cost.
+    """
+    from sklearn.metrics import pairwise_distances
+    labels = np.asarray(labels)
+    w = np.asarray(weights, dtype=np.float64)
+    clusters, own = np.unique(labels, return_inverse=True)
+    onehot = np.zeros((len(labels), len(clusters)))
+    onehot[np.arange(len(labels)), own] = w
+    sums = pairwise_distances(X) @ onehot          # weighted distance from each row to each cluster
+    sizes = onehot.sum(axis=0)
+    rows = np.arange(len(labels))
+    own_size = sizes[own]
+    a = sums[rows, own] / np.maximum(own_size - 1.0, 1.0)
+    other = sums / sizes
+    other[rows, own] = np.inf
+    b = other.min(axis=1)
+    s = np.where(own_size > 1, (b - a) / np.maximum(np.maximum(a, b), 1e-12), 0.0)
+    return float((s * w).sum() / w.sum())
+
+
+def _score_k(k):
+    """Silhouette of a k-cluster fit (per _TASK), or -1 when it degenerates to one cluster."""
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+    X, (X_unique, codes, counts), random_state, sample = _TASK
+    k_fit = min(k, X_unique.shape[0])
+    if X_unique.shape[0] <= EXACT_ROWS:
+        # same objective as KMeans on every row, at the cost of the distinct ones
+        labels = KMeans(n_clusters=k_fit, random_state=random_state, n_init=10).fit(
+            X_unique, sample_weight=counts).labels_
+        if len(np.unique(labels)) < 2:
+            return k, -1.0
+        return k, weighted_silhouette(X_unique, labels, counts)
+    km = MiniBatchKMeans(n_clusters=k_fit, random_state=random_state, n_init=MINIBATCH_N_INIT,
+                         batch_size=MINIBATCH_SIZE)
+    labels = km.fit(X_unique, sample_weight=counts).labels_[codes][sample]
+    if len(np.unique(labels)) < 2:
+        return k, -1.0
+    return k, float(silhouette_score(X[sample], labels))
+
+
+def select_cluster_count(X, k_values, random_state: int = 42, n_jobs: int = None, verbose: bool = True):
+    """Best k in k_values by silhouette. Returns (best_k, {k: score})."""
+    k_values = [k for k in k_values if 2 <= k < X.shape[0]]
+    if not k_values:
+        return None, {}
+    X = sparse.csr_matrix(X)
+    n = X.shape[0]
+    sample = np.arange(n)
+    if n > SILHOUETTE_SAMPLE:
+        sample = np.sort(np.random.RandomState(random_state).choice(n, SILHOUETTE_SAMPLE, replace=False))
+    task = (X, _distinct_rows(X), random_state, sample)
+
+    n_jobs = n_jobs or min(len(k_values), os.cpu_count() or 1)
+    if n_jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(task,)) as pool:
+            scores = dict(pool.map(_score_k, k_values))
+    else:
+        _init_worker(task)
+        scores = dict(map(_score_k, k_values))
+
+    best_k = max(k_values, key=lambda k: (scores[k], -k))
+    if verbose:
+        for k in k_values:
+            print(f"Silhouette score for k={k}: {scores[k]:.4f}")
+    return best_k, scores
@@ -0,0 +1,231 @@
+# clustering.py
+# Transaction clustering served by the API (/clusters) instead of offline scripts
+# writing CSVs:
+# - same pipeline as machinelearningclustering.py: TF-IDF + one-hot category, k picked
+#   by silhouette (cluster_selection.py), main clusters labeled with their most common
+#   category and subclusters with the most common category per (cluster, first word)
+# - categories come from the request when it carries them, else from the NLP model
+# - results are cached in memory and on disk under a key made of the dataset hash and
+#   the model version, so reloading the dashboard with the same statement reuses them
+# - a submitted job leaves a <key>.pending marker in the cache directory until its result
+#   is stored, so a worker that didn't run the job can still answer "pending" when polled;
+#   a job that raises replaces it with a <key>.failed marker holding the error, so every
+#   worker reports the failure alike (until the statement is submitted again)
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+try:
+    from .model_bundle import MODEL_DIR
+    from .cluster_selection import select_cluster_count
+    from .nlp_refiner import predict_descriptions, model_version
+except ImportError:
+    from model_bundle import MODEL_DIR
+    from cluster_selection import select_cluster_count
+    from nlp_refiner import predict_descriptions, model_version
+
+CLUSTER_CACHE_DIR = os.path.join(MODEL_DIR, "cluster_cache")
+CLUSTERING_VERSION = 1  # bump when the pipeline changes so older cached results are ignored
+MIN_CLUSTERS = 5
+MAX_CLUSTERS = 15
+CATEGORY_COLUMNS = ("PredictedCategory", "BERT_Category", "Category")
+MEMORY_CACHE_SIZE = 32
+PENDING_TTL_S = 3600  # a marker older than this belongs to a worker that died mid-job
+_KEY_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+_MEMORY = OrderedDict()  # key -> result
+_MEMORY_LOCK = threading.Lock()
+
+
+def prepare_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Description, Amount and (when the rows carry one) Category columns of df, normalized."""
+    rows = pd.DataFrame({
+        "Description": df.get("Description", pd.Series("", index=df.index)).fillna("").astype(str),
+        "Amount": pd.to_numeric(df.get("Amount", pd.Series(0, index=df.index)).astype(str).str.replace(",", ""),
+                                errors="coerce").fillna(0.0),
+    })
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and df[col].astype(str).str.strip().ne("").any():
+            rows["Category"] = df[col].fillna("").astype(str).replace("", "Uncategorized")
+            break
+    return rows.reset_index(drop=True)
+
+
+def dataset_key(rows: pd.DataFrame) -> str:
+    """Cache key: pipeline version + category model version (unless categories are given) + row contents."""
+    version = "given" if "Category" in rows.columns else model_version()
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{CLUSTERING_VERSION}|{version}".encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(rows, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(CLUSTER_CACHE_DIR, f"{key}.json")
+
+
+def _pending_path(key: str) -> str:
+    return os.path.join(CLUSTER_CACHE_DIR, f"{key}.pending")
+
+
+def _failed_path(key: str) -> str:
+    return os.path.join(CLUSTER_CACHE_DIR, f"{key}.failed")
+
+
+def mark_pending(key: str):
+    """Record that a job for key was submitted (in any worker), until its result is stored."""
+    os.makedirs(CLUSTER_CACHE_DIR, exist_ok=True)
+    with open(_pending_path(key), "w"):
+        pass
+    _remove(_failed_path(key))  # a resubmitted statement gets a fresh try
+
+
+def is_pending(key: str) -> bool:
+    """Whether some worker has a job for key that hasn't stored a result or failed yet."""
+    if not _KEY_PATTERN.fullmatch(key):
+        return False
+    try:
+        return time.time() - os.path.getmtime(_pending_path(key)) < PENDING_TTL_S
+    except OSError:
+        return False
+
+
+def failure(key: str):
+    """Error of the last job for key if it failed (in any worker), else None."""
+    if not _KEY_PATTERN.fullmatch(key):
+        return None
+    try:
+        with open(_failed_path(key)) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _mark_failed(key: str, error: str):
+    os.makedirs(CLUSTER_CACHE_DIR, exist_ok=True)
+    tmp = f"{_failed_path(key)}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(error)
+    os.replace(tmp, _failed_path(key))
+    _remove(_pending_path(key))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remember(key: str, result: dict):
+    with _MEMORY_LOCK:
+        _MEMORY[key] = result
+        _MEMORY.move_to_end(key)
+        while len(_MEMORY) > MEMORY_CACHE_SIZE:
+            _MEMORY.popitem(last=False)
+
+
+def cached_result(key: str):
+    """Clustering result for key from memory or disk (written by any worker), or None."""
+    if not _KEY_PATTERN.fullmatch(key):
+        return None
+    with _MEMORY_LOCK:
+        if key in _MEMORY:
+            _MEMORY.move_to_end(key)
+            return _MEMORY[key]
+    try:
+        with open(_cache_path(key)) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _remember(key, result)
+    return result
+
+
+def _store(key: str, result: dict):
+    os.makedirs(CLUSTER_CACHE_DIR, exist_ok=True)
+    tmp = f"{_cache_path(key)}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp, _cache_path(key))
+    _remove(_pending_path(key))
+    _remember(key, result)
+
+
+def most_common_per_group(keys: pd.DataFrame, values: pd.Series) -> pd.Series:
+    """Most frequent value per distinct row of keys (ties go to the value seen first), indexed by the key columns."""
+    counts = (pd.concat([keys, values.rename("_value")], axis=1)
+              .groupby(list(keys.columns) + ["_value"], sort=False).size().rename("_count").reset_index())
+    top = counts.sort_values("_count", ascending=False, kind="stable").drop_duplicates(list(keys.columns))
+    return top.set_index(list(keys.columns))["_value"]
+
+
+def cluster_transactions(rows: pd.DataFrame) -> pd.DataFrame:
+    """Cluster, Cluster_Label and Subcluster_Label per row of prepare_rows() output."""
+    from sklearn.cluster import KMeans
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import OneHotEncoder
+
+    categories = rows["Category"] if "Category" in rows.columns else \
+        predict_descriptions(rows[["Description", "Amount"]])["PredictedCategory"].astype(str)
+    categories = categories.reset_index(drop=True)
+
+    if len(rows) < 2:
+        clusters = np.zeros(len(rows), dtype=int)
+    else:
+        try:
+            tfidf = TfidfVectorizer(stop_words="english", max_features=1000).fit_transform(rows["Description"])
+        except ValueError:  # nothing but stop words / empty descriptions
+            tfidf = sparse.csr_matrix((len(rows), 0))
+        onehot = OneHotEncoder(sparse_output=True).fit_transform(categories.to_frame())
+        X = sparse.hstack([tfidf, onehot], format="csr")
+        # already off the request path; don't fork worker processes from a server thread
+        k, _ = select_cluster_count(X, range(MIN_CLUSTERS, MAX_CLUSTERS + 1), n_jobs=1, verbose=False)
+        k = k or min(MIN_CLUSTERS, len(rows))
+        clusters = KMeans(n_clusters=k, random_state=42, n_init=10).fit_predict(X)
+
+    out = pd.DataFrame({"Cluster": clusters})
+    cluster_label = most_common_per_group(out[["Cluster"]], categories)
+    out["Cluster_Label"] = cluster_label.reindex(out["Cluster"]).values
+    out["First_Word"] = rows["Description"].str.split().str[0].str.lower().fillna("unknown")
+    sub_label = most_common_per_group(out[["Cluster", "First_Word"]], categories)
+    out["Subcluster_Label"] = sub_label.reindex(pd.MultiIndex.from_frame(out[["Cluster", "First_Word"]])).values
+    return out.drop(columns="First_Word")
+
+
+def _grouped(frame: pd.DataFrame, amount_col: str):
+    summary = frame.groupby("Subcluster_Label")["Amount"].sum().reset_index()
+    return summary.rename(columns={"Amount": amount_col, "Subcluster_Label": "Cluster_Label"}).to_dict(orient="records")
+
+
+def run_clustering(key: str, rows: pd.DataFrame) -> dict:
+    """Cluster rows, cache the result under key and return it (the /clusters job body)."""
+    try:
+        labeled = pd.concat([rows, cluster_transactions(rows)], axis=1)
+    except Exception as e:
+        _mark_failed(key, str(e))  # so the other workers report the failure too instead of "pending"
+        raise
+    clusters = labeled.groupby(["Cluster", "Cluster_Label"])["Amount"].agg(["size", "sum"]).reset_index()
+    result = {
+        "key": key,
+        "n_clusters": int(labeled["Cluster"].nunique()),
+        "labels": labeled[["Cluster", "Cluster_Label", "Subcluster_Label"]].to_dict(orient="records"),
+        "clusters": [{"Cluster": int(r.Cluster), "Cluster_Label": str(r.Cluster_Label),
+                      "TransactionCount": int(r.size), "TotalAmount": float(r.sum)}
+                     for r in clusters.itertuples(index=False)],
+        # same shape as expensetracker.py's group_by_cluster
+        "deposits_grouped_by_cluster": _grouped(labeled[labeled["Amount"] > 0], "TotalDeposits"),
+        "withdrawals_grouped_by_cluster": _grouped(labeled[labeled["Amount"] < 0], "TotalWithdrawals"),
+    }
+    # plain Python types so the disk copy and the in-memory copy serialize the same
+    result = json.loads(json.dumps(result, default=lambda o: o.item() if hasattr(o, "item") else str(o)))
+    _store(key, result)
+    return result
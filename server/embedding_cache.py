@@ -0,0 +1,271 @@
+
+# embedding_cache.py
+# Persistent cache of transformer outputs so repeat merchants skip the forward pass:
+# - one file per model version under models/bert_cache/
+# - fixed-size binary records: key (16-byte hash of the normalized description),
+#   last-used tick, [CLS] embedding (float32), logits (float32)
+# - records are memory-mapped; lookups bump the tick and compaction keeps the
+#   most recently used entries (LRU) once the file reaches max_entries
+
+import os
+import re
+import struct
+import hashlib
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+CACHE_DIR = os.path.join(PROJECT_ROOT, "models", "bert_cache")
+
+MAGIC = b"ETBC"
+FORMAT_VERSION = 1
+# magic, format version, embedding dim, n_labels, record count, LRU tick
+_HEADER = struct.Struct("<4sIIIQQ")
+HEADER_SIZE = 64
+KEY_BYTES = 16
+
+DEFAULT_MAX_ENTRIES = 200_000
+COMPACT_KEEP = 0.75  # fraction of max_entries kept by an LRU compaction
+_MIN_CAPACITY = 1024
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_description(text) -> str:
+    """Lowercase, mask digit runs (store numbers, dates) and collapse whitespace."""
+    text = _DIGITS.sub("#", str(text or "").lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def description_key(normalized: str) -> bytes:
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+def model_version(model_dir: str) -> str:
+    """Short fingerprint of a saved model (config contents + weight file size/mtime)."""
+    h = hashlib.blake2b(digest_size=8)
+    for name in ("config.json", "model.safetensors", "pytorch_model.bin"):
+        path = os.path.join(model_dir, name)
+        if not os.path.exists(path):
+            continue
+        h.update(name.encode("utf-8"))
+        if name == "config.json":
+            with open(path, "rb") as f:
+                h.update(f.read())
+        else:
+            st = os.stat(path)
+            h.update(f"{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Memory-mapped store of ([CLS] embedding, logits) per normalized description.
+    Safe to share between processes on POSIX: writers take an flock and readers
+    reload their index when another process appended or compacted the file.
+    """
+
+    def __init__(self, path: str, dim: int, n_labels: int, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.dim = int(dim)
+        self.n_labels = int(n_labels)
+        self.max_entries = int(max_entries)
+        self.dtype = np.dtype([
+            ("key", f"V{KEY_BYTES}"),
+            ("tick", "<u8"),
+            ("emb", "<f4", (self.dim,)),
+            ("logits", "<f4", (self.n_labels,)),
+        ])
+        self._records = None
+        self._index = {}
+        self._count = 0
+        self._tick = 0
+        self._inode = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._locked():
+            self._open()
+
+    # ---------- file layout ----------
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_header(self, f, count: int, tick: int):
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, self.dim, self.n_labels, count, tick).ljust(HEADER_SIZE, b"\0"))
+
+    def _read_header(self):
+        with open(self.path, "rb") as f:
+            raw = f.read(_HEADER.size)
+        if len(raw) < _HEADER.size:
+            return None
+        return _HEADER.unpack(raw)
+
+    def _create(self, path: str, capacity: int):
+        with open(path, "wb") as f:
+            self._write_header(f, 0, 0)
+            f.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+
+    def _open(self):
+        header = self._read_header() if os.path.exists(self.path) else None
+        if header is None or header[:4] != (MAGIC, FORMAT_VERSION, self.dim, self.n_labels):
+            # missing, corrupt or written for a different model shape → start fresh
+            self._create(self.path, _MIN_CAPACITY)
+            header = self._read_header()
+        self._count, self._tick = int(header[4]), int(header[5])
+        self._inode = os.stat(self.path).st_ino
+        capacity = (os.path.getsize(self.path) - HEADER_SIZE) // self.dtype.itemsize
+        self._records = np.memmap(self.path, dtype=self.dtype, mode="r+", offset=HEADER_SIZE, shape=(capacity,))
+        keys = self._records["key"][:self._count]
+        self._index = {bytes(k): i for i, k in enumerate(keys)}
+
+    def _refresh(self):
+        """Reopen if another process compacted (new inode) or appended (new count)."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        header = self._read_header() if inode is not None else None
+        if inode != self._inode or header is None or int(header[4]) != self._count:
+            self._open()
+
+    def _flush_header(self):
+        self._records.flush()
+        with open(self.path, "r+b") as f:
+            self._write_header(f, self._count, self._tick)
+
+    def _grow(self, needed: int):
+        capacity = self._records.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, _MIN_CAPACITY)
+        self._records.flush()
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + new_capacity * self.dtype.itemsize)
+        self._records = np.memmap(self.path, dtype=self.dtype, mode="r+", offset=HEADER_SIZE, shape=(new_capacity,))
+
+    # ---------- public API ----------
+
+    def __len__(self):
+        return self._count
+
+    def get_many(self, normalized):
+        """
+        Look up normalized descriptions.
+        Returns (embeddings[n, dim], logits[n, n_labels], hit_mask[n]); misses are zero rows.
+        """
+        n = len(normalized)
+        emb = np.zeros((n, self.dim), dtype=np.float32)
+        logits = np.zeros((n, self.n_labels), dtype=np.float32)
+        hit = np.zeros(n, dtype=bool)
+        if n == 0:
+            return emb, logits, hit
+        self._refresh()
+        slots = np.array([self._index.get(description_key(t), -1) for t in normalized], dtype=np.int64)
+        hit = slots >= 0
+        if hit.any():
+            found = slots[hit]
+            emb[hit] = self._records["emb"][found]
+            logits[hit] = self._records["logits"][found]
+            self._tick += 1
+            self._records["tick"][found] = self._tick
+        return emb, logits, hit
+
+    def put_many(self, normalized, embeddings, logits):
+        """Insert (or overwrite) records for normalized descriptions."""
+        if len(normalized) == 0:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        logits = np.asarray(logits, dtype=np.float32)
+        with self._locked():
+            self._refresh()
+            if self._count + len(normalized) > self.max_entries:
+                self._compact(max(0, int(self.max_entries * COMPACT_KEEP) - len(normalized)))
+            self._grow(self._count + len(normalized))
+            self._tick += 1
+            for text, e, l in zip(normalized, embeddings, logits):
+                key = description_key(text)
+                slot = self._index.get(key)
+                if slot is None:
+                    slot = self._count
+                    self._count += 1
+                    self._index[key] = slot
+                rec = self._records[slot]
+                rec["key"] = key
+                rec["tick"] = self._tick
+                rec["emb"] = e
+                rec["logits"] = l
+            self._flush_header()
+
+    def compact(self, keep: int = None):
+        """Drop least-recently-used records, keeping `keep` (default COMPACT_KEEP * max_entries)."""
+        with self._locked():
+            self._refresh()
+            self._compact(int(self.max_entries * COMPACT_KEEP) if keep is None else keep)
+
+    def _compact(self, keep: int):
+        live = self._records[:self._count]
+        if keep >= self._count:
+            return
+        order = np.argsort(live["tick"], kind="stable")[::-1][:keep]
+        survivors = np.array(live[np.sort(order)])
+        tmp = self.path + ".tmp"
+        self._create(tmp, max(keep, _MIN_CAPACITY))
+        out = np.memmap(tmp, dtype=self.dtype, mode="r+", offset=HEADER_SIZE, shape=(max(keep, _MIN_CAPACITY),))
+        out[:len(survivors)] = survivors
+        out.flush()
+        del out
+        with open(tmp, "r+b") as f:
+            self._write_header(f, len(survivors), self._tick)
+        self._records = None
+        os.replace(tmp, self.path)
+        self._open()
+
+
+def cached_forward(texts, forward_fn, cache: EmbeddingCache = None):
+    """
+    Return ([CLS] embeddings, logits) for texts, running forward_fn only on cache misses.
+    forward_fn receives a list of unique original descriptions and must return
+    (embeddings[n, dim], logits[n, n_labels]) arrays in the same order. The normalized
+    description is only the cache key: the model sees the first original text per key,
+    and without a cache every distinct text is run as is.
+    """
+    texts = [str(t) for t in texts]
+    if cache is None:
+        unique = list(dict.fromkeys(texts))
+        emb, logits = forward_fn(unique)
+        pos = {t: i for i, t in enumerate(unique)}
+        idx = [pos[t] for t in texts]
+        return np.asarray(emb)[idx], np.asarray(logits)[idx]
+
+    normalized = [normalize_description(t) for t in texts]
+    emb, logits, hit = cache.get_many(normalized)
+    miss = np.flatnonzero(~hit)
+    if miss.size:
+        first = {}  # cache key -> first original text with it
+        for i in miss:
+            first.setdefault(normalized[i], texts[i])
+        keys = list(first)
+        new_emb, new_logits = forward_fn([first[k] for k in keys])
+        cache.put_many(keys, new_emb, new_logits)
+        pos = {k: i for i, k in enumerate(keys)}
+        idx = [pos[normalized[i]] for i in miss]
+        emb[miss] = np.asarray(new_emb)[idx]
+        logits[miss] = np.asarray(new_logits)[idx]
+    return emb, logits
@@ -0,0 +1,278 @@
+# feature_store.py
+# On-disk cache of model input rows, so repeat transactions skip tokenizing and
+# vectorizing and re-scoring them is one sparse matrix x weight multiply:
+# - one directory per feature layout (vectorizer fingerprint + extra columns), so a
+#   feedback update (same vectorizer, new weights) reuses every stored row and a
+#   retrain with a new vocabulary starts a fresh store
+# - rows are keyed by a 64-bit hash of (description, amount bucket), the only inputs
+#   of a feature row
+# - each flush appends an immutable segment: a model bundle (model_bundle.py) holding
+#   sorted keys and the rows as CSR parts (indptr, indices, float32 data), opened
+#   with a memmap; readers in other workers pick new segments up by listing the directory
+# - size-tiered merging: MERGE_FANOUT consecutive segments of the same size tier
+#   (MERGE_FANOUT times the previous tier's rows) are merged into one that takes the
+#   newest one's place, so a row is rewritten about log(rows) times in all instead of
+#   the whole store on every few flushes; a merge keeps the newest row per key and at
+#   most max_rows rows, and the oldest segments are dropped once the newer ones alone
+#   hold max_rows
+# - merges run in a background thread per store (started when add() finds one due,
+#   exiting once none is), so /nlp/refine and /nlp/feedback only ever write their own
+#   small segment; lookups meanwhile read the unmerged segments
+# - layouts of superseded vectorizers are pruned only when a retrain publishes a new
+#   one (prune_layouts), never by a worker that may still be serving an old layout
+
+import os
+import glob
+import time
+import shutil
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+try:
+    from .model_bundle import BundleError, ModelBundle, write_bundle, bundle_lock
+except ImportError:
+    from model_bundle import BundleError, ModelBundle, write_bundle, bundle_lock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+FEATURE_STORE_DIR = os.path.join(PROJECT_ROOT, "models", "feature_store")
+
+SEGMENT_SUFFIX = ".seg"
+MERGE_FANOUT = 4
+BASE_TIER_ROWS = 1024  # segments up to this many rows are all tier 0
+MAX_SEGMENTS = 32       # backstop: past this many, the newest MERGE_FANOUT are merged whatever their tiers
+DEFAULT_MAX_ROWS = 1_000_000
+KEEP_LAYOUTS = 2  # stores of superseded vectorizers kept around (e.g. for a rollback)
+
+
+def row_keys(descriptions: pd.Series, buckets) -> np.ndarray:
+    """uint64 key per row from its description text and amount bucket."""
+    frame = pd.DataFrame({"d": descriptions.fillna("").astype(str).values, "b": np.asarray(buckets, dtype=np.int64)})
+    return pd.util.hash_pandas_object(frame, index=False).values.astype(np.uint64)
+
+
+def size_tier(rows: int) -> int:
+    """0 for segments up to BASE_TIER_ROWS rows, then one tier per MERGE_FANOUT-fold growth."""
+    tier, limit = 0, BASE_TIER_ROWS
+    while rows > limit:
+        tier, limit = tier + 1, limit * MERGE_FANOUT
+    return tier
+
+
+def _merge_run(segments):
+    """First run of MERGE_FANOUT consecutive (by age) segments in one size tier, smallest tier first, or None."""
+    if len(segments) > MAX_SEGMENTS:
+        return segments[-MERGE_FANOUT:]
+    tiers = [size_tier(len(s.keys)) for s in segments]
+    for tier in sorted(set(tiers)):
+        run = []
+        for seg, t in zip(segments, tiers):
+            run = run + [seg] if t == tier else []
+            if len(run) == MERGE_FANOUT:
+                return run
+    return None
+
+
+class _Segment:
+    __slots__ = ("path", "keys", "X")
+
+    def __init__(self, path):
+        b = ModelBundle(path, verify=False)
+        a = b.arrays
+        self.path = path
+        self.keys = a["keys"]
+        self.X = sparse.csr_matrix((a["data"], a["indices"], a["indptr"]), shape=tuple(b.meta["shape"]))
+
+
+class FeatureStore:
+    """Append-only store of CSR feature rows for one feature layout."""
+
+    def __init__(self, directory: str, n_features: int, max_rows: int = DEFAULT_MAX_ROWS,
+                 background_merge: bool = True):
+        self.directory = directory
+        self.n_features = int(n_features)
+        self.max_rows = int(max_rows)
+        self.background_merge = background_merge
+        self._segments = []  # oldest first
+        self._dir_sig = None
+        self._lock = threading.Lock()
+        self._merge_due = False
+        self._merger = None  # (pid, thread)
+        os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return sum(len(s.keys) for s in self._segments)
+
+    def _refresh(self):
+        """Load segments other processes added (and drop ones a merge removed)."""
+        try:
+            sig = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            os.makedirs(self.directory, exist_ok=True)
+            sig = None
+        if sig == self._dir_sig:
+            return
+        known = {s.path: s for s in self._segments}
+        segments = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "*" + SEGMENT_SUFFIX))):
+            seg = known.get(path)
+            if seg is None:
+                try:
+                    seg = _Segment(path)
+                except (OSError, BundleError, KeyError) as e:
+                    print(f"⚠️ Skipping feature segment {path}: {e}")
+                    continue
+                if seg.X.shape[1] != self.n_features:
+                    continue
+            segments.append(seg)
+        self._segments, self._dir_sig = segments, sig
+
+    def lookup(self, keys: np.ndarray):
+        """→ (found mask, float64 CSR rows of the found keys in key order)."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        found = np.zeros(len(keys), dtype=bool)
+        parts, where = [], []
+        with self._lock:
+            self._refresh()
+            segments = list(self._segments)
+        for seg in reversed(segments):  # newest first
+            todo = np.flatnonzero(~found)
+            if not len(todo) or not len(seg.keys):
+                continue
+            pos = np.searchsorted(seg.keys, keys[todo]).clip(0, len(seg.keys) - 1)
+            hit = seg.keys[pos] == keys[todo]
+            if hit.any():
+                parts.append(seg.X[pos[hit]])
+                where.append(todo[hit])
+                found[todo[hit]] = True
+        if not parts:
+            return found, sparse.csr_matrix((0, self.n_features))
+        order = np.argsort(np.concatenate(where), kind="stable")
+        return found, sparse.vstack(parts, format="csr")[order].astype(np.float64)
+
+    def add(self, keys: np.ndarray, X) -> None:
+        """Persist rows X (one per key) as a new segment."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(keys):
+            return
+        keys, first = np.unique(keys, return_index=True)
+        self._write_segment(keys, sparse.csr_matrix(X)[first])
+        with self._lock:
+            self._refresh()
+            if _merge_run(self._segments) is None:
+                return
+            if self.background_merge:
+                self._schedule_merge()
+                return
+        self.merge()
+
+    def _schedule_merge(self):
+        """Have the merger thread run merge() (again); called with self._lock held."""
+        self._merge_due = True
+        # started lazily (and again after fork) so gunicorn workers each merge their own writes
+        if self._merger is None or self._merger[0] != os.getpid() or not self._merger[1].is_alive():
+            thread = threading.Thread(target=self._merge_loop, name="feature-store-merge", daemon=True)
+            self._merger = (os.getpid(), thread)
+            thread.start()
+
+    def _merge_loop(self):
+        while True:
+            with self._lock:
+                if not self._merge_due:
+                    self._merger = None
+                    return
+                self._merge_due = False
+            try:
+                self.merge()
+            except (OSError, BundleError) as e:
+                print(f"⚠️ Feature store merge failed: {e}")
+
+    def wait_for_merges(self, timeout: float = None) -> None:
+        """Block until the background merger (if any) has nothing left to merge."""
+        merger = self._merger
+        if merger is not None and merger[0] == os.getpid():
+            merger[1].join(timeout)
+
+    def _write_segment(self, keys, X, stamp: str = None):
+        """stamp: age prefix of the name (segments are ordered by name); defaults to now."""
+        X = sparse.csr_matrix(X, dtype=np.float32)
+        X.sort_indices()
+        now = f"{time.time_ns():020d}"
+        name = f"{stamp or now}-{now}-{os.getpid()}-{threading.get_ident() % 100000:05d}{SEGMENT_SUFFIX}"
+        write_bundle(os.path.join(self.directory, name), "feature_segment",
+                     {"keys": keys, "indptr": X.indptr.astype(np.int64), "indices": X.indices.astype(np.int32),
+                      "data": X.data},
+                     meta={"shape": list(X.shape)})
+
+    def merge(self) -> None:
+        """Merge runs of same-tier segments until none is left, then drop segments beyond max_rows."""
+        with bundle_lock(os.path.join(self.directory, "merge")):
+            while True:
+                with self._lock:
+                    self._dir_sig = None
+                    self._refresh()
+                    segments = list(self._segments)
+                run = _merge_run(segments)
+                if run is None:
+                    break
+                self._merge_segments(run)
+            self._drop_oldest(segments)
+
+    def _merge_segments(self, run):
+        keys = np.concatenate([s.keys for s in run])
+        X = sparse.vstack([s.X for s in run], format="csr")
+        # rows are in age order, so the last occurrence of a key is its newest row
+        _, last = np.unique(keys[::-1], return_index=True)
+        newest = np.sort(len(keys) - 1 - last)[-self.max_rows:]
+        order = newest[np.argsort(keys[newest], kind="stable")]
+        # the merged segment takes the age of its newest part, so lookups keep their order
+        self._write_segment(keys[order], X[order], stamp=os.path.basename(run[-1].path).split("-")[0])
+        self._unlink(run)
+
+    def _drop_oldest(self, segments):
+        """Remove the oldest segments whose rows the newer ones already outnumber max_rows with."""
+        newer_rows, keep = 0, 0
+        for seg in reversed(segments):
+            if newer_rows >= self.max_rows:
+                break
+            newer_rows += len(seg.keys)
+            keep += 1
+        self._unlink(segments[:len(segments) - keep])
+
+    @staticmethod
+    def _unlink(segments):
+        for s in segments:
+            try:
+                os.unlink(s.path)  # open memmaps stay valid until the readers drop them
+            except FileNotFoundError:
+                pass
+
+
+def layout_id(vectorizer_id: str, extra) -> str:
+    return hashlib.blake2b(repr((vectorizer_id, extra)).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def open_feature_store(vectorizer_id: str, n_features: int, extra=None, root: str = FEATURE_STORE_DIR,
+                       max_rows: int = DEFAULT_MAX_ROWS) -> FeatureStore:
+    """Store for a vectorizer fingerprint (+ extra layout info)."""
+    directory = os.path.join(root, layout_id(vectorizer_id, extra))
+    store = FeatureStore(directory, n_features, max_rows)
+    os.utime(directory)  # most recently opened layouts are the ones prune_layouts keeps
+    return store
+
+
+def prune_layouts(vectorizer_id: str, extra=None, root: str = FEATURE_STORE_DIR, keep: int = KEEP_LAYOUTS) -> list:
+    """
+    Delete layout directories (store, scored ledger, similarity index) other than the
+    given one and the `keep` most recently used others. Call when publishing a model
+    with a new vectorizer. → removed directories.
+    """
+    current = os.path.join(root, layout_id(vectorizer_id, extra))
+    others = sorted((d for d in glob.glob(os.path.join(root, "*")) if os.path.isdir(d) and d != current),
+                    key=os.path.getmtime, reverse=True)
+    for old in others[keep:]:
+        shutil.rmtree(old, ignore_errors=True)
+    return others[keep:]
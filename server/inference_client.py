@@ -0,0 +1,98 @@
+
+# inference_client.py
+# Thin client for the local BERT inference daemon (inference_server.py).
+# Wire format, both directions:
+#   [u32 header length][JSON header][raw array bytes described by header["arrays"]]
+
+import json
+import os
+import socket
+import struct
+import threading
+import numpy as np
+
+DEFAULT_SOCKET = os.environ.get("BERT_INFERENCE_SOCKET", "/tmp/expensetracker-bert.sock")
+DEFAULT_TIMEOUT = 60.0
+
+_LEN = struct.Struct(">I")
+
+
+def _recv_exact(sock, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("inference socket closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def send_msg(sock, header: dict, arrays=()):
+    arrays = [np.ascontiguousarray(a, dtype="<f4") for a in arrays]
+    header = dict(header, arrays=[list(a.shape) for a in arrays])
+    body = json.dumps(header).encode("utf-8")
+    sock.sendall(_LEN.pack(len(body)) + body + b"".join(a.tobytes() for a in arrays))
+
+
+def recv_msg(sock):
+    """Return (header, [float32 arrays])."""
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    header = json.loads(_recv_exact(sock, n).decode("utf-8"))
+    arrays = []
+    for shape in header.get("arrays", []):
+        count = int(np.prod(shape)) if shape else 1
+        raw = _recv_exact(sock, count * 4)
+        arrays.append(np.frombuffer(raw, dtype="<f4").reshape(shape))
+    return header, arrays
+
+
+class InferenceClient:
+    """One persistent connection per thread to the daemon's Unix socket."""
+
+    def __init__(self, path: str = DEFAULT_SOCKET, timeout: float = DEFAULT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def connect_if_running(cls, path: str = DEFAULT_SOCKET):
+        """Return a client if the daemon's socket exists, else None."""
+        return cls(path) if os.path.exists(path) else None
+
+    def _sock(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, header: dict):
+        try:
+            sock = self._sock()
+            send_msg(sock, header)
+            resp, arrays = recv_msg(sock)
+        except OSError:
+            self.close()
+            raise
+        if "error" in resp:
+            raise RuntimeError(resp["error"])
+        return resp, arrays
+
+    def encode(self, texts, embeddings: bool = False):
+        """Return (labels, logits[n, n_labels], embeddings[n, dim] or None)."""
+        resp, arrays = self._call({"op": "encode", "texts": [str(t) for t in texts], "embeddings": bool(embeddings)})
+        return resp["labels"], arrays[0], (arrays[1] if embeddings else None)
+
+    def info(self) -> dict:
+        resp, _ = self._call({"op": "info"})
+        return resp
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            finally:
+                self._local.sock = None
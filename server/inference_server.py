@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Local BERT inference daemon shared by every API worker on the host.
+
+It owns the only in-memory copy of the model (plus the embedding cache), listens
+on a Unix socket and coalesces requests from all connected workers into dynamic
+batches. bert_refiner.py and the offline BERT scripts talk to it automatically
+whenever the socket exists, and fall back to loading the model themselves if not.
+
+Run with:
+    PYTHONPATH=. python3 -m server.inference_server --max-batch 128 --max-wait-ms 10
+"""
+
+import argparse
+import os
+import socketserver
+
+try:
+    from .inference_client import DEFAULT_SOCKET, send_msg, recv_msg
+    from .microbatch import MicroBatcher
+    from . import bert_refiner
+except ImportError:
+    from inference_client import DEFAULT_SOCKET, send_msg, recv_msg
+    from microbatch import MicroBatcher
+    import bert_refiner
+
+
+def _run_batch(requests):
+    """requests: list of text lists → list of (embeddings, logits) slices."""
+    texts = [t for req in requests for t in req]
+    emb, logits = bert_refiner.encode_local(texts)
+    out, start = [], 0
+    for req in requests:
+        out.append((emb[start:start + len(req)], logits[start:start + len(req)]))
+        start += len(req)
+    return out
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # one connection carries many requests from the same worker thread
+        while True:
+            try:
+                header, _ = recv_msg(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                op = header.get("op")
+                if op == "encode":
+                    emb, logits = self.server.batcher.submit(header.get("texts", []))
+                    arrays = [logits, emb] if header.get("embeddings") else [logits]
+                    send_msg(self.request, {"labels": bert_refiner.model_labels()}, arrays)
+                elif op == "info":
+                    info = bert_refiner.get_bert_model_info()
+                    info.update(batches=self.server.batcher.batches, requests=self.server.batcher.items)
+                    send_msg(self.request, info)
+                else:
+                    send_msg(self.request, {"error": f"unknown op: {op}"})
+            except Exception as e:
+                send_msg(self.request, {"error": str(e)})
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, max_batch: int, max_wait_ms: float):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+        self.batcher = MicroBatcher(_run_batch, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared local BERT inference daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument("--max-batch", type=int, default=128, help="max rows per forward batch")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="max time to wait for a batch to fill")
+    args = parser.parse_args()
+
+    if not bert_refiner.load_model():
+        raise SystemExit(f"❌ Cannot start inference server: {bert_refiner.get_bert_model_info().get('message')}")
+
+    # warm up so the first client request doesn't pay for lazy init
+    bert_refiner.encode_local(["warmup"])
+
+    server = InferenceServer(args.socket, args.max_batch, args.max_wait_ms)
+    print(f"🤖 BERT inference server listening on {args.socket} "
+          f"(max_batch={args.max_batch}, max_wait_ms={args.max_wait_ms})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# jobs.py
+# Background job runner for work too slow for a request (clustering a statement):
+# - jobs are keyed by the caller (e.g. a dataset hash), so submitting the same work
+#   while it is queued or running returns the existing job instead of starting another
+# - a small thread pool runs them; callers poll status(key) for the result or error
+# - finished jobs are kept for the last `keep` keys, then forgotten (results that must
+#   outlive that belong in the caller's own cache)
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobRunner:
+    def __init__(self, workers: int = 1, keep: int = 64, name: str = "jobs"):
+        self.workers = int(workers)
+        self.keep = int(keep)
+        self.name = name
+        self._jobs = OrderedDict()  # key -> job dict
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def _executor(self):
+        # created lazily (and again after fork) so gunicorn workers each get their own threads
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            self._pid = os.getpid()
+            self._jobs.clear()
+        return self._pool
+
+    def submit(self, key: str, fn, *args) -> dict:
+        """Run fn(*args) in the background under key, unless a job for key is already pending."""
+        with self._lock:
+            pool = self._executor()
+            job = self._jobs.get(key)
+            if job is not None and job["status"] in ("queued", "running"):
+                return dict(job)
+            job = {"id": key, "status": "queued", "submitted_at": time.time()}
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            self._trim()
+        pool.submit(self._run, job, fn, args)
+        return dict(job)
+
+    def status(self, key: str):
+        """Copy of the job dict for key (status, result or error), or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(key)
+            return dict(job) if job is not None else None
+
+    def _run(self, job, fn, args):
+        job["status"] = "running"
+        try:
+            job["result"] = fn(*args)
+            job["status"] = "done"
+        except Exception as e:
+            print(f"⚠️ Job {job['id']} failed: {e}")
+            job["error"] = str(e)
+            job["status"] = "failed"
+        job["finished_at"] = time.time()
+
+    def _trim(self):
+        finished = [k for k, j in self._jobs.items() if j["status"] in ("done", "failed")]
+        for k in finished[:max(0, len(self._jobs) - self.keep)]:
+            del self._jobs[k]
@@ -7,10 +7,11 @@ Expose a single function:
 Expected df columns: at least 'Description' and 'Amount' (strings/numbers).
 You can extend features to match your trained pipeline.
 
-Place your trained artifacts under, e.g.:
-    1project/models/vectorizer.pkl
-    1project/models/model.pkl
-or adjust ARTIFACT_DIR below.
+Place your trained artifacts in a model bundle (see model_bundle.py), e.g.:
+    1project/models/classifier.bundle
+or adjust ARTIFACT_DIR below. Legacy vectorizer.pkl/model.pkl pairs in the same
+directory are converted into the bundle the first time they are loaded; pickles that
+can't be bundled (e.g. a non-linear model) keep being loaded as they are.
 
 Run server with:
     PYTHONPATH=. python3 -m server.app
@@ -22,6 +23,11 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans  
 
+try:
+    from .model_bundle import CLASSIFIER_BUNDLE_NAME, load_text_classifier, migrate_pickles
+except ImportError:
+    from model_bundle import CLASSIFIER_BUNDLE_NAME, load_text_classifier, migrate_pickles
+
 # Optional: try to load scikit artifacts if available
 _ARTIFACTS_LOADED = False
 _VECTORIZER = None
@@ -31,6 +37,7 @@ _MODEL = None
 HERE = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(HERE)
 ARTIFACT_DIR = os.path.join(PROJECT_ROOT, "models")
+BUNDLE_PATH = os.path.join(ARTIFACT_DIR, CLASSIFIER_BUNDLE_NAME)
 VEC_PATH = os.path.join(ARTIFACT_DIR, "vectorizer.pkl")
 MODEL_PATH = os.path.join(ARTIFACT_DIR, "model.pkl")
 
@@ -40,8 +47,16 @@ def _try_load_artifacts():
         return
 
     try:
-        import joblib  # scikit-learn joblib
-        if os.path.exists(VEC_PATH) and os.path.exists(MODEL_PATH):
+        if not os.path.exists(BUNDLE_PATH):
+            try:
+                migrate_pickles(BUNDLE_PATH, VEC_PATH, MODEL_PATH, "classifier")
+            except Exception as e:
+                # e.g. a model that isn't linear can't be bundled; it still works as a pickle
+                print(f"⚠️ Could not convert {MODEL_PATH} into {BUNDLE_PATH} ({e}); loading the pickles directly")
+        if os.path.exists(BUNDLE_PATH):
+            _VECTORIZER, _MODEL, _, _ = load_text_classifier(BUNDLE_PATH)
+        elif os.path.exists(VEC_PATH) and os.path.exists(MODEL_PATH):
+            import joblib  # scikit-learn joblib
             _VECTORIZER = joblib.load(VEC_PATH)
             _MODEL = joblib.load(MODEL_PATH)
         _ARTIFACTS_LOADED = True
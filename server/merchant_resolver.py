@@ -0,0 +1,155 @@
+# merchant_resolver.py
+# Resolves transaction descriptions to canonical merchant names from a merchant
+# dictionary, tolerating truncated and misspelled names ("WHOLEFDS", "STARBUKS"):
+# - exact stage: every alias in one RuleMatcher regex (train_from_csv.py), first alias
+#   in dictionary order wins, same as the substring loops it replaces
+# - fuzzy stage: descriptions with no exact hit are cut into windows of 1-3 words
+#   (tokens with digits such as store numbers dropped), joined without spaces, and compared to
+#   the space-less aliases by trigram Dice similarity through a trigram -> alias
+#   inverted index; the best window/alias pair at or above the cutoff wins
+# - a window must start with the alias's first letter and be at least MIN_COVERAGE of
+#   its length, except a prefix of the alias at the very end of the description (bank
+#   descriptions get truncated: "SQ *STARBU"); keeps "PIZZA" off "PIZZA HUT" and
+#   "INTEREST" off "PINTEREST". A prefix followed by another word is a different name
+#   ("MARSHALL FIELD" is not "MARSHALLS")
+# - a window one edit away from an alias scores 1 - 1/len(alias) when that beats its
+#   Dice ("KROGR"): on 5-8 letter names a single typo costs more trigrams than the
+#   cutoff allows
+# - aliases shorter than MIN_FUZZY_LEN characters only ever match exactly ("BP",
+#   "KFC", "ROSS" are too close to ordinary words), and so do aliases that are common
+#   English words ("SIGNAL", "PILOT"); windows made only of common words ("TELEGRAPH
+#   AVE") are never compared
+# - results are cached per description
+
+import re
+from functools import lru_cache
+import numpy as np
+
+try:
+    from .train_from_csv import RuleMatcher
+except ImportError:
+    from train_from_csv import RuleMatcher
+
+DEFAULT_CUTOFF = 0.65
+MIN_FUZZY_LEN = 5
+MAX_WINDOW_WORDS = 3
+MIN_COVERAGE = 0.75
+MIN_ONE_EDIT_DICE = 0.5
+CACHE_SIZE = 65536
+
+# Ordinary words that are merchant aliases or sit within a typo of one, plus words that
+# fill bank descriptions (streets, places). Never fuzzy-matched, as alias or as window.
+COMMON_WORDS = frozenset('''
+    APPLE CASEY CASEYS CHURCH CHURCHS CIRCLE DOMINO EXPRESS FIELD FIELDS FIVE FLYING FOOT
+    GAMES GUYS JERSEY LINE LINES LITTLE LOCKER LOVES LOVED LOVER MARKET MARKETS MARSHAL
+    MARSHALL MARSHALS MEDIUM MEDIUMS MUSIC NEW NORTH PILOT PILOTS PRIME QUOTA REGAL REGALS SHACK
+    SHAKE SHEET SHEETS SIGNAL SIGNALS SLACK SLACKS SOUTH SOUTHWEST SPEEDWAY STORE STORES
+    STREET SUBWAY TEAMS TEAMSTER TELEGRAM TELEGRAPH TICKET TICKETS TRAVEL
+    TWITCH WHOLE ZOOM ZOOMS
+'''.split())
+
+_WORD = re.compile(r"[A-Z&+']+")
+
+
+def squash(text: str) -> str:
+    """Uppercase letters of text with spaces and punctuation removed ("Whole Foods" → "WHOLEFOODS")."""
+    return "".join(_WORD.findall(str(text).upper())).replace("'", "")
+
+
+def trigrams(word: str) -> set:
+    """Padded character trigrams of a squashed word."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def one_edit(a: str, b: str) -> bool:
+    """Whether a and b differ by exactly one inserted, deleted or substituted character."""
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + (len(a) == len(b)):] == b[i + 1:]
+
+
+class MerchantResolver:
+    """aliases: {canonical name: [alias, ...]} in priority order."""
+
+    def __init__(self, aliases: dict, cutoff: float = DEFAULT_CUTOFF, cache_size: int = CACHE_SIZE,
+                 common_words=COMMON_WORDS):
+        self.cutoff = float(cutoff)
+        self.common_words = frozenset(squash(w) for w in common_words)
+        self.names = list(aliases)
+        self._exact = RuleMatcher([(name, list(patterns)) for name, patterns in aliases.items()], default=None)
+
+        # trigram -> ids of the fuzzy-matchable aliases containing it
+        self._alias_name, self._alias_text, self._alias_size = [], [], []
+        postings = {}
+        for name, patterns in aliases.items():
+            for alias in {squash(p) for p in list(patterns) + [name]}:
+                if len(alias) < MIN_FUZZY_LEN or alias in self.common_words:
+                    continue
+                grams = trigrams(alias)
+                for g in grams:
+                    postings.setdefault(g, []).append(len(self._alias_name))
+                self._alias_name.append(name)
+                self._alias_text.append(alias)
+                self._alias_size.append(len(grams))
+        self._postings = {g: np.array(ids, dtype=np.int64) for g, ids in postings.items()}
+        self._alias_size = np.array(self._alias_size, dtype=np.float64)
+        self.resolve_scored = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def resolve(self, text: str):
+        """Canonical merchant for text, or None."""
+        return self.resolve_scored(str(text))[0]
+
+    def _resolve(self, text: str):
+        """→ (canonical merchant or None, similarity: 1.0 for an exact alias hit)."""
+        rank = self._exact.ranks([text.lower()])[0]
+        if rank < len(self.names):
+            return self.names[rank], 1.0
+        return self._fuzzy(text)
+
+    def _windows(self, text: str):
+        """(window, last word, may be a truncated name) triples: truncated when nothing at all follows it."""
+        tokens = str(text).upper().split()
+        kept = [t for t in tokens if not any(c.isdigit() for c in t)]
+        words = [w.replace("'", "") for t in kept for w in _WORD.findall(t)]
+        truncated = bool(tokens) and not any(c.isdigit() for c in tokens[-1])
+        for n in range(1, MAX_WINDOW_WORDS + 1):
+            for i in range(len(words) - n + 1):
+                window = "".join(words[i:i + n])
+                if len(window) >= MIN_FUZZY_LEN - 1 and not self.common_words.issuperset(words[i:i + n]):
+                    last = i + n == len(words)
+                    yield window, last, truncated and last
+
+    def _plausible(self, window: str, last: bool, truncated: bool, alias_id: int) -> bool:
+        alias = self._alias_text[alias_id]
+        if window[0] != alias[0]:
+            return False
+        if alias.startswith(window) and window != alias:
+            return last and (truncated or len(window) >= MIN_COVERAGE * len(alias))
+        return len(window) >= MIN_COVERAGE * len(alias)
+
+    def _fuzzy(self, text: str):
+        best, best_score = None, self.cutoff
+        for window, last, truncated in set(self._windows(text)):
+            grams = trigrams(window)
+            hits = [self._postings[g] for g in grams if g in self._postings]
+            if not hits:
+                continue
+            ids, shared = np.unique(np.concatenate(hits), return_counts=True)
+            score = 2.0 * shared / (len(grams) + self._alias_size[ids])
+            for i in np.flatnonzero(score >= MIN_ONE_EDIT_DICE):
+                alias = self._alias_text[ids[i]]
+                if one_edit(window, alias):
+                    score[i] = max(score[i], 1.0 - 1.0 / len(alias))
+            above = np.flatnonzero(score >= best_score)
+            for i in above[np.argsort(-score[above], kind="stable")]:
+                if self._plausible(window, last, truncated, ids[i]):
+                    if score[i] > best_score or best is None:
+                        best, best_score = self._alias_name[ids[i]], float(score[i])
+                    break
+        return (best, best_score) if best is not None else (None, 0.0)
@@ -0,0 +1,98 @@
+
+# microbatch.py
+# Coalesces concurrent calls into one batched call:
+# - callers block in submit() until their own slice of the batch result is ready
+# - one worker thread drains the queue, flushing after max_wait_ms from the first
+#   queued item or as soon as max_batch rows are waiting, whichever comes first
+
+import os
+import queue
+import threading
+import time
+
+
+class _Pending:
+    __slots__ = ("item", "size", "event", "result", "error")
+
+    def __init__(self, item, size):
+        self.item = item
+        self.size = size
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    run_batch(items) receives the items submitted during one window and must
+    return a list with one result per item, in the same order.
+    size_fn(item) gives the number of rows an item contributes towards max_batch.
+    """
+
+    def __init__(self, run_batch, max_batch: int = 256, max_wait_ms: float = 5.0, size_fn=len):
+        self.run_batch = run_batch
+        self.max_batch = int(max_batch)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self.size_fn = size_fn
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_worker(self):
+        # started lazily (and restarted after fork) so gunicorn workers each get their own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="microbatch", daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """Queue item, wait for its batch to run, and return its result (or raise its error)."""
+        self._ensure_worker()
+        pending = _Pending(item, max(1, int(self.size_fn(item))))
+        self._queue.put(pending)
+        pending.event.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        rows = batch[0].size
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            rows += pending.size
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self.run_batch([p.item for p in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} items")
+                for p, r in zip(batch, results):
+                    p.result = r
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            finally:
+                self.batches += 1
+                self.items += len(batch)
+                for p in batch:
+                    p.event.set()
@@ -0,0 +1,386 @@
+# model_bundle.py
+# Single-file, versioned model bundles for the serving classifiers:
+# - header: magic, format version, manifest length
+# - JSON manifest: kind, model version, created_at, label table, vectorizer and
+#   classifier settings, and per-array dtype/shape/offset/checksum
+# - raw numpy arrays (weights, idf, vocabulary) at 64-byte aligned offsets
+# Bundles are opened with a copy-on-write memmap, so loading is a header read plus
+# array views, nothing is unpickled, and in-process updates (partial_fit) never
+# touch the file. Writes go to a temp file that is atomically renamed into place.
+
+import os
+import json
+import struct
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+MODEL_DIR = os.path.join(PROJECT_ROOT, "models")
+
+# bundle file names inside a model directory
+NLP_BUNDLE_NAME = "nlp_refiner.bundle"         # nlp_refiner: TF-IDF/hashing text + amount buckets → SGD
+CLASSIFIER_BUNDLE_NAME = "classifier.bundle"   # machinelearningclassification: text → linear model
+LABELS_BUNDLE_NAME = "labels.bundle"           # BERT label table, next to the transformer weights
+
+MAGIC = b"ETMB"
+FORMAT_VERSION = 1
+# magic, format version, manifest length
+_HEADER = struct.Struct("<4sIQ")
+ALIGN = 64
+_VOCAB_SEP = "\x00"
+
+# estimators we know how to rebuild from coef_/intercept_/classes_
+_LINEAR_CLASSIFIERS = ("SGDClassifier", "LogisticRegression", "LinearSVC", "RidgeClassifier",
+                       "PassiveAggressiveClassifier", "Perceptron")
+
+
+class BundleError(ValueError):
+    """The file is not a readable bundle, or an object can't be stored in one."""
+
+
+def _checksum(arr: np.ndarray) -> str:
+    return hashlib.blake2b(memoryview(np.ascontiguousarray(arr)).cast("B"), digest_size=16).hexdigest()
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_bundle(path: str, kind: str, arrays: dict, labels=None, meta: dict = None) -> dict:
+    """Write arrays + manifest to path atomically. Returns the manifest."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    for name, a in arrays.items():
+        if a.dtype.hasobject:
+            raise BundleError(f"array {name!r} has object dtype")
+
+    entries, offset = {}, 0
+    for name, a in arrays.items():
+        entries[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset,
+                         "nbytes": int(a.nbytes), "checksum": _checksum(a)}
+        offset = _aligned(offset + a.nbytes)
+
+    version = hashlib.blake2b(digest_size=8)
+    version.update(json.dumps([kind, labels, meta], sort_keys=True, default=str).encode("utf-8"))
+    for name in sorted(entries):
+        version.update(entries[name]["checksum"].encode("ascii"))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "kind": kind,
+        "model_version": version.hexdigest(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "labels": list(labels) if labels is not None else None,
+        "meta": meta or {},
+        "arrays": entries,
+    }
+    blob = json.dumps(manifest).encode("utf-8")
+    data_start = _aligned(_HEADER.size + len(blob))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(blob)))
+        f.write(blob)
+        for name, a in arrays.items():
+            f.seek(data_start + entries[name]["offset"])
+            f.write(memoryview(a).cast("B"))
+        f.truncate(data_start + offset)
+    # readers that already mapped the old file keep their pages until they reopen
+    os.replace(tmp, path)
+    return manifest
+
+
+class ModelBundle:
+    """Read side of a bundle: manifest fields plus zero-copy array views."""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                raise BundleError(f"{path}: truncated header")
+            magic, fmt, manifest_len = _HEADER.unpack(head)
+            if magic != MAGIC:
+                raise BundleError(f"{path}: not a model bundle")
+            if fmt > FORMAT_VERSION:
+                raise BundleError(f"{path}: bundle format {fmt} is newer than supported ({FORMAT_VERSION})")
+            try:
+                self.manifest = json.loads(f.read(manifest_len).decode("utf-8"))
+            except ValueError as e:
+                raise BundleError(f"{path}: corrupt manifest ({e})")
+
+        data_start = _aligned(_HEADER.size + manifest_len)
+        entries = self.manifest["arrays"]
+        end = max((data_start + e["offset"] + e["nbytes"] for e in entries.values()), default=0)
+        if os.path.getsize(path) < end:
+            raise BundleError(f"{path}: truncated data")
+        # copy-on-write: callers may mutate arrays in place without changing the file
+        mm = np.memmap(path, dtype=np.uint8, mode="c") if entries else None
+        self.arrays = {}
+        for name, e in entries.items():
+            arr = np.ndarray(tuple(e["shape"]), dtype=np.dtype(e["dtype"]), buffer=mm, offset=data_start + e["offset"])
+            if verify and _checksum(arr) != e["checksum"]:
+                raise BundleError(f"{path}: checksum mismatch for {name!r}")
+            self.arrays[name] = arr
+
+    @property
+    def kind(self) -> str:
+        return self.manifest["kind"]
+
+    @property
+    def version(self) -> str:
+        return self.manifest["model_version"]
+
+    @property
+    def labels(self):
+        return self.manifest["labels"]
+
+    @property
+    def meta(self) -> dict:
+        return self.manifest["meta"]
+
+    def info(self) -> dict:
+        return {
+            "path": self.path,
+            "kind": self.kind,
+            "model_version": self.version,
+            "created_at": self.manifest["created_at"],
+            "format_version": self.manifest["format_version"],
+            "n_labels": len(self.labels or []),
+            "bytes": os.path.getsize(self.path),
+        }
+
+
+def file_signature(path: str):
+    """(inode, mtime, size) of path, or None; changes whenever a bundle is re-published."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+@contextmanager
+def bundle_lock(path: str):
+    """Exclusive cross-process lock for read-modify-write cycles on the bundle at path."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def open_bundle(path: str, verify: bool = True):
+    """ModelBundle for path, or None when the file doesn't exist."""
+    return ModelBundle(path, verify=verify) if os.path.exists(path) else None
+
+
+# ---- sklearn <-> bundle -----------------------------------------------------
+
+def _jsonable_params(params: dict, owner: str) -> dict:
+    out = {}
+    for k, v in params.items():
+        if callable(v) and not isinstance(v, type):
+            raise BundleError(f"{owner}.{k} is a callable and can't be stored in a bundle")
+        if isinstance(v, type):
+            v = np.dtype(v).name
+        elif isinstance(v, (tuple, frozenset, set)):
+            v = list(v)
+        elif isinstance(v, np.generic):
+            v = v.item()
+        elif v is not None and not isinstance(v, (str, int, float, bool, list, dict)):
+            if k == "random_state":  # a RandomState instance: restart unseeded
+                v = None
+            else:
+                raise BundleError(f"{owner}.{k}={v!r} can't be stored in a bundle")
+        out[k] = v
+    return out
+
+
+def _vectorizer_to_bundle(vec):
+    """→ (settings dict, arrays dict) for a TfidfVectorizer/CountVectorizer/HashingVectorizer."""
+    name = type(vec).__name__
+    params = vec.get_params()
+    params.pop("vocabulary", None)
+    settings = {"type": name, "params": _jsonable_params(params, name)}
+    arrays = {}
+    if name in ("TfidfVectorizer", "CountVectorizer"):
+        terms = sorted(vec.vocabulary_, key=vec.vocabulary_.get)
+        if any(_VOCAB_SEP in t for t in terms):
+            raise BundleError("vocabulary terms contain NUL")
+        arrays["vocab"] = np.frombuffer(_VOCAB_SEP.join(terms).encode("utf-8"), dtype=np.uint8)
+        settings["n_terms"] = len(terms)
+        if name == "TfidfVectorizer" and vec.use_idf:
+            arrays["idf"] = np.asarray(vec.idf_)
+    elif name != "HashingVectorizer":
+        raise BundleError(f"unsupported vectorizer: {name}")
+    return settings, arrays
+
+
+def _vectorizer_from_bundle(settings, arrays):
+    from sklearn.feature_extraction import text as sk_text
+    name = settings["type"]
+    params = dict(settings["params"])
+    if params.get("ngram_range") is not None:
+        params["ngram_range"] = tuple(params["ngram_range"])
+    if params.get("dtype") is not None:
+        params["dtype"] = np.dtype(params["dtype"]).type
+    vec = getattr(sk_text, name)(**params)
+    if "vocab" in arrays:
+        terms = arrays["vocab"].tobytes().decode("utf-8").split(_VOCAB_SEP) if settings["n_terms"] else []
+        vec.vocabulary_ = dict(zip(terms, range(len(terms))))
+    if "idf" in arrays:
+        vec.idf_ = arrays["idf"]
+    return vec
+
+
+def vectorizer_fingerprint(vec) -> str:
+    """Stable id of a fitted vectorizer's settings + vocabulary; equal ids produce equal features."""
+    settings, arrays = _vectorizer_to_bundle(vec)
+    h = hashlib.blake2b(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"), digest_size=8)
+    for name in sorted(arrays):
+        h.update(_checksum(arrays[name]).encode("ascii"))
+    return h.hexdigest()
+
+
+def _classifier_to_bundle(clf, weights_dtype=None, sparse_coef=False):
+    name = type(clf).__name__
+    if name not in _LINEAR_CLASSIFIERS:
+        raise BundleError(f"unsupported classifier: {name}")
+    params = _jsonable_params(clf.get_params(), name)
+    coef = clf.coef_
+    dtype = np.dtype(weights_dtype or coef.dtype)
+    settings = {"type": name, "params": params, "n_features": int(coef.shape[1]),
+                "t": float(getattr(clf, "t_", 1.0)), "weights_dtype": dtype.name}
+    if sparse_coef or hasattr(coef, "tocsr"):  # pruned weights: store only the non-zeros as CSR parts
+        from scipy import sparse
+        coef = sparse.csr_matrix(coef)
+        settings["coef_format"] = "csr"
+        settings["coef_shape"] = list(coef.shape)
+        arrays = {"coef.data": coef.data.astype(dtype), "coef.indices": coef.indices, "coef.indptr": coef.indptr}
+    else:
+        arrays = {"coef": np.asarray(coef, dtype=dtype)}
+    arrays["intercept"] = np.atleast_1d(np.asarray(clf.intercept_, dtype=dtype))
+    classes = [c.item() if isinstance(c, np.generic) else c for c in clf.classes_]
+    return settings, arrays, classes
+
+
+def _classifier_from_bundle(settings, arrays, classes):
+    from sklearn import linear_model, svm
+    name = settings["type"]
+    cls = getattr(svm, name) if name == "LinearSVC" else getattr(linear_model, name)
+    clf = cls(**settings["params"])
+    if settings.get("coef_format") == "csr":
+        from scipy import sparse
+        data = arrays["coef.data"]
+        if data.dtype != np.float64:  # sparse @ sparse needs matching dtypes; only the surviving weights are widened
+            data = data.astype(np.float64)
+        clf.coef_ = sparse.csr_matrix((data, arrays["coef.indices"], arrays["coef.indptr"]),
+                                      shape=tuple(settings["coef_shape"]))
+    else:
+        # served at the stored precision straight from the memory map (predict widens per batch);
+        # trainable() makes the private float64 copy partial_fit needs
+        clf.coef_ = arrays["coef"]
+    clf.intercept_ = arrays["intercept"]
+    clf.classes_ = np.array(classes, dtype=object if isinstance(classes[0], str) else None)
+    clf.n_features_in_ = settings["n_features"]
+    clf.t_ = settings["t"]  # lets SGD partial_fit resume the learning-rate schedule
+    return clf
+
+
+def trainable(clf):
+    """Make bundle-loaded weights usable by partial_fit again (dense float64), in place."""
+    if hasattr(clf.coef_, "toarray"):
+        clf.coef_ = clf.coef_.toarray()
+    if clf.coef_.dtype != np.float64:
+        clf.coef_ = clf.coef_.astype(np.float64)
+        clf.intercept_ = np.asarray(clf.intercept_, dtype=np.float64)
+    return clf
+
+
+def bundle_format(bundle) -> dict:
+    """save_text_classifier kwargs that reproduce the weight storage of a loaded bundle."""
+    settings = bundle.meta.get("classifier", {})
+    return {"weights_dtype": settings.get("weights_dtype"), "sparse_coef": settings.get("coef_format") == "csr"}
+
+
+def save_text_classifier(path: str, vectorizer, clf, kind: str, labels=None, meta: dict = None,
+                         weights_dtype=None, sparse_coef: bool = False) -> dict:
+    """
+    Bundle a fitted vectorizer + linear classifier. labels defaults to clf.classes_.
+    weights_dtype (e.g. "float16") stores coef_/intercept_ at that precision and
+    sparse_coef stores only the non-zero weights (for pruned hashing models).
+    """
+    vec_settings, vec_arrays = _vectorizer_to_bundle(vectorizer)
+    clf_settings, clf_arrays, classes = _classifier_to_bundle(clf, weights_dtype, sparse_coef)
+    arrays = {f"vectorizer.{k}": v for k, v in vec_arrays.items()}
+    arrays.update({f"classifier.{k}": v for k, v in clf_arrays.items()})
+    meta = dict(meta or {}, vectorizer=vec_settings, classifier=clf_settings, classes=classes)
+    return write_bundle(path, kind, arrays, labels=list(labels) if labels is not None else classes, meta=meta)
+
+
+def load_text_classifier(path: str, verify: bool = True):
+    """→ (vectorizer, clf, labels, bundle) rebuilt from the bundle at path."""
+    bundle = ModelBundle(path, verify=verify)
+    meta = bundle.meta
+    if "vectorizer" not in meta or "classifier" not in meta:
+        raise BundleError(f"{path}: {bundle.kind!r} bundle has no text classifier")
+    def part(prefix):
+        return {k[len(prefix):]: v for k, v in bundle.arrays.items() if k.startswith(prefix)}
+    vec = _vectorizer_from_bundle(meta["vectorizer"], part("vectorizer."))
+    clf = _classifier_from_bundle(meta["classifier"], part("classifier."), meta["classes"])
+    return vec, clf, bundle.labels, bundle
+
+
+def save_labels(path: str, labels, meta: dict = None) -> dict:
+    """Label-table-only bundle (e.g. the classes of the fine-tuned BERT head)."""
+    return write_bundle(path, "labels", {}, labels=[str(l) for l in labels], meta=meta)
+
+
+def migrate_pickles(bundle_path: str, vec_path: str, clf_path: str, kind: str, labels_path: str = None):
+    """One-time conversion of legacy joblib artifacts into a bundle. Returns the manifest or None."""
+    if not (os.path.exists(vec_path) and os.path.exists(clf_path)):
+        return None
+    import joblib
+    labels = joblib.load(labels_path) if labels_path and os.path.exists(labels_path) else None
+    manifest = save_text_classifier(bundle_path, joblib.load(vec_path), joblib.load(clf_path), kind, labels=labels)
+    print(f"📦 Migrated {os.path.basename(vec_path)}/{os.path.basename(clf_path)} → {bundle_path}")
+    return manifest
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or convert model bundles")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_info = sub.add_parser("info", help="print a bundle's manifest summary")
+    p_info.add_argument("path")
+    p_mig = sub.add_parser("migrate", help="convert legacy .pkl artifacts in models/ into bundles")
+    p_mig.add_argument("--model-dir", default=MODEL_DIR)
+    args = parser.parse_args()
+
+    if args.cmd == "info":
+        b = ModelBundle(args.path)
+        print(json.dumps(dict(b.info(), labels=b.labels, arrays=b.manifest["arrays"]), indent=2))
+    else:
+        d = args.model_dir
+        migrate_pickles(os.path.join(d, NLP_BUNDLE_NAME), os.path.join(d, "tfidf.pkl"),
+                        os.path.join(d, "sgd.pkl"), "nlp_refiner", os.path.join(d, "labels.pkl"))
+        migrate_pickles(os.path.join(d, CLASSIFIER_BUNDLE_NAME), os.path.join(d, "vectorizer.pkl"),
+                        os.path.join(d, "model.pkl"), "classifier")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Model compaction for the text-classifier bundles (nlp_refiner.bundle, classifier.bundle).
+
+Prunes the text features that barely move any decision (smallest weight magnitude
+across labels, or lowest chi-square against labels on an evaluation set), stores
+the surviving weights as float32/float16, and only replaces the bundle when the
+compacted model, re-loaded from disk, stays within --max-drop of the original's
+accuracy and macro-F1 on the evaluation set.
+
+The evaluation set defaults to the retrain holdout (retrain.py): feedback and
+rule-labelled statement rows whose normalized description hashes into the frozen
+holdout, so it carries the labels the model was actually trained on. --eval-csv
+scores a labelled CSV instead.
+
+TF-IDF models lose the pruned vocabulary terms outright (smaller vocab, idf and
+coef). Hashing models keep their hash space; only the surviving weights are stored,
+as CSR. Non-text columns (the amount buckets) are always kept.
+
+Run with:
+    PYTHONPATH=. python3 -m server.model_compaction models/nlp_refiner.bundle --keep 0.2 --dtype float16
+"""
+
+import argparse
+import copy
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+try:
+    from .model_bundle import load_text_classifier, save_text_classifier
+    from .train_from_csv import amount_bucket, categorize_series
+except ImportError:
+    from model_bundle import load_text_classifier, save_text_classifier
+    from train_from_csv import amount_bucket, categorize_series
+
+METHODS = ["weight", "chi2"]
+DTYPES = ["float64", "float32", "float16"]
+DEFAULT_KEEP = 0.25
+DEFAULT_MAX_DROP = 0.01
+
+
+def n_text_features(vec) -> int:
+    return len(vec.vocabulary_) if hasattr(vec, "vocabulary_") else int(vec.n_features)
+
+
+def featurize(vec, meta: dict, df: pd.DataFrame):
+    """Feature matrix in the layout the bundle was trained on (text [+ amount buckets])."""
+    X = vec.transform(df["Description"].fillna("").astype(str).values)
+    if meta.get("features") == "text+amount_bucket":
+        X = sparse.hstack([X, amount_bucket(df["Amount"])], format="csr")
+    return X
+
+
+def feature_scores(clf, n_text: int, method: str = "weight", X=None, y=None) -> np.ndarray:
+    """Importance of each text feature; higher is kept first."""
+    coef = clf.coef_.toarray() if sparse.issparse(clf.coef_) else np.asarray(clf.coef_)
+    if method == "weight":
+        return np.abs(coef[:, :n_text]).max(axis=0)
+    if method == "chi2":
+        from sklearn.feature_selection import chi2
+        if X is None or y is None:
+            raise ValueError("chi2 pruning needs labelled evaluation data")
+        scores, _ = chi2(abs(X[:, :n_text]), y)
+        # features that never fire in the data get no chi2 score; rank them by weight last
+        scores = np.nan_to_num(scores, nan=0.0)
+        return scores + 1e-12 * np.abs(coef[:, :n_text]).max(axis=0)
+    raise ValueError(f"unknown pruning method: {method}")
+
+
+def select_features(scores: np.ndarray, keep) -> np.ndarray:
+    """Sorted indices of the top features: keep >= 1 is a count, 0 < keep < 1 a fraction of non-zero scores."""
+    candidates = int((scores > 0).sum())
+    k = int(keep) if keep >= 1 else int(round(candidates * keep))
+    k = max(1, min(k, candidates))
+    return np.sort(np.argpartition(-scores, k - 1)[:k])
+
+
+def prune(vec, clf, keep_idx: np.ndarray):
+    """→ (vectorizer, classifier, sparse_coef) restricted to the text features in keep_idx."""
+    n_text = n_text_features(vec)
+    coef = clf.coef_.toarray() if sparse.issparse(clf.coef_) else np.asarray(clf.coef_)
+    out = copy.copy(clf)
+
+    if hasattr(vec, "vocabulary_"):
+        from sklearn.base import clone
+        terms = np.empty(n_text, dtype=object)
+        for term, col in vec.vocabulary_.items():
+            terms[col] = term
+        new_vec = clone(vec)
+        new_vec.vocabulary_ = {t: i for i, t in enumerate(terms[keep_idx])}
+        if getattr(vec, "use_idf", False):
+            new_vec.idf_ = np.asarray(vec.idf_)[keep_idx]
+        out.coef_ = np.hstack([coef[:, keep_idx], coef[:, n_text:]])
+        out.n_features_in_ = out.coef_.shape[1]
+        return new_vec, out, False
+
+    # hashing: the column layout is fixed by the hash, so zero the pruned weights and store sparse
+    mask = np.zeros(coef.shape[1], dtype=bool)
+    mask[keep_idx] = True
+    mask[n_text:] = True
+    out.coef_ = np.where(mask, coef, 0.0)
+    return vec, out, True
+
+
+def _macro_f1(y_true, y_pred):
+    from sklearn.metrics import f1_score
+    return float(f1_score(y_true, y_pred, labels=sorted(set(y_true)), average="macro", zero_division=0))
+
+
+def evaluate(vec, clf, meta, df, y):
+    pred = clf.predict(featurize(vec, meta, df)).astype(str)
+    return pred, {"accuracy": float((pred == y).mean()), "macro_f1": _macro_f1(y, pred)}
+
+
+def load_eval_frame(path: str, label_column: str = "Category"):
+    """(df, labels) from a CSV; rule labels stand in when label_column is missing."""
+    df = pd.read_csv(path, on_bad_lines="skip").dropna(subset=["Description"]).reset_index(drop=True)
+    if "Amount" not in df.columns:
+        df["Amount"] = 0.0
+    df["Amount"] = pd.to_numeric(df["Amount"].astype(str).str.replace(",", ""), errors="coerce").fillna(0.0)
+    if label_column in df.columns:
+        df = df.dropna(subset=[label_column]).reset_index(drop=True)
+        y = df[label_column].astype(str).values
+    else:
+        y = categorize_series(df["Description"].astype(str)).astype(str).values
+    return df, y
+
+
+def load_holdout_frame():
+    """(df, labels) of the retrain holdout rows (feedback + rule labels, no BERT distillation)."""
+    try:
+        from .retrain import collect_training_data, holdout_mask
+    except ImportError:
+        from retrain import collect_training_data, holdout_mask
+    data = collect_training_data(distill=False)
+    df = data[holdout_mask(data["Key"])].reset_index(drop=True)
+    if df.empty:
+        raise ValueError("the retrain holdout is empty; pass --eval-csv with labelled rows")
+    return df, df["Category"].astype(str).values
+
+
+def _timed_load(path):
+    t0 = time.perf_counter()
+    vec, clf, _, bundle = load_text_classifier(path)
+    return vec, clf, bundle, (time.perf_counter() - t0) * 1000.0
+
+
+def _weight_bytes(bundle) -> int:
+    return int(sum(a.nbytes for name, a in bundle.arrays.items() if name.startswith("classifier.")))
+
+
+def compact_bundle(src: str, dst: str = None, keep=DEFAULT_KEEP, method: str = "weight",
+                   weights_dtype: str = "float16", eval_csv: str = None,
+                   label_column: str = "Category", max_drop: float = DEFAULT_MAX_DROP, force: bool = False) -> dict:
+    """
+    Prune + quantize the bundle at src and write it to dst (default: replace src).
+    The compacted bundle is accepted only if accuracy and macro-F1 on eval_csv (default:
+    the retrain holdout) drop by at most max_drop (or force is set). Returns a report dict.
+    """
+    dst = dst or src
+    vec, clf, base_bundle, base_load_ms = _timed_load(src)
+    meta = {k: v for k, v in base_bundle.meta.items() if k not in ("vectorizer", "classifier", "classes")}
+    df, y = load_eval_frame(eval_csv, label_column) if eval_csv else load_holdout_frame()
+
+    n_text = n_text_features(vec)
+    X = featurize(vec, meta, df) if method == "chi2" else None
+    keep_idx = select_features(feature_scores(clf, n_text, method, X, y), keep)
+    new_vec, new_clf, sparse_coef = prune(vec, clf, keep_idx)
+
+    # verify the artifact that will actually be served: write, re-load from disk, score
+    tmp = f"{dst}.compact{os.getpid()}"
+    save_text_classifier(tmp, new_vec, new_clf, kind=base_bundle.kind, labels=base_bundle.labels,
+                         meta=dict(meta, compaction={"method": method, "keep": keep, "source": base_bundle.version}),
+                         weights_dtype=weights_dtype, sparse_coef=sparse_coef)
+    c_vec, c_clf, c_bundle, c_load_ms = _timed_load(tmp)
+
+    base_pred, base_metrics = evaluate(vec, clf, meta, df, y)
+    c_pred, c_metrics = evaluate(c_vec, c_clf, meta, df, y)
+    drop = {k: base_metrics[k] - c_metrics[k] for k in base_metrics}
+    accepted = force or all(d <= max_drop for d in drop.values())
+
+    report = {
+        "source": src,
+        "output": dst if accepted else None,
+        "accepted": bool(accepted),
+        "method": method,
+        "weights_dtype": weights_dtype,
+        "eval_source": eval_csv or "retrain holdout",
+        "eval_rows": int(len(df)),
+        "text_features": {"before": int(n_text), "after": int(len(keep_idx))},
+        "bundle_bytes": {"before": os.path.getsize(src), "after": os.path.getsize(tmp)},
+        "weight_bytes": {"before": _weight_bytes(base_bundle), "after": _weight_bytes(c_bundle)},
+        "load_ms": {"before": base_load_ms, "after": c_load_ms},
+        "metrics": {"before": base_metrics, "after": c_metrics, "drop": drop},
+        "agreement": float((base_pred == c_pred).mean()),
+    }
+    if accepted:
+        os.replace(tmp, dst)
+    else:
+        os.unlink(tmp)
+    return report
+
+
+def _print_report(r):
+    def line(name, key, fmt):
+        print(f"  {name:<14} {fmt(r[key]['before']):>12} → {fmt(r[key]['after']):>12}")
+    print(f"\n📦 Compaction of {r['source']} ({r['method']}, {r['weights_dtype']}, "
+          f"{r['eval_rows']} eval rows from {r['eval_source']})")
+    line("text features", "text_features", str)
+    line("bundle size", "bundle_bytes", lambda b: f"{b / 1024:.1f} KiB")
+    line("weights", "weight_bytes", lambda b: f"{b / 1024:.1f} KiB")
+    line("load time", "load_ms", lambda ms: f"{ms:.1f} ms")
+    m = r["metrics"]
+    for k in ("accuracy", "macro_f1"):
+        print(f"  {k:<14} {m['before'][k]:>12.4f} → {m['after'][k]:>12.4f}  (drop {m['drop'][k]:+.4f})")
+    print(f"  {'agreement':<14} {r['agreement']:>12.2%}")
+    print(f"\n✅ Wrote {r['output']}" if r["accepted"] else "\n❌ Accuracy drop above the limit; bundle left unchanged")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune and quantize a text-classifier model bundle")
+    parser.add_argument("bundle", help="source bundle, e.g. models/nlp_refiner.bundle")
+    parser.add_argument("--out", default=None, help="output bundle (default: replace the source)")
+    parser.add_argument("--keep", type=float, default=DEFAULT_KEEP,
+                        help="text features to keep: a count (>= 1) or a fraction of non-zero features (< 1)")
+    parser.add_argument("--method", choices=METHODS, default="weight")
+    parser.add_argument("--dtype", choices=DTYPES, default="float16", help="storage precision for the weights")
+    parser.add_argument("--eval-csv", default=None, help="labelled CSV to evaluate on (default: the retrain holdout)")
+    parser.add_argument("--label-column", default="Category")
+    parser.add_argument("--max-drop", type=float, default=DEFAULT_MAX_DROP,
+                        help="largest allowed drop in accuracy or macro-F1")
+    parser.add_argument("--force", action="store_true", help="write the compacted bundle even if the check fails")
+    parser.add_argument("--report", default=None, help="also write the report as JSON here")
+    args = parser.parse_args()
+
+    report = compact_bundle(args.bundle, args.out, keep=args.keep, method=args.method, weights_dtype=args.dtype,
+                            eval_csv=args.eval_csv, label_column=args.label_column,
+                            max_drop=args.max_drop, force=args.force)
+    _print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if not report["accepted"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,18 @@
 # Lightweight NLP classifier with online learning:
 # - TF-IDF on Description + simple numeric features (Amount bucket)
 # - SGDClassifier(partial_fit) so we can learn from feedback without full retrain
+# - new categories from feedback grow the class set in place (online_classifier.py)
+# - keyword rules mined from feedback (rule_mining.py) resolve known merchants before the model
+# - feature rows of transactions seen before come from the feature store (feature_store.py)
+# - predictions are kept in a ledger; after an update only rows whose class could have
+#   flipped are re-scored (rescoring.py)
+# - descriptions are indexed by their text vectors for similar-transaction lookups
+#   (similarity.py)
 
 import os
-import joblib
+import time
+import threading
+from datetime import datetime, timezone
 import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -12,14 +21,46 @@ from sklearn.linear_model import SGDClassifier
 from sklearn.pipeline import FeatureUnion
 from scipy import sparse
 
+try:
+    from .model_bundle import (NLP_BUNDLE_NAME, load_text_classifier, save_text_classifier, migrate_pickles,
+                               bundle_format, bundle_lock, file_signature, vectorizer_fingerprint)
+    from .feature_store import open_feature_store, row_keys
+    from .rescoring import ScoredLedger, ledger_path
+    from .online_classifier import learn_online
+    from .rule_mining import MINED_RULES_PATH, load_rules, mine_feedback_rules
+    from .similarity import SimilarityIndex, description_keys, index_path
+except ImportError:
+    from model_bundle import (NLP_BUNDLE_NAME, load_text_classifier, save_text_classifier, migrate_pickles,
+                              bundle_format, bundle_lock, file_signature, vectorizer_fingerprint)
+    from feature_store import open_feature_store, row_keys
+    from rescoring import ScoredLedger, ledger_path
+    from online_classifier import learn_online
+    from rule_mining import MINED_RULES_PATH, load_rules, mine_feedback_rules
+    from similarity import SimilarityIndex, description_keys, index_path
+
 HERE = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(HERE)
 MODEL_DIR = os.path.join(PROJECT_ROOT, "models")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+BUNDLE_PATH = os.path.join(MODEL_DIR, NLP_BUNDLE_NAME)
+# legacy pickles, converted into the bundle on first load
 VEC_PATH = os.path.join(MODEL_DIR, "tfidf.pkl")
 CLF_PATH = os.path.join(MODEL_DIR, "sgd.pkl")
 LABELS_PATH = os.path.join(MODEL_DIR, "labels.pkl")
+# every feedback sample, so scheduled retrains (retrain.py) can consolidate them
+FEEDBACK_LOG_PATH = os.path.join(MODEL_DIR, "feedback_log.csv")
+FEEDBACK_LOG_COLUMNS = ["Timestamp", "Description", "Amount", "Category"]
+AMOUNT_BUCKETS = 8
+BUNDLE_META = {"features": "text+amount_bucket", "amount_buckets": AMOUNT_BUCKETS}
+# weight precision/sparsity of the loaded bundle, kept when feedback re-saves a compacted model
+_BUNDLE_FORMAT = {}
+# extra manifest fields of the loaded bundle (e.g. retrain generation), kept on re-save
+_BUNDLE_META = {}
+# cache vectorized rows on disk; turn off with NLP_FEATURE_STORE=0 (e.g. read-only deployments)
+FEATURE_STORE_ENABLED = os.environ.get("NLP_FEATURE_STORE", "1") != "0"
+# serializes feedback updates; predictions read whichever model was swapped in last
+_LEARN_LOCK = threading.Lock()
 
 # Default taxonomy — extend as you like
 DEFAULT_LABELS = [
@@ -35,13 +76,46 @@ def _featurize(desc: pd.Series, amt: pd.Series):
     X_amt = _amount_bucket(amt)
     return X_text, X_amt
 
+def _features(vec, desc: pd.Series, amt: pd.Series) -> sparse.csr_matrix:
+    X_text, X_amt = _featurize(desc, amt)
+    return sparse.hstack([vec.transform(X_text), X_amt], format="csr")
+
+def _unique_rows(desc: pd.Series, amt: pd.Series):
+    """Feature-store keys of the distinct (description, amount bucket) rows → (keys, first, inverse, X_amt)."""
+    X_amt = _amount_bucket(amt)
+    keys, first, inverse = np.unique(row_keys(desc, X_amt.indices), return_index=True, return_inverse=True)
+    return keys, first, inverse, X_amt
+
+def _stored_features(store, vec, keys, desc: pd.Series, X_amt) -> sparse.csr_matrix:
+    """Feature rows for distinct keys: read from the feature store, new ones vectorized and added to it."""
+    if store is None:
+        return sparse.hstack([vec.transform(desc.fillna("").astype(str).values), X_amt], format="csr")
+    found, X_found = store.lookup(keys)
+    missing = np.flatnonzero(~found)
+    if not len(missing):
+        return X_found
+    X_new = sparse.hstack([vec.transform(desc.iloc[missing].fillna("").astype(str).values), X_amt[missing]],
+                          format="csr")
+    try:
+        store.add(keys[missing], X_new)
+    except OSError as e:
+        print(f"⚠️ Could not write feature store: {e}")
+    order = np.argsort(np.concatenate([np.flatnonzero(found), missing]), kind="stable")
+    return sparse.vstack([X_found, X_new], format="csr")[order]
+
+def _store_rows(store):
+    """fetch_rows for ScoredLedger.sync: rows come from the feature store only."""
+    if store is None:
+        return lambda keys: (np.zeros(len(keys), dtype=bool), None)
+    return store.lookup
+
 def _amount_bucket(x: pd.Series) -> sparse.csr_matrix:
     # coarse bins for amount; model learns typical ranges per category
     v = pd.to_numeric(x, errors="coerce").fillna(0.0).values.reshape(-1, 1)
     # bins: very small, small, medium, large, very large
     bins = np.digitize(v, [-100, -25, -5, 5, 25, 100])
     # one-hot encode bins
-    n = v.shape[0]; k = 8
+    n = v.shape[0]; k = AMOUNT_BUCKETS
     rows = np.repeat(np.arange(n), 1)
     cols = bins.flatten().clip(0, k-1)
     data = np.ones(n)
@@ -56,21 +130,30 @@ def _build_vectorizer():
         max_features=50000
     )
 
+def _save_bundle(vec, clf, labels):
+    save_text_classifier(BUNDLE_PATH, vec, clf, kind="nlp_refiner", labels=labels,
+                         meta=dict(_BUNDLE_META, **BUNDLE_META), **_BUNDLE_FORMAT)
+
+def _extra_meta(bundle):
+    return {k: v for k, v in bundle.meta.items() if k not in ("vectorizer", "classifier", "classes")}
+
 def _load_or_init():
+    global _BUNDLE_FORMAT, _BUNDLE_META
     labels = DEFAULT_LABELS
-    if os.path.exists(LABELS_PATH):
+    if not os.path.exists(BUNDLE_PATH):
         try:
-            labels = joblib.load(LABELS_PATH)
-        except Exception:
-            pass
+            migrate_pickles(BUNDLE_PATH, VEC_PATH, CLF_PATH, "nlp_refiner", LABELS_PATH)
+        except Exception as e:
+            print(f"⚠️ Could not migrate legacy NLP model pickles: {e}")
 
-    if os.path.exists(VEC_PATH) and os.path.exists(CLF_PATH):
+    if os.path.exists(BUNDLE_PATH):
         try:
-            vec = joblib.load(VEC_PATH)
-            clf = joblib.load(CLF_PATH)
+            vec, clf, labels, bundle = load_text_classifier(BUNDLE_PATH)
+            _BUNDLE_FORMAT, _BUNDLE_META = bundle_format(bundle), _extra_meta(bundle)
             return vec, clf, labels
-        except Exception:
-            pass
+        except Exception as e:
+            print(f"⚠️ Could not load {BUNDLE_PATH}: {e}")
+            labels = DEFAULT_LABELS
 
     # If no trained model exists, create a basic one
     vec = _build_vectorizer()
@@ -166,61 +249,230 @@ def _train_initial_model(vec, clf, labels):
     clf.partial_fit(X, y, classes=np.array(labels, dtype=object))
     
     # Save the trained model
-    joblib.dump(vec, VEC_PATH)
-    joblib.dump(clf, CLF_PATH)
-    joblib.dump(labels, LABELS_PATH)
+    _save_bundle(vec, clf, labels)
 
 _VECTORIZER, _CLF, _LABELS = _load_or_init()
+# (vectorizer, classifier, feature store, scored ledger) as one reference, so a hot swap is atomic for readers
+_ACTIVE = None
+# file_signature of the bundle the in-memory model was loaded from / saved to
+_LOADED_SIG = file_signature(BUNDLE_PATH)
+_WATCHER = None  # (pid, thread)
+# (file_signature, MinedRules or None) for the mined-rules file
+_RULES = (None, None)
+# (vectorizer, SimilarityIndex) of description text vectors
+_SIMILAR = (None, None)
+_SIMILAR_LOCK = threading.Lock()
+
+def _feature_store(vec):
+    """Feature store for vec's feature layout, or None when disabled or unavailable."""
+    if not FEATURE_STORE_ENABLED:
+        return None
+    try:
+        n_text = len(vec.vocabulary_) if hasattr(vec, "vocabulary_") else int(vec.n_features)
+        return open_feature_store(vectorizer_fingerprint(vec), n_text + AMOUNT_BUCKETS, extra=BUNDLE_META)
+    except Exception as e:
+        print(f"⚠️ Feature store unavailable: {e}")
+        return None
+
+def _set_model(vec, clf, labels):
+    global _VECTORIZER, _CLF, _LABELS, _ACTIVE
+    # feedback updates keep the vectorizer, and with it every stored feature row and scored ledger row
+    if _ACTIVE is not None and _ACTIVE[0] is vec:
+        store, ledger = _ACTIVE[2], _ACTIVE[3]
+    else:
+        store = _feature_store(vec)
+        ledger = ScoredLedger(ledger_path(store.directory) if store is not None else None)
+    _VECTORIZER, _CLF, _LABELS = vec, clf, labels
+    _ACTIVE = (vec, clf, store, ledger)
+
+_set_model(_VECTORIZER, _CLF, _LABELS)
+
+def reload_if_changed() -> bool:
+    """Hot-swap in a bundle published by another process (scheduled retrain, another worker's feedback)."""
+    global _LOADED_SIG, _BUNDLE_FORMAT, _BUNDLE_META
+    sig = file_signature(BUNDLE_PATH)
+    if sig is None or sig == _LOADED_SIG:
+        return False
+    try:
+        vec, clf, labels, bundle = load_text_classifier(BUNDLE_PATH)
+    except Exception as e:
+        print(f"⚠️ Could not reload {BUNDLE_PATH}: {e}")
+        _LOADED_SIG = sig  # don't retry a broken file on every poll
+        return False
+    _BUNDLE_FORMAT, _BUNDLE_META = bundle_format(bundle), _extra_meta(bundle)
+    _set_model(vec, clf, labels)
+    _LOADED_SIG = sig
+    print(f"🔄 Loaded NLP model {bundle.version} (generation {bundle.meta.get('generation', 0)})")
+    return True
+
+def reload_rules_if_changed() -> bool:
+    """Swap in mined rules republished by rule_mining (feedback, scheduled retrain, CLI)."""
+    global _RULES
+    sig = file_signature(MINED_RULES_PATH)
+    if sig == _RULES[0]:
+        return False
+    try:
+        rules = load_rules(MINED_RULES_PATH)
+    except Exception as e:
+        print(f"⚠️ Could not load {MINED_RULES_PATH}: {e}")
+        rules = _RULES[1]
+    _RULES = (sig, rules)
+    return True
+
+reload_rules_if_changed()
+
+def start_model_watcher(interval_s: float = 30.0):
+    """Poll the bundle in a daemon thread and hot-swap new versions; requests never wait on it."""
+    global _WATCHER
+    if _WATCHER is not None and _WATCHER[0] == os.getpid() and _WATCHER[1].is_alive():
+        return
+    def loop():
+        while True:
+            time.sleep(interval_s)
+            with _LEARN_LOCK:
+                reload_if_changed()
+                reload_rules_if_changed()
+    thread = threading.Thread(target=loop, name="nlp-model-watcher", daemon=True)
+    thread.start()
+    _WATCHER = (os.getpid(), thread)
+
+def _append_feedback_log(samples: pd.DataFrame, y):
+    log = pd.DataFrame({
+        "Timestamp": datetime.now(timezone.utc).isoformat(),
+        "Description": samples["Description"].astype(str).values,
+        "Amount": pd.to_numeric(samples.get("Amount", pd.Series(0.0, index=samples.index)), errors="coerce").fillna(0.0).values,
+        "Category": y,
+    }, columns=FEEDBACK_LOG_COLUMNS)
+    new_file = not os.path.exists(FEEDBACK_LOG_PATH)
+    log.to_csv(FEEDBACK_LOG_PATH, mode="a", header=new_file, index=False)
 
 def predict_descriptions(df: pd.DataFrame, return_conf=True) -> pd.DataFrame:
     """Return DataFrame with PredictedCategory (+confidence)."""
-    global _VECTORIZER, _CLF, _LABELS
-    desc = df.get("Description", pd.Series([""]*len(df)))
+    vec, clf, store, ledger = _ACTIVE  # one model for the whole call, even if a new one is swapped in meanwhile
+    rules = _RULES[1]
+    desc = df.get("Description", pd.Series([""]*len(df), index=df.index))
     amt = pd.to_numeric(df.get("Amount", 0), errors="coerce").fillna(0.0)
+    out = pd.DataFrame({"PredictedCategory": pd.Series(None, index=df.index, dtype=object),
+                        "Confidence": np.nan}, index=df.index)
 
-    # fit vectorizer vocabulary on the fly if empty
-    if len(getattr(_VECTORIZER, "vocabulary_", {})) == 0:
-        _VECTORIZER.fit(desc.fillna("").astype(str).values)
-
-    X_text, X_amt = _featurize(desc, amt)
-    X_text_vec = _VECTORIZER.transform(X_text)
-    X = sparse.hstack([X_text_vec, X_amt], format="csr")
-    preds = _CLF.predict(X)
+    # cheap tier: merchants the feedback has already settled never reach the model
+    todo = np.ones(len(df), dtype=bool)
+    if rules:
+        cats, conf = rules.match(desc)
+        hit = cats.notna().values
+        out.loc[hit, "PredictedCategory"] = cats[hit]
+        out.loc[hit, "Confidence"] = conf[hit] if return_conf else np.nan
+        todo = ~hit
+    if not todo.any():
+        return out
+    if not todo.all():
+        desc, amt = desc[todo], amt[todo]
 
-    out = pd.DataFrame({"PredictedCategory": preds}, index=df.index)
+    # fit vectorizer vocabulary on the fly if empty
+    if len(getattr(vec, "vocabulary_", {})) == 0:
+        vec.fit(desc.fillna("").astype(str).values)
+        X = _features(vec, desc, amt)
+        out.loc[todo, "PredictedCategory"] = clf.predict(X)
+        if return_conf and hasattr(clf, "predict_proba"):
+            out.loc[todo, "Confidence"] = clf.predict_proba(X).max(axis=1)
+        return out
 
-    if return_conf and hasattr(_CLF, "predict_proba"):
-        proba = _CLF.predict_proba(X)  # shape (n, n_labels)
-        conf = proba.max(axis=1)
-        out["Confidence"] = conf
-    else:
-        out["Confidence"] = np.nan
+    # rows scored before are answered from the ledger, re-scored first only where this model could disagree
+    keys, first, inverse, X_amt = _unique_rows(desc, amt)
+    sync = ledger.sync(clf, _store_rows(store))
+    if sync.get("rescored") or sync.get("dropped"):
+        print(f"🔁 Re-scored {sync['rescored']} of {sync['rows']} ledger rows for the new model "
+              f"({sync['changed']} changed category, {sync['dropped']} dropped)")
+    found, cats, conf = ledger.lookup(keys)
+    if return_conf and hasattr(clf, "predict_proba"):
+        # rows the sync kept without re-scoring have their class, but not yet their new probability
+        stale = np.flatnonzero(found & np.isnan(conf))
+        if len(stale):
+            rows = first[stale]
+            X = _stored_features(store, vec, keys[stale], desc.iloc[rows], X_amt[rows])
+            conf[stale] = ledger.refresh_confidence(keys[stale], clf, X)
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        rows = first[missing]
+        X = _stored_features(store, vec, keys[missing], desc.iloc[rows], X_amt[rows])
+        cats[missing], conf[missing] = ledger.record(keys[missing], clf, X)
+    out.loc[todo, "PredictedCategory"] = cats[inverse]
+    if return_conf:
+        out.loc[todo, "Confidence"] = conf[inverse]
     return out
 
 def learn_feedback(samples: pd.DataFrame):
     """samples: DataFrame with Description, Amount, CorrectCategory"""
-    global _VECTORIZER, _CLF, _LABELS
+    global _LOADED_SIG
     if samples.empty:
         return
 
     y = samples["CorrectCategory"].astype(str).values
-    # update labels if new ones appear
-    new_labels = sorted(set(_LABELS) | set(y))
-    if new_labels != _LABELS:
-        _LABELS = new_labels
-        joblib.dump(_LABELS, LABELS_PATH)
 
-    # maintain vectorizer vocab
-    if len(getattr(_VECTORIZER, "vocabulary_", {})) == 0:
-        _VECTORIZER.fit(samples["Description"].fillna("").astype(str).values)
+    with _LEARN_LOCK, bundle_lock(BUNDLE_PATH):
+        # learn on top of the latest published model, not a stale in-memory copy
+        reload_if_changed()
+
+        # maintain vectorizer vocab
+        if len(getattr(_VECTORIZER, "vocabulary_", {})) == 0:
+            _VECTORIZER.fit(samples["Description"].fillna("").astype(str).values)
+
+        X = _features(_VECTORIZER, samples["Description"],
+                      pd.to_numeric(samples.get("Amount", pd.Series(0.0, index=samples.index)), errors="coerce").fillna(0.0))
+        # unseen categories get new zero-initialized weight rows instead of a retrain;
+        # they may not lean on the amount buckets every row shares
+        clf = learn_online(_CLF, X, y, shared_columns=np.arange(X.shape[1] - AMOUNT_BUCKETS, X.shape[1]))
+        _set_model(_VECTORIZER, clf, sorted(set(_LABELS) | set(clf.classes_)))
+
+        # persist artifacts
+        _save_bundle(_VECTORIZER, _CLF, _LABELS)
+        _LOADED_SIG = file_signature(BUNDLE_PATH)
+        _append_feedback_log(samples, y)
 
-    X = _featurize(samples["Description"], pd.to_numeric(samples["Amount"], errors="coerce").fillna(0.0))
-    _CLF.partial_fit(X, y, classes=np.array(_LABELS, dtype=object))
+        # a correction that contradicts a mined rule would otherwise be overruled by it until the next mining run
+        rules = _RULES[1]
+        if rules:
+            ruled = rules.match(samples["Description"])[0]
+            if (ruled.notna() & (ruled != y)).any():
+                mine_feedback_rules(FEEDBACK_LOG_PATH, MINED_RULES_PATH)
+                reload_rules_if_changed()
 
-    # persist artifacts
-    joblib.dump(_VECTORIZER, VEC_PATH)
-    joblib.dump(_CLF, CLF_PATH)
-    joblib.dump(_LABELS, LABELS_PATH)
+    # bring the scored ledger up to date now rather than on the next dashboard load
+    _, clf, store, ledger = _ACTIVE
+    ledger.sync(clf, _store_rows(store))
 
 def labels():
     return list(_LABELS)
+
+def _similarity_index():
+    """Similarity index for the active vectorizer, kept with its feature store so a retrain starts a new one."""
+    global _SIMILAR
+    vec, _, store, _ = _ACTIVE
+    if _SIMILAR[0] is not vec:
+        with _SIMILAR_LOCK:
+            if _SIMILAR[0] is not vec:
+                n_text = len(vec.vocabulary_) if hasattr(vec, "vocabulary_") else int(vec.n_features)
+                index = SimilarityIndex(index_path(store.directory) if store is not None else None, n_text)
+                _SIMILAR = (vec, index)
+    return _SIMILAR
+
+def index_descriptions(desc: pd.Series) -> np.ndarray:
+    """Add unseen descriptions to the similarity index; returns the transaction id (uint64) per row."""
+    desc = desc.fillna("").astype(str)
+    keys = description_keys(desc)
+    vec, index = _similarity_index()
+    if len(getattr(vec, "vocabulary_", {})) == 0:
+        return keys
+    unique, first = np.unique(keys, return_index=True)
+    new = first[~index.contains(unique)]
+    if len(new):
+        index.add(keys[new], desc.values[new], vec.transform(desc.values[new]))
+    return keys
+
+def similar_transactions(key, k: int = 10):
+    """[(transaction id, description, cosine)] of the k most similar indexed descriptions, or None if key is unknown."""
+    return _similarity_index()[1].similar(key, k)
+
+def model_version() -> str:
+    """Identity of the published model + mined rules answering predictions; changes with every update."""
+    return f"{_LOADED_SIG}|{_RULES[0]}"
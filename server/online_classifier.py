@@ -0,0 +1,106 @@
+# online_classifier.py
+# Helpers that let a fitted linear classifier (SGDClassifier) take on new categories
+# online. partial_fit refuses a classes= array that differs from the first call, so
+# instead of retraining we grow the model in place of a copy:
+# - new classes get zero-initialized weight rows, inserted so that classes_ stays
+#   sorted (the order partial_fit expects); their intercept starts at the lowest
+#   existing one, i.e. the prior of the rarest class, so an untrained row can't
+#   outscore every trained class on unrelated rows
+# - after its first partial_fit a new class is confined to its own examples' terms:
+#   weights on columns every row shares (shared_columns, e.g. amount buckets) are
+#   zeroed and its intercept is kept at or below the lowest existing one, so it only
+#   wins rows containing its own terms instead of taking over unrelated ones
+# - a binary model (one weight row for classes_[1]) is first expanded to the
+#   one-vs-rest layout: row 0 = -w, row 1 = +w, which scores identically
+# The caller swaps the returned estimator in, so concurrent predictions never see a
+# half-grown model.
+
+import copy
+import numpy as np
+
+# per-class arrays an averaged SGD model keeps next to coef_/intercept_
+_COEF_ATTRS = ("coef_", "_standard_coef", "_average_coef")
+_INTERCEPT_ATTRS = ("intercept_", "_standard_intercept", "_average_intercept")
+
+
+def _dense(a):
+    return np.array(a.toarray() if hasattr(a, "toarray") else a, dtype=np.float64)
+
+
+def _one_vs_rest(rows: np.ndarray, n_classes: int) -> np.ndarray:
+    """Expand binary weights (1 row, for classes_[1]) to one row per class."""
+    if n_classes == 2 and rows.shape[0] == 1:
+        return np.vstack([-rows, rows])
+    return rows
+
+
+def writable_copy(clf):
+    """Shallow copy of clf with its own dense float64 weights (safe to partial_fit and swap in)."""
+    out = copy.copy(clf)
+    for attr in _COEF_ATTRS + _INTERCEPT_ATTRS:
+        if hasattr(clf, attr):
+            setattr(out, attr, _dense(getattr(clf, attr)))
+    return out
+
+
+def grow_classes(clf, labels):
+    """
+    Return a writable copy of clf whose classes_ is sorted(classes_ ∪ labels).
+    Existing classes keep their weights; new ones start with zero weights.
+    """
+    out = writable_copy(clf)
+    old = list(clf.classes_)
+    new = sorted(set(old) | set(labels), key=str)
+    if new == old:
+        return out
+
+    pos = np.array([new.index(c) for c in old])
+    for attr in _COEF_ATTRS:
+        if hasattr(out, attr):
+            rows = _one_vs_rest(getattr(out, attr), len(old))
+            grown = np.zeros((len(new), rows.shape[1]))
+            grown[pos] = rows
+            setattr(out, attr, grown)
+    for attr in _INTERCEPT_ATTRS:
+        if hasattr(out, attr):
+            rows = _one_vs_rest(np.atleast_1d(getattr(out, attr)).reshape(-1, 1), len(old))[:, 0]
+            grown = np.full(len(new), rows.min())
+            grown[pos] = rows
+            setattr(out, attr, grown)
+    out.classes_ = np.array(new, dtype=clf.classes_.dtype)
+    return out
+
+
+def _intercept_floor(clf) -> float:
+    """Lowest intercept among clf's trained classes."""
+    return float(_one_vs_rest(np.atleast_1d(clf.intercept_).reshape(-1, 1), len(clf.classes_)).min())
+
+
+def confine_classes(clf, classes, shared_columns=None, floor: float = None):
+    """Zero the shared_columns weights of classes and cap their intercepts at floor (in place)."""
+    rows = np.flatnonzero(np.isin(clf.classes_, classes))
+    if not len(rows):
+        return clf
+    for attr in _COEF_ATTRS:
+        if hasattr(clf, attr) and shared_columns is not None:
+            getattr(clf, attr)[np.ix_(rows, np.asarray(shared_columns))] = 0.0
+    for attr in _INTERCEPT_ATTRS:
+        if hasattr(clf, attr) and floor is not None:
+            intercept = getattr(clf, attr)
+            intercept[rows] = np.minimum(intercept[rows], floor)
+    return clf
+
+
+def learn_online(clf, X, y, shared_columns=None):
+    """
+    partial_fit a writable copy of clf on (X, y), growing its classes first. Returns the copy.
+    shared_columns: feature columns that don't identify a merchant (amount buckets); new
+    classes get no weight on them.
+    """
+    y = np.asarray(y, dtype=object)
+    out = grow_classes(clf, np.unique(y))
+    added = np.setdiff1d(out.classes_, clf.classes_)
+    out.partial_fit(X, y, classes=out.classes_)
+    if len(added):
+        confine_classes(out, added, shared_columns, _intercept_floor(clf))
+    return out
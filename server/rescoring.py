@@ -0,0 +1,212 @@
+# rescoring.py
+# Ledger of every row the NLP model has scored, kept consistent with the latest
+# weights without re-scoring all of it after each update:
+# - per row (feature-store key): predicted class, a lower bound on its decision
+#   margin (top score minus runner-up), the L2 norm of its feature row, confidence
+# - the weights the ledger was last synced to
+# After an update with weight delta dW and intercept delta db, row i's top class t
+# can only lose to class c if
+#     margin_i < |x_i| * |dW_t - dW_c| + (db_c - db_t)        (Cauchy-Schwarz)
+# so only those rows are re-scored (their feature rows come from the feature store);
+# every other row keeps its class and its margin bound shrinks by that amount.
+# Probabilities move even when the class doesn't, so those rows' confidence is
+# cleared (NaN) and recomputed from their feature rows the next time they are served
+# (refresh_confidence). A change of the class set re-scores everything.
+
+import os
+import threading
+import numpy as np
+from scipy import sparse
+
+try:
+    from .model_bundle import BundleError, open_bundle, write_bundle
+except ImportError:
+    from model_bundle import BundleError, open_bundle, write_bundle
+
+LEDGER_NAME = "ledger.bundle"
+DEFAULT_MAX_ROWS = 1_000_000
+FLUSH_ROWS = 5000  # newly scored rows between saves
+MARGIN_SLACK = 1e-4  # margins and norms are stored as float32
+
+_COLUMNS = ("label", "margin", "norm", "conf")
+
+
+def _weights(clf):
+    """(W, b) with one row per class; a binary model's single row becomes [0, w]."""
+    W = clf.coef_.toarray() if sparse.issparse(clf.coef_) else np.asarray(clf.coef_, dtype=np.float64)
+    b = np.atleast_1d(np.asarray(clf.intercept_, dtype=np.float64))
+    if W.shape[0] == 1 and len(clf.classes_) == 2:
+        W, b = np.vstack([np.zeros_like(W), W]), np.concatenate([[0.0], b])
+    return W, b
+
+
+def score(clf, X):
+    """→ (class index, margin, row norm, confidence) per row of X, exactly."""
+    s = clf.decision_function(X)
+    if s.ndim == 1:
+        s = np.column_stack([np.zeros_like(s), s])
+    label = s.argmax(axis=1)
+    top2 = -np.partition(-s, 1, axis=1)[:, :2] if s.shape[1] > 1 else np.column_stack([s[:, 0], s[:, 0]])
+    norm = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    conf = clf.predict_proba(X).max(axis=1) if hasattr(clf, "predict_proba") else np.full(len(label), np.nan)
+    return label.astype(np.int32), (top2[:, 0] - top2[:, 1]).astype(np.float32), norm.astype(np.float32), conf.astype(np.float32)
+
+
+def flip_bound(old, new, label, norm):
+    """Per row, how far the runner-up can gain on the row's class going from weights old to new."""
+    dW, db = new[0] - old[0], new[1] - old[1]
+    G = dW @ dW.T
+    sq = np.diag(G)
+    D = np.sqrt(np.clip(sq[:, None] + sq[None, :] - 2.0 * G, 0.0, None))  # D[t, c] = |dW_t - dW_c|
+    E = db[None, :] - db[:, None]                                         # E[t, c] = db_c - db_t
+    np.fill_diagonal(D, 0.0)
+    np.fill_diagonal(E, -np.inf)
+    return (norm[:, None] * D[label] + E[label]).max(axis=1)
+
+
+class ScoredLedger:
+    """Scored rows keyed like the feature store (uint64), synced to one classifier at a time."""
+
+    def __init__(self, path: str = None, max_rows: int = DEFAULT_MAX_ROWS):
+        self.path = path
+        self.max_rows = int(max_rows)
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.cols = {"label": np.zeros(0, np.int32), "margin": np.zeros(0, np.float32),
+                     "norm": np.zeros(0, np.float32), "conf": np.zeros(0, np.float32)}
+        self.classes = None
+        self.weights = None  # (W, b) the stored labels and margins refer to
+        self.last_sync = {}
+        self._clf = None
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _load(self):
+        try:
+            b = open_bundle(self.path)
+        except (OSError, BundleError) as e:
+            print(f"⚠️ Could not load {self.path}: {e}")
+            return
+        if b is None:
+            return
+        a = b.arrays
+        self.keys = np.array(a["keys"])
+        self.cols = {c: np.array(a[c]) for c in _COLUMNS}
+        self.classes = list(b.labels)
+        self.weights = (np.array(a["coef"]), np.array(a["intercept"]))
+
+    def save(self):
+        if not self.path or self.weights is None:
+            return
+        arrays = dict(self.cols, keys=self.keys, coef=self.weights[0], intercept=self.weights[1])
+        try:
+            write_bundle(self.path, "scored_ledger", arrays, labels=self.classes)
+            self._unsaved = 0
+        except OSError as e:
+            print(f"⚠️ Could not save {self.path}: {e}")
+
+    def _keep(self, mask):
+        self.keys = self.keys[mask]
+        self.cols = {c: v[mask] for c, v in self.cols.items()}
+
+    def sync(self, clf, fetch_rows) -> dict:
+        """
+        Bring every stored row up to date with clf. fetch_rows(keys) → (found mask,
+        CSR rows of the found keys); rows it can't supply are dropped from the ledger.
+        Returns the sync stats, or {} when the ledger was already up to date.
+        """
+        if clf is self._clf:
+            return {}
+        with self._lock:
+            if clf is self._clf:
+                return {}
+            new, classes = _weights(clf), [str(c) for c in clf.classes_]
+            self.cols = {c: v.copy() for c, v in self.cols.items()}  # lookups may still read the old arrays
+            stats = {"rows": len(self.keys), "rescored": 0, "changed": 0, "dropped": 0}
+            if self.weights is None or classes != self.classes or new[0].shape != self.weights[0].shape:
+                todo = np.ones(len(self.keys), dtype=bool)
+            elif all(np.array_equal(o, n) for o, n in zip(self.weights, new)):
+                todo = np.zeros(len(self.keys), dtype=bool)
+            else:
+                bound = flip_bound(self.weights, new, self.cols["label"], self.cols["norm"])
+                todo = self.cols["margin"] <= bound + MARGIN_SLACK
+                self.cols["margin"][~todo] -= bound[~todo].astype(np.float32)
+                self.cols["conf"][~todo] = np.nan
+
+            idx = np.flatnonzero(todo)
+            if len(idx):
+                found, X = fetch_rows(self.keys[idx])
+                hit = idx[found]
+                if len(hit):
+                    old_label = self.cols["label"][hit]
+                    fresh = dict(zip(_COLUMNS, score(clf, X)))
+                    for c in _COLUMNS:
+                        self.cols[c][hit] = fresh[c]
+                    stats["rescored"] = int(len(hit))
+                    # class indices are only comparable when the class set didn't change
+                    if classes == self.classes:
+                        stats["changed"] = int((old_label != fresh["label"]).sum())
+                keep = np.ones(len(self.keys), dtype=bool)
+                keep[idx[~found]] = False
+                stats["dropped"] = int((~keep).sum())
+                self._keep(keep)
+
+            self.classes, self.weights, self._clf = classes, new, clf
+            self.last_sync = stats
+            if len(idx):
+                self.save()
+            return stats
+
+    def lookup(self, keys):
+        """→ (found mask, label per key (None if not found), confidence per key)."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        with self._lock:
+            stored, cols, classes = self.keys, self.cols, self.classes
+        labels = np.full(len(keys), None, dtype=object)
+        conf = np.full(len(keys), np.nan)
+        if not len(stored) or not len(keys):
+            return np.zeros(len(keys), dtype=bool), labels, conf
+        pos = np.searchsorted(stored, keys).clip(0, len(stored) - 1)
+        found = stored[pos] == keys
+        labels[found] = np.asarray(classes, dtype=object)[cols["label"][pos[found]]]
+        conf[found] = cols["conf"][pos[found]]
+        return found, labels, conf
+
+    def refresh_confidence(self, keys, clf, X) -> np.ndarray:
+        """Confidence of stored rows keys (feature rows X) under clf, stored again when clf is the synced model."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        conf = (clf.predict_proba(X).max(axis=1) if hasattr(clf, "predict_proba")
+                else np.full(len(keys), np.nan)).astype(np.float32)
+        with self._lock:
+            if clf is self._clf and len(self.keys) and len(keys):
+                pos = np.searchsorted(self.keys, keys).clip(0, len(self.keys) - 1)
+                hit = self.keys[pos] == keys
+                self.cols["conf"][pos[hit]] = conf[hit]
+        return conf
+
+    def record(self, keys, clf, X):
+        """Score rows X (one per distinct key) with clf and store them. → (labels, confidence)."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        fresh = dict(zip(_COLUMNS, score(clf, X)))
+        labels = np.asarray(clf.classes_, dtype=object)[fresh["label"]]
+        with self._lock:
+            if clf is self._clf and len(keys):
+                if len(self.keys) + len(keys) > self.max_rows:
+                    self._keep(np.zeros(len(self.keys), dtype=bool))  # a cache: start over rather than grow
+                order = np.argsort(keys, kind="stable")
+                keys = keys[order]
+                pos = np.searchsorted(self.keys, keys)
+                self.keys = np.insert(self.keys, pos, keys)
+                self.cols = {c: np.insert(v, pos, fresh[c][order]) for c, v in self.cols.items()}
+                self._unsaved += len(keys)
+                if self._unsaved >= FLUSH_ROWS:
+                    self.save()
+        return labels, fresh["conf"]
+
+
+def ledger_path(directory: str) -> str:
+    return os.path.join(directory, LEDGER_NAME)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Scheduled full retrain of the online NLP model (nlp_refiner.bundle).
+
+partial_fit on feedback drifts over time, and the seed model is never rebuilt. A
+retrain consolidates three label sources into a fresh TF-IDF + SGD model:
+    feedback   every /nlp/feedback sample (models/feedback_log.csv), highest priority
+    rules      keyword-rule labels for the statement CSVs (RETRAIN_CSVS)
+    distilled  BERT predictions for rows the rules leave Uncategorized, when the
+               BERT model is available and confident (labels limited to the known set)
+
+Rows are split into train/holdout by a hash of the normalized description, so
+the holdout is frozen: a description never moves between splits across runs. The
+candidate is published only if its holdout macro-F1 beats the currently published
+model. Publishing is an atomic bundle replace with a bumped generation; every API
+worker's model watcher (nlp_refiner.start_model_watcher) then hot-swaps it in.
+Each run also re-mines the feedback keyword rules (rule_mining.py).
+
+The scheduler thread only waits on a niced child process, so training never runs
+on the request path; a lock file makes one worker per host do the work.
+
+Run with:
+    PYTHONPATH=. python3 -m server.retrain --once
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-worker lock, every worker may retrain
+    fcntl = None
+
+try:
+    from .model_bundle import (NLP_BUNDLE_NAME, load_text_classifier, save_text_classifier, bundle_lock, open_bundle,
+                               vectorizer_fingerprint, file_signature)
+    from .online_classifier import grow_classes
+    from .feature_store import prune_layouts
+    from .embedding_cache import normalize_description
+    from .train_from_csv import (amount_bucket, categorize_series, search_hyperparameters, _build_vectorizer,
+                                 _build_classifier, DEFAULT_CONFIG, DEFAULT_CATEGORY, MIN_ROWS_FOR_SEARCH)
+    from .model_compaction import evaluate
+    from .rule_mining import mine_feedback_rules
+except ImportError:
+    from model_bundle import (NLP_BUNDLE_NAME, load_text_classifier, save_text_classifier, bundle_lock, open_bundle,
+                              vectorizer_fingerprint, file_signature)
+    from online_classifier import grow_classes
+    from feature_store import prune_layouts
+    from embedding_cache import normalize_description
+    from train_from_csv import (amount_bucket, categorize_series, search_hyperparameters, _build_vectorizer,
+                                _build_classifier, DEFAULT_CONFIG, DEFAULT_CATEGORY, MIN_ROWS_FOR_SEARCH)
+    from model_compaction import evaluate
+    from rule_mining import mine_feedback_rules
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+MODEL_DIR = os.path.join(PROJECT_ROOT, "models")
+BUNDLE_PATH = os.path.join(MODEL_DIR, NLP_BUNDLE_NAME)
+FEEDBACK_LOG_PATH = os.path.join(MODEL_DIR, "feedback_log.csv")  # written by nlp_refiner.learn_feedback
+STATE_PATH = os.path.join(MODEL_DIR, "retrain_state.json")
+LOCK_PATH = os.path.join(MODEL_DIR, "retrain.lock")
+
+# unlabelled statements that get rule (and distilled) labels; os.pathsep-separated
+RETRAIN_CSVS = [p for p in os.environ.get("RETRAIN_CSVS", os.path.join(PROJECT_ROOT, "stmt.csv")).split(os.pathsep) if p]
+HOLDOUT_PERCENT = 20
+MIN_GAIN = 0.0          # candidate must beat the current holdout macro-F1 by more than this
+DISTILL_MIN_CONFIDENCE = 0.6
+HISTORY_LIMIT = 20
+PUBLISH_ATTEMPTS = 3    # a run restarts when feedback republishes the model while it trains
+SOURCE_PRIORITY = {"feedback": 0, "rules": 1, "distilled": 2, "default": 3}
+BUNDLE_META = {"features": "text+amount_bucket", "amount_buckets": 8}
+
+
+def _read_statements(paths):
+    frames = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path, on_bad_lines="skip")
+        if "Description" not in df.columns:
+            continue
+        df = df.dropna(subset=["Description"])
+        df = df[df["Description"].astype(str).str.strip() != ""]
+        amounts = df["Amount"] if "Amount" in df.columns else pd.Series(0.0, index=df.index)
+        frames.append(pd.DataFrame({
+            "Description": df["Description"].astype(str).values,
+            "Amount": pd.to_numeric(amounts.astype(str).str.replace(",", ""), errors="coerce").fillna(0.0).values,
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["Description", "Amount"])
+
+
+def _read_feedback(path=FEEDBACK_LOG_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["Description", "Amount", "Category"])
+    df = pd.read_csv(path, on_bad_lines="skip").dropna(subset=["Description", "Category"])
+    df["Amount"] = pd.to_numeric(df["Amount"], errors="coerce").fillna(0.0)
+    # the latest correction for a description wins
+    return df.drop_duplicates("Description", keep="last")[["Description", "Amount", "Category"]]
+
+
+def _distill(descriptions: pd.Series, allowed_labels):
+    """BERT labels for descriptions (None where unavailable or not confident)."""
+    try:
+        from . import bert_refiner
+    except ImportError:
+        import bert_refiner
+    out = pd.Series([None] * len(descriptions), index=descriptions.index, dtype=object)
+    if descriptions.empty:
+        return out
+    labels, logits = bert_refiner._predict_logits(descriptions.tolist())
+    if labels is None:
+        return out
+    proba = bert_refiner._softmax(logits)
+    best = np.asarray(labels, dtype=object)[proba.argmax(axis=1)]
+    ok = (proba.max(axis=1) >= DISTILL_MIN_CONFIDENCE) & np.isin(best, list(allowed_labels))
+    out[ok] = best[ok]
+    return out
+
+
+def collect_training_data(statement_paths=None, feedback_path=FEEDBACK_LOG_PATH, distill=True, known_labels=()):
+    """Labelled rows (Description, Amount, Category, Source, Key); each description's rows come from its most trusted source."""
+    feedback = _read_feedback(feedback_path).assign(Source="feedback")
+    statements = _read_statements(statement_paths or RETRAIN_CSVS)
+    statements["Category"] = categorize_series(statements["Description"]).values
+    statements["Source"] = np.where(statements["Category"] == DEFAULT_CATEGORY, "default", "rules")
+
+    if distill:
+        allowed = set(known_labels) | set(feedback["Category"]) | set(statements["Category"])
+        allowed.discard(DEFAULT_CATEGORY)
+        pending = statements["Source"] == "default"
+        teacher = _distill(statements.loc[pending, "Description"], allowed)
+        hit = teacher.notna()
+        statements.loc[teacher.index[hit], "Category"] = teacher[hit]
+        statements.loc[teacher.index[hit], "Source"] = "distilled"
+
+    df = pd.concat([feedback, statements], ignore_index=True)
+    df["Key"] = df["Description"].map(normalize_description)
+    df["Priority"] = df["Source"].map(SOURCE_PRIORITY)
+    # per description, keep the rows from its most trusted source (feedback overrides rules etc.)
+    best = df.groupby("Key")["Priority"].transform("min")
+    return df[df["Priority"] == best].drop(columns=["Priority"]).reset_index(drop=True)
+
+
+def holdout_mask(keys: pd.Series, percent: int = HOLDOUT_PERCENT) -> np.ndarray:
+    """Deterministic by description, so the holdout never changes membership between runs."""
+    buckets = [int.from_bytes(hashlib.blake2b(k.encode("utf-8"), digest_size=4).digest(), "little") % 100
+               for k in keys]
+    return np.asarray(buckets) < percent
+
+
+def train_candidate(train: pd.DataFrame, search: bool = True):
+    descriptions, amounts, categories = train["Description"], train["Amount"], train["Category"]
+    vec_params, clf_params = DEFAULT_CONFIG
+    if search and len(train) >= MIN_ROWS_FOR_SEARCH and categories.nunique() > 1:
+        best, _ = search_hyperparameters(descriptions, amounts, categories, n_jobs=1)
+        if best is not None:
+            vec_params, clf_params = best["vectorizer"], best["classifier"]
+    vectorizer = _build_vectorizer(vec_params)
+    try:
+        X_text = vectorizer.fit_transform(descriptions)
+    except ValueError:  # too few rows for min_df
+        vectorizer = _build_vectorizer(dict(vec_params, min_df=1))
+        X_text = vectorizer.fit_transform(descriptions)
+    X = sparse.hstack([X_text, amount_bucket(amounts)], format="csr")
+    clf = _build_classifier(clf_params).fit(X, categories.values)
+    return vectorizer, clf, {"vectorizer": vec_params, "classifier": clf_params}
+
+
+def _load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    return {"last_run": 0.0, "history": []}
+
+
+def _save_state(state):
+    tmp = f"{STATE_PATH}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STATE_PATH)
+
+
+def retrain_once(search: bool = True, distill: bool = True, min_gain: float = MIN_GAIN,
+                 statement_paths=None, attempts: int = PUBLISH_ATTEMPTS) -> dict:
+    """Build a candidate, gate it on the frozen holdout and publish it if it wins. Returns a report."""
+    for attempt in range(1, attempts + 1):
+        report = _retrain_attempt(search, distill, min_gain, statement_paths)
+        report["attempts"] = attempt
+        if not report.pop("conflict", False):
+            break
+        print("🔁 Model was republished while the candidate trained; starting over with the new feedback")
+    return report
+
+
+def _retrain_attempt(search, distill, min_gain, statement_paths) -> dict:
+    started = time.time()
+    # the candidate is built from the feedback this bundle has seen; anything published later must not be lost
+    signature = file_signature(BUNDLE_PATH)
+    current = open_bundle(BUNDLE_PATH)
+    known = list((current.labels if current is not None else None) or [])
+    data = collect_training_data(statement_paths, distill=distill, known_labels=known)
+    hold = holdout_mask(data["Key"])
+    train, holdout = data[~hold].reset_index(drop=True), data[hold].reset_index(drop=True)
+    report = {
+        "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "rows": {"train": int(len(train)), "holdout": int(len(holdout))},
+        "sources": {k: int(v) for k, v in data["Source"].value_counts().items()},
+        "published": False,
+    }
+    if train["Category"].nunique() < 2:
+        report["reason"] = "not enough labelled data"
+        return report
+
+    vec, clf, config = train_candidate(train, search=search)
+    report["config"] = config
+    y = holdout["Category"].astype(str).values
+    if len(holdout):
+        _, report["candidate"] = evaluate(vec, clf, BUNDLE_META, holdout, y)
+    if current is not None and len(holdout):
+        cur_vec, cur_clf, _, _ = load_text_classifier(BUNDLE_PATH)
+        _, report["current"] = evaluate(cur_vec, cur_clf, current.meta, holdout, y)
+
+    if "current" in report:
+        gain = report["candidate"]["macro_f1"] - report["current"]["macro_f1"]
+        report["gain"] = gain
+        publish = gain > min_gain
+        report["reason"] = "beats current model" if publish else "does not beat current model"
+    else:
+        publish = current is None
+        report["reason"] = "no current model" if publish else "no holdout rows to compare on"
+
+    if publish:
+        with bundle_lock(BUNDLE_PATH):
+            if file_signature(BUNDLE_PATH) != signature:
+                report.update(conflict=True, reason="model republished during training")
+                report["seconds"] = time.time() - started
+                return report
+            # keep labels that had no training rows this time (zero weights, they just stay selectable)
+            clf = grow_classes(clf, known)
+            generation = int((current.meta if current is not None else {}).get("generation", 0)) + 1
+            manifest = save_text_classifier(BUNDLE_PATH, vec, clf, kind="nlp_refiner", meta=dict(
+                BUNDLE_META, generation=generation, trained_at=report["started_at"],
+                holdout_macro_f1=report.get("candidate", {}).get("macro_f1"), train_rows=report["rows"]["train"]))
+        report.update(published=True, generation=generation, model_version=manifest["model_version"])
+        # workers move to the new layout on their next model poll; the previous ones are kept for them
+        prune_layouts(vectorizer_fingerprint(vec), extra=BUNDLE_META)
+    report["seconds"] = time.time() - started
+    return report
+
+
+def _run_and_record(args):
+    state = _load_state()
+    state["last_run"] = time.time()
+    _save_state(state)
+    report = retrain_once(search=not args.no_search, distill=not args.no_distill, min_gain=args.min_gain)
+    # refresh the feedback rules that run ahead of the model (workers pick them up with the model watcher)
+    report["mined_rules"] = len(mine_feedback_rules(FEEDBACK_LOG_PATH))
+    state["history"] = (state.get("history", []) + [report])[-HISTORY_LIMIT:]
+    _save_state(state)
+    return report
+
+
+class RetrainScheduler:
+    """Daemon thread that runs `python -m server.retrain --once` (niced) every interval_s."""
+
+    def __init__(self, interval_s: float, extra_args=()):
+        self.interval_s = float(interval_s)
+        self.extra_args = list(extra_args)
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return self
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._loop, name="nlp-retrain", daemon=True)
+        self._thread.start()
+        return self
+
+    def _due(self):
+        return time.time() - _load_state().get("last_run", 0.0) >= self.interval_s
+
+    def _loop(self):
+        while True:
+            time.sleep(min(self.interval_s, 60.0))
+            os.makedirs(MODEL_DIR, exist_ok=True)
+            with open(LOCK_PATH, "a") as lock:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # another worker is retraining
+                try:
+                    if self._due():
+                        self._run_child()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _run_child(self):
+        cmd = [sys.executable, "-m", "server.retrain", "--once", "--nice", "10"] + self.extra_args
+        try:
+            subprocess.run(cmd, cwd=PROJECT_ROOT, env=dict(os.environ, PYTHONPATH=PROJECT_ROOT), check=False)
+        except OSError as e:
+            print(f"⚠️ Retrain could not start: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain the NLP model and publish it if it beats the current one")
+    parser.add_argument("--once", action="store_true", help="run one retrain now (default)")
+    parser.add_argument("--interval", type=float, default=None, help="keep running, retraining every N seconds")
+    parser.add_argument("--no-search", action="store_true", help="skip the hyper-parameter search")
+    parser.add_argument("--no-distill", action="store_true", help="don't use BERT labels")
+    parser.add_argument("--min-gain", type=float, default=MIN_GAIN)
+    parser.add_argument("--nice", type=int, default=0, help="lower this process's CPU priority")
+    args = parser.parse_args()
+
+    if args.nice and hasattr(os, "nice"):
+        os.nice(args.nice)
+    while True:
+        report = _run_and_record(args)
+        verdict = f"published generation {report['generation']}" if report["published"] else "kept current model"
+        print(f"🔁 Retrain: {verdict} ({report.get('reason')}); "
+              f"candidate {report.get('candidate')}, current {report.get('current')}")
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Mine keyword rules from /nlp/feedback corrections (models/feedback_log.csv).
+
+Most corrections are merchant → category facts ("CHEWY.COM is Pets"). A rule can
+resolve those in O(length) without featurizing or scoring the model, so every key
+that feedback labels consistently becomes a rule in models/mined_rules.json, which
+nlp_refiner.predict_descriptions checks before the model.
+
+Keys are matched at word boundaries on the merchant text (lowercased words; digits
+such as store numbers and dates dropped):
+    tokens        single words of 3+ letters that aren't bank boilerplate
+    merchant key  the first two words of a description
+A key becomes a rule when at least --min-support feedback rows contain it and at
+least --min-precision of them carry the same category (the latest correction of a
+description relabels all of its rows). Rules are tried highest precision first.
+
+Run with:
+    PYTHONPATH=. python3 -m server.rule_mining
+"""
+
+import argparse
+import json
+import os
+import re
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+try:
+    from .train_from_csv import RuleMatcher
+except ImportError:
+    from train_from_csv import RuleMatcher
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+MODEL_DIR = os.path.join(PROJECT_ROOT, "models")
+FEEDBACK_LOG_PATH = os.path.join(MODEL_DIR, "feedback_log.csv")  # written by nlp_refiner.learn_feedback
+MINED_RULES_PATH = os.path.join(MODEL_DIR, "mined_rules.json")
+FORMAT_VERSION = 1
+
+MIN_SUPPORT = 3
+MIN_PRECISION = 0.95
+MIN_TOKEN_LENGTH = 3
+# words that show up on every kind of transaction and say nothing about the merchant
+GENERIC_TOKENS = frozenset(ENGLISH_STOP_WORDS) | {
+    "pos", "purchase", "debit", "credit", "card", "payment", "pmt", "online", "www", "com", "inc", "llc",
+    "store", "recurring", "transaction", "withdrawal", "deposit", "check", "visa", "mastercard", "ach",
+    "web", "id", "ref", "usa", "us", "the",
+}
+
+_WORD = re.compile(r"[a-z][a-z&']+")
+
+
+def merchant_text(text) -> str:
+    """Space-padded lowercase words of a description, so ' key ' matches whole words only."""
+    return " " + " ".join(_WORD.findall(str(text or "").lower())) + " "
+
+
+def _read_feedback(path=FEEDBACK_LOG_PATH) -> pd.DataFrame:
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["Description", "Category"])
+    df = pd.read_csv(path, on_bad_lines="skip").dropna(subset=["Description", "Category"])
+    df["Description"] = df["Description"].astype(str)
+    # a later correction of a description supersedes the earlier labels of all its rows
+    latest = df.drop_duplicates("Description", keep="last").set_index("Description")["Category"]
+    df["Category"] = df["Description"].map(latest).astype(str)
+    return df[["Description", "Category"]].reset_index(drop=True)
+
+
+def _grams(words):
+    """Every unigram and bigram of a row (what a key can match) and the row's candidate keys."""
+    grams = set(words) | {" ".join(words[i:i + 2]) for i in range(len(words) - 1)}
+    keys = {w for w in words if len(w) >= MIN_TOKEN_LENGTH and w not in GENERIC_TOKENS}
+    if len(words) >= 2:
+        keys.add(" ".join(words[:2]))
+    return grams, keys
+
+
+def mine_rules(feedback: pd.DataFrame, min_support: int = MIN_SUPPORT, min_precision: float = MIN_PRECISION) -> list:
+    """Rules [{key, category, support, precision, confidence}] in match order."""
+    if feedback.empty:
+        return []
+    words = [merchant_text(d).split() for d in feedback["Description"]]
+    grams, candidates = zip(*(_grams(w) for w in words))
+    candidates = set().union(*candidates)
+
+    hits = pd.DataFrame({"Key": [list(g) for g in grams], "Category": feedback["Category"].values})
+    hits = hits.explode("Key").dropna(subset=["Key"])
+    hits = hits[hits["Key"].isin(candidates)]
+    if hits.empty:
+        return []
+    counts = hits.groupby(["Key", "Category"]).size()
+    support = counts.groupby(level="Key").sum()
+    top = counts.sort_values(ascending=False).groupby(level="Key").head(1).reset_index(level="Category")
+    top = top.rename(columns={0: "Hits"}).join(support.rename("Support"))
+    top["Precision"] = top["Hits"] / top["Support"]
+    top = top[(top["Support"] >= min_support) & (top["Precision"] >= min_precision)]
+
+    accepted = top["Category"].to_dict()
+    rules = []
+    for key, row in top.iterrows():
+        # a merchant key is redundant when one of its words already is a rule for the same category
+        if " " in key and any(accepted.get(w) == row["Category"] for w in key.split()):
+            continue
+        rules.append({
+            "key": key,
+            "category": row["Category"],
+            "support": int(row["Support"]),
+            "precision": float(row["Precision"]),
+            # smoothed, so a rule backed by three rows reports less certainty than one backed by thirty
+            "confidence": float((row["Hits"] + 1) / (row["Support"] + 2)),
+        })
+    rules.sort(key=lambda r: (-r["precision"], -r["support"], r["key"]))
+    return rules
+
+
+def save_rules(rules: list, path: str = MINED_RULES_PATH, **meta) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    doc = dict(meta, format_version=FORMAT_VERSION, mined_at=datetime.now(timezone.utc).isoformat(), rules=rules)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(doc, f, indent=2)
+    os.replace(tmp, path)
+
+
+def mine_feedback_rules(feedback_path: str = FEEDBACK_LOG_PATH, path: str = MINED_RULES_PATH,
+                        min_support: int = MIN_SUPPORT, min_precision: float = MIN_PRECISION) -> list:
+    """Re-mine the rules from the whole feedback log and publish them. Returns the rules."""
+    feedback = _read_feedback(feedback_path)
+    rules = mine_rules(feedback, min_support, min_precision)
+    save_rules(rules, path, feedback_rows=int(len(feedback)), min_support=min_support, min_precision=min_precision)
+    return rules
+
+
+class MinedRules:
+    """Compiled mined rules: one automaton pass per distinct merchant text."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.matcher = RuleMatcher([(r["category"], [f" {r['key']} "]) for r in self.rules], default=None)
+        self.confidence = np.array([r["confidence"] for r in self.rules] + [np.nan])
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, descriptions: pd.Series):
+        """(category, confidence) per row; None / NaN where no rule applies."""
+        codes, uniques = pd.factorize(descriptions.fillna("").astype(str).map(merchant_text))
+        ranks = self.matcher.ranks(uniques)[codes] if len(uniques) else np.array([], dtype=np.int64)
+        return (pd.Series(self.matcher.categories[ranks], index=descriptions.index, dtype=object),
+                pd.Series(self.confidence[ranks], index=descriptions.index))
+
+
+def load_rules(path: str = MINED_RULES_PATH):
+    """MinedRules from path, or None when nothing has been mined yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        doc = json.load(f)
+    if doc.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported mined-rules format {doc.get('format_version')}")
+    return MinedRules(doc.get("rules", []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine keyword rules from the /nlp/feedback log")
+    parser.add_argument("--feedback-log", default=FEEDBACK_LOG_PATH)
+    parser.add_argument("--out", default=MINED_RULES_PATH)
+    parser.add_argument("--min-support", type=int, default=MIN_SUPPORT)
+    parser.add_argument("--min-precision", type=float, default=MIN_PRECISION)
+    args = parser.parse_args()
+
+    rules = mine_feedback_rules(args.feedback_log, args.out, args.min_support, args.min_precision)
+    print(f"⛏️ Mined {len(rules)} rules → {args.out}")
+    for r in rules[:20]:
+        print(f"  {r['key']!r:<28} → {r['category']:<16} support {r['support']:>4}  precision {r['precision']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
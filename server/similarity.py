@@ -0,0 +1,297 @@
+# similarity.py
+# Approximate nearest-neighbour index over transaction description vectors, so
+# "similar transactions" touches a few posting lists instead of every stored row:
+# - one entry per distinct description, keyed by a 64-bit hash of the text; that key
+#   is the transaction id the API hands out
+# - rows are the L2-normalized TF-IDF text vectors; a column-major copy of them is the
+#   inverted index (term -> rows containing it)
+# - a query scores only rows sharing one of its selective terms: terms in more than
+#   MAX_POSTING rows ("pos", "purchase", ...) carry little weight and are skipped, and
+#   the top RERANK rows by that partial score are re-ranked by exact cosine. That is the
+#   approximation: rows that share nothing but common terms are never candidates
+# - inserts go to a tail that is scored exactly and folded into the index once it
+#   grows to TAIL_FRACTION of it, so inserts stay amortized cheap
+# - persisted next to the feature store (a new vectorizer starts a new index): a base
+#   bundle plus one small delta bundle per insert batch, written as the batch is added,
+#   so a transaction id handed out by one worker is known to all of them
+# - every call first picks up deltas other workers wrote, and reloads everything when
+#   the base was rewritten; once the deltas hold TAIL_FRACTION of the base's rows (or
+#   MAX_DELTAS files) a worker compacts them into a new base under the bundle lock
+
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+try:
+    from .model_bundle import BundleError, open_bundle, write_bundle, bundle_lock, file_signature
+except ImportError:
+    from model_bundle import BundleError, open_bundle, write_bundle, bundle_lock, file_signature
+
+INDEX_NAME = "similarity.bundle"
+MAX_POSTING = 20000
+RERANK = 2000
+MIN_TAIL_ROWS = 4096
+TAIL_FRACTION = 0.0625
+MAX_DELTAS = 256
+DELTA_SUFFIX = ".delta"
+DEFAULT_MAX_ROWS = 2_000_000
+
+_TEXT_SEP = "\x00"
+
+
+def description_keys(descriptions) -> np.ndarray:
+    """uint64 transaction id per description (the text alone, unlike feature_store.row_keys)."""
+    return pd.util.hash_pandas_object(pd.Series(descriptions, dtype=object).fillna("").astype(str),
+                                      index=False).values.astype(np.uint64)
+
+
+def format_id(key) -> str:
+    return f"{int(key):016x}"
+
+
+def parse_id(text: str):
+    """uint64 key of a transaction id string, or None if it isn't one."""
+    try:
+        return np.uint64(int(text, 16)) if len(text) == 16 else None
+    except ValueError:
+        return None
+
+
+def _normalized(X) -> sparse.csr_matrix:
+    X = sparse.csr_matrix(X, dtype=np.float32)
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1))).ravel()
+    return sparse.csr_matrix(sparse.diags(1.0 / np.maximum(norms, 1e-12)) @ X, dtype=np.float32)
+
+
+class SimilarityIndex:
+    """Inverted index of distinct descriptions → nearest neighbours by cosine of their text vectors."""
+
+    def __init__(self, path: str = None, n_features: int = 0, max_rows: int = DEFAULT_MAX_ROWS):
+        self.path = path
+        self.n_features = int(n_features)
+        self.max_rows = int(max_rows)
+        self._lock = threading.Lock()
+        self._reset()
+        if path:
+            self._load()
+
+    def _reset(self):
+        self.keys = np.zeros(0, dtype=np.uint64)         # insertion order
+        self.texts = []
+        self.X = sparse.csr_matrix((0, self.n_features), dtype=np.float32)  # rows [0, _folded)
+        self._postings = self.X.tocsc()                    # same rows, column-major
+        self._tail_X = self.X                              # rows [_folded, len)
+        self._folded = 0
+        self._sorted_keys = np.zeros(0, dtype=np.uint64)   # keys[:_folded] sorted, with their rows
+        self._key_rows = np.zeros(0, dtype=np.int64)
+        self._tail_order = np.zeros(0, dtype=np.int64)     # argsort of keys[_folded:]
+        self._base_sig = None                              # file_signature of the base bundle loaded
+        self._base_rows = 0
+        self._deltas = set()                               # delta file names whose rows are loaded
+        self._delta_rows = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def delta_dir(self) -> str:
+        return self.path + DELTA_SUFFIX
+
+    def _load(self):
+        self._base_sig = file_signature(self.path)
+        try:
+            b = open_bundle(self.path)
+        except (OSError, BundleError) as e:
+            print(f"⚠️ Could not load {self.path}: {e}")
+            b = None
+        if b is not None and b.meta["shape"][1] == self.n_features:
+            a = b.arrays
+            self.keys = np.array(a["keys"])
+            self.X = sparse.csr_matrix((np.array(a["data"]), np.array(a["indices"]), np.array(a["indptr"])),
+                                       shape=tuple(b.meta["shape"]))
+            self.texts = a["texts"].tobytes().decode("utf-8").split(_TEXT_SEP) if len(self.keys) else []
+            self._base_rows = len(self.keys)
+            self._fold()
+        self._load_deltas()
+
+    def _load_deltas(self):
+        try:
+            names = sorted(os.listdir(self.delta_dir))  # a few hundred names at most; mtimes are too coarse
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name in self._deltas:
+                continue
+            try:
+                b = open_bundle(os.path.join(self.delta_dir, name))
+            except (OSError, BundleError):
+                b = None  # being written or just compacted away; the next refresh sees the outcome
+            if b is None or b.meta["shape"][1] != self.n_features:
+                continue
+            a = b.arrays
+            X = sparse.csr_matrix((np.array(a["data"]), np.array(a["indices"]), np.array(a["indptr"])),
+                                  shape=tuple(b.meta["shape"]))
+            texts = a["texts"].tobytes().decode("utf-8").split(_TEXT_SEP) if len(a["keys"]) else []
+            self._insert(np.array(a["keys"]), texts, X)
+            self._deltas.add(name)
+            self._delta_rows += len(texts)
+
+    def _refresh(self):
+        """Pick up what other processes wrote: new deltas, or everything after a compaction."""
+        if not self.path:
+            return
+        if file_signature(self.path) != self._base_sig:
+            self._reset()
+            self._load()
+            return
+        self._load_deltas()
+
+    @staticmethod
+    def _write(path, keys, texts, X):
+        X = sparse.csr_matrix(X, dtype=np.float32)
+        arrays = {"keys": keys, "indptr": X.indptr.astype(np.int64), "indices": X.indices.astype(np.int32),
+                  "data": X.data, "texts": np.frombuffer(_TEXT_SEP.join(texts).encode("utf-8"), dtype=np.uint8)}
+        write_bundle(path, "similarity_index", arrays, meta={"shape": list(X.shape)})
+
+    def save(self):
+        """Write everything loaded as the base bundle; deltas it includes are removed. Callers hold _lock."""
+        if not self.path:
+            return
+        with bundle_lock(self.path):
+            self._refresh()
+            included = sorted(self._deltas)
+            try:
+                self._write(self.path, self.keys, self.texts, sparse.vstack([self.X, self._tail_X], format="csr"))
+            except OSError as e:
+                print(f"⚠️ Could not save {self.path}: {e}")
+                return
+            for name in included:
+                try:
+                    os.unlink(os.path.join(self.delta_dir, name))
+                except FileNotFoundError:
+                    pass
+            self._base_sig, self._base_rows = file_signature(self.path), len(self.keys)
+            self._deltas, self._delta_rows = set(), 0
+
+    def _write_delta(self, keys, texts, X):
+        os.makedirs(self.delta_dir, exist_ok=True)
+        name = f"{time.time_ns():020d}-{os.getpid()}-{threading.get_ident() % 100000:05d}.bundle"
+        self._write(os.path.join(self.delta_dir, name), keys, texts, X)
+        self._deltas.add(name)
+        self._delta_rows += len(keys)
+
+    def _fold(self):
+        """Move the tail into the inverted index, dropping the oldest rows beyond max_rows."""
+        X = sparse.vstack([self.X, self._tail_X], format="csr")
+        drop = max(0, len(self.keys) - self.max_rows)
+        if drop:
+            self.keys, X, self.texts = self.keys[drop:], X[drop:], self.texts[drop:]
+        self.X, self._tail_X = X, X[:0]
+        self._postings = X.tocsc()
+        self._key_rows = np.argsort(self.keys, kind="stable")
+        self._sorted_keys = self.keys[self._key_rows]
+        self._tail_order = np.zeros(0, dtype=np.int64)
+        self._folded = len(self.keys)
+
+    def _rows(self, keys):
+        """Row index per key, -1 where the key isn't indexed."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if self._folded:
+            pos = np.searchsorted(self._sorted_keys, keys).clip(0, self._folded - 1)
+            hit = self._sorted_keys[pos] == keys
+            rows[hit] = self._key_rows[pos[hit]]
+        if len(self._tail_order):
+            tail = self.keys[self._folded:][self._tail_order]
+            pos = np.searchsorted(tail, keys).clip(0, len(tail) - 1)
+            hit = (rows < 0) & (tail[pos] == keys)
+            rows[hit] = self._folded + self._tail_order[pos[hit]]
+        return rows
+
+    def contains(self, keys) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.uint64)
+        with self._lock:
+            self._refresh()
+            return self._rows(keys) >= 0
+
+    def _insert(self, keys, texts, X) -> np.ndarray:
+        """Add rows for keys not indexed yet (in memory only). → positions of the rows added."""
+        unique, first = np.unique(keys, return_index=True)
+        new = np.sort(first[self._rows(unique) < 0])  # first row of each unseen key, in input order
+        if not len(new):
+            return new
+        self.keys = np.concatenate([self.keys, keys[new]])
+        self.texts.extend(str(texts[i]).replace(_TEXT_SEP, " ") for i in new)
+        self._tail_X = sparse.vstack([self._tail_X, sparse.csr_matrix(X, dtype=np.float32)[new]], format="csr")
+        if len(self.keys) - self._folded >= max(MIN_TAIL_ROWS, TAIL_FRACTION * self._folded):
+            self._fold()
+        else:
+            self._tail_order = np.argsort(self.keys[self._folded:], kind="stable")
+        return new
+
+    def add(self, keys, texts, X) -> int:
+        """Index rows X (text vectors) under keys and persist them; keys already indexed are skipped. → rows added."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        X = _normalized(X)
+        with self._lock:
+            self._refresh()
+            new = self._insert(keys, texts, X)
+            if not len(new) or not self.path:
+                return len(new)
+            try:
+                self._write_delta(keys[new], [str(texts[i]).replace(_TEXT_SEP, " ") for i in new], X[new])
+            except OSError as e:
+                print(f"⚠️ Could not write to {self.delta_dir}: {e}")
+            if self._delta_rows >= max(MIN_TAIL_ROWS, TAIL_FRACTION * self._base_rows) or \
+                    len(self._deltas) > MAX_DELTAS:
+                self.save()
+            return len(new)
+
+    def _vector(self, row) -> sparse.csr_matrix:
+        return self.X[row] if row < self._folded else self._tail_X[row - self._folded]
+
+    def _candidates(self, q) -> np.ndarray:
+        """Folded rows sharing a selective term with q, the best RERANK by their partial score."""
+        if not self._folded or not q.nnz:
+            return np.zeros(0, dtype=np.int64)
+        terms, weights = q.indices, q.data
+        df = np.diff(self._postings.indptr)[terms]
+        selective = df <= MAX_POSTING
+        if not selective.any():
+            selective = df == df.min()  # only common terms: fall back to the least common one
+        ip, rows, data = self._postings.indptr, self._postings.indices, self._postings.data
+        hits = np.concatenate([rows[ip[t]:ip[t + 1]] for t in terms[selective]])
+        contrib = np.concatenate([data[ip[t]:ip[t + 1]] * w for t, w in zip(terms[selective], weights[selective])])
+        cand, inverse = np.unique(hits, return_inverse=True)
+        if len(cand) > RERANK:
+            partial = np.bincount(inverse.ravel(), weights=contrib)
+            cand = cand[np.argpartition(-partial, RERANK - 1)[:RERANK]]
+        return cand
+
+    def similar(self, key, k: int = 10):
+        """→ [(key, text, cosine)] of up to k nearest indexed descriptions, or None if key isn't indexed."""
+        with self._lock:
+            self._refresh()
+            row = self._rows(np.asarray([key], dtype=np.uint64))[0]
+            if row < 0:
+                return None
+            q = self._vector(row)
+            cand = self._candidates(q)
+            scores = np.asarray((self.X[cand] @ q.T).todense()).ravel()
+            if self._tail_X.shape[0]:  # the tail is small enough to score exactly
+                cand = np.concatenate([cand, self._folded + np.arange(self._tail_X.shape[0])])
+                scores = np.concatenate([scores, np.asarray((self._tail_X @ q.T).todense()).ravel()])
+            keep = (cand != row) & (scores > 0)
+            cand, scores = cand[keep], scores[keep]
+            if not len(cand):
+                return []
+            n = min(k, len(cand))
+            top = np.argpartition(-scores, n - 1)[:n]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self.keys[cand[i]], self.texts[cand[i]], float(scores[i])) for i in top]
+
+
+def index_path(directory: str) -> str:
+    return os.path.join(directory, INDEX_NAME)
@@ -7,6 +7,127 @@ from bs4 import BeautifulSoup
 import time
 import random
 
+try:
+    from .merchant_resolver import MerchantResolver
+except ImportError:
+    from merchant_resolver import MerchantResolver
+
+# Canonical merchant -> description aliases, in priority order (first exact hit wins)
+MERCHANT_ALIASES = {
+    'CHIPOTLE': ['CHIPOTLE'],
+    'STARBUCKS': ['STARBUCKS'],
+    'UBER': ['UBER'],
+    'AMAZON': ['AMAZON'],
+    'TARGET': ['TARGET'],
+    'WALMART': ['WAL-MART', 'WALMART'],
+    'COSTCO': ['COSTCO'],
+    'WHOLE FOODS': ['WHOLE FOODS', 'WHOLEFDS'],
+    'MACYS': ['MACYS'],
+    'CVS': ['CVS'],
+    'WALGREENS': ['WALGREENS'],
+    '7-ELEVEN': ['7-ELEVEN'],
+    'BURGER KING': ['BURGER KING'],
+    'TACO BELL': ['TACO BELL'],
+    'PIZZA HUT': ['PIZZA HUT'],
+    'DOMINOS': ['DOMINOS'],
+    'LITTLE CAESARS': ['LITTLE CAESARS'],
+    'PAPA JOHNS': ['PAPA JOHNS'],
+    'JERSEY MIKES': ['JERSEY MIKES'],
+    'JIMMY JOHNS': ['JIMMY JOHNS'],
+    'QUIZNOS': ['QUIZNOS'],
+    'DUNKIN DONUTS': ['DUNKIN DONUTS'],
+    'MCDONALDS': ['MCDONALDS'],
+    'FIVE GUYS': ['FIVE GUYS'],
+    'IN N OUT': ['IN N OUT'],
+    'SHAKE SHACK': ['SHAKE SHACK'],
+    'KFC': ['KFC'],
+    'POPEYES': ['POPEYES'],
+    'CHICK-FIL-A': ['CHICK-FIL-A'],
+    'CHURCHS CHICKEN': ['CHURCHS CHICKEN'],
+    'DEL TACO': ['DEL TACO'],
+    'MOES SOUTHWEST': ['MOES SOUTHWEST'],
+    'QDOBA': ['QDOBA'],
+    'SUBWAY': ['SUBWAY'],
+    'ALDI': ['ALDI'],
+    'SPROUTS': ['SPROUTS'],
+    'SAFEWAY': ['SAFEWAY'],
+    'KROGER': ['KROGER'],
+    'PUBLIX': ['PUBLIX'],
+    'WINN DIXIE': ['WINN DIXIE'],
+    'H MART': ['H MART'],
+    'EBAY': ['EBAY'],
+    'KOHLS': ['KOHLS'],
+    'JCPENNEY': ['JCPENNEY'],
+    'TJ MAXX': ['TJ MAXX'],
+    'MARSHALLS': ['MARSHALLS'],
+    'ROSS': ['ROSS'],
+    'BURLINGTON': ['BURLINGTON'],
+    'H&M': ['H&M'],
+    'ZARA': ['ZARA'],
+    'NORDSTROM': ['NORDSTROM'],
+    'NIKE': ['NIKE'],
+    'ADIDAS': ['ADIDAS'],
+    'PUMA': ['PUMA'],
+    'NEW BALANCE': ['NEW BALANCE'],
+    'DSW': ['DSW'],
+    'FOOT LOCKER': ['FOOT LOCKER'],
+    'HULU': ['HULU'],
+    'DISNEY+': ['DISNEY+'],
+    'AMAZON PRIME': ['AMAZON PRIME'],
+    'APPLE MUSIC': ['APPLE MUSIC'],
+    'YOUTUBE MUSIC': ['YOUTUBE MUSIC'],
+    'AMAZON MUSIC': ['AMAZON MUSIC'],
+    'PANDORA': ['PANDORA'],
+    'REGAL': ['REGAL'],
+    'AMC': ['AMC'],
+    'CIRCLE K': ['CIRCLE K'],
+    'SHEETZ': ['SHEETZ'],
+    'SPEEDWAY': ['SPEEDWAY'],
+    'CASEYS': ['CASEYS'],
+    'LOVES': ['LOVES'],
+    'PILOT': ['PILOT'],
+    'FLYING J': ['FLYING J'],
+    'NETFLIX': ['NETFLIX'],
+    'SPOTIFY': ['SPOTIFY'],
+    'APPLE': ['APPLE'],
+    'GOOGLE': ['GOOGLE'],
+    'MICROSOFT': ['MICROSOFT'],
+    'FACEBOOK': ['FACEBOOK'],
+    'INSTAGRAM': ['INSTAGRAM'],
+    'TWITTER': ['TWITTER'],
+    'LINKEDIN': ['LINKEDIN'],
+    'YOUTUBE': ['YOUTUBE'],
+    'TIKTOK': ['TIKTOK'],
+    'SNAPCHAT': ['SNAPCHAT'],
+    'DISCORD': ['DISCORD'],
+    'TWITCH': ['TWITCH'],
+    'REDDIT': ['REDDIT'],
+    'PINTEREST': ['PINTEREST'],
+    'TUMBLR': ['TUMBLR'],
+    'MEDIUM': ['MEDIUM'],
+    'QUORA': ['QUORA'],
+    'STACKOVERFLOW': ['STACKOVERFLOW'],
+    'GITHUB': ['GITHUB'],
+    'GITLAB': ['GITLAB'],
+    'BITBUCKET': ['BITBUCKET'],
+    'JIRA': ['JIRA'],
+    'CONFLUENCE': ['CONFLUENCE'],
+    'SLACK': ['SLACK'],
+    'TEAMS': ['TEAMS'],
+    'ZOOM': ['ZOOM'],
+    'SKYPE': ['SKYPE'],
+    'WHATSAPP': ['WHATSAPP'],
+    'TELEGRAM': ['TELEGRAM'],
+    'SIGNAL': ['SIGNAL'],
+    'VIBER': ['VIBER'],
+    'WECHAT': ['WECHAT'],
+    'LINE': ['LINE'],
+    'KAKAOTALK': ['KAKAOTALK']
+}
+
+_MERCHANT_RESOLVER = MerchantResolver(MERCHANT_ALIASES)
+
+
 class SpendingAnalyzer:
     def __init__(self):
         self.merchant_patterns = {
@@ -103,132 +224,12 @@ class SpendingAnalyzer:
         """Analyze spending by merchant using pattern matching"""
         merchant_spending = defaultdict(lambda: {'total': 0, 'count': 0, 'descriptions': set(), 'categories': set()})
         
-        # Comprehensive merchant patterns
-        merchant_patterns = {
-            'CHIPOTLE': ['CHIPOTLE'],
-            'STARBUCKS': ['STARBUCKS'],
-            'UBER': ['UBER'],
-            'AMAZON': ['AMAZON'],
-            'TARGET': ['TARGET'],
-            'WALMART': ['WAL-MART', 'WALMART'],
-            'COSTCO': ['COSTCO'],
-            'WHOLE FOODS': ['WHOLE FOODS', 'WHOLEFDS'],
-            'MACYS': ['MACYS'],
-            'CVS': ['CVS'],
-            'WALGREENS': ['WALGREENS'],
-            '7-ELEVEN': ['7-ELEVEN'],
-            'BURGER KING': ['BURGER KING'],
-            'TACO BELL': ['TACO BELL'],
-            'PIZZA HUT': ['PIZZA HUT'],
-            'DOMINOS': ['DOMINOS'],
-            'LITTLE CAESARS': ['LITTLE CAESARS'],
-            'PAPA JOHNS': ['PAPA JOHNS'],
-            'JERSEY MIKES': ['JERSEY MIKES'],
-            'JIMMY JOHNS': ['JIMMY JOHNS'],
-            'QUIZNOS': ['QUIZNOS'],
-            'DUNKIN DONUTS': ['DUNKIN DONUTS'],
-            'MCDONALDS': ['MCDONALDS'],
-            'FIVE GUYS': ['FIVE GUYS'],
-            'IN N OUT': ['IN N OUT'],
-            'SHAKE SHACK': ['SHAKE SHACK'],
-            'KFC': ['KFC'],
-            'POPEYES': ['POPEYES'],
-            'CHICK-FIL-A': ['CHICK-FIL-A'],
-            'CHURCHS CHICKEN': ['CHURCHS CHICKEN'],
-            'DEL TACO': ['DEL TACO'],
-            'MOES SOUTHWEST': ['MOES SOUTHWEST'],
-            'QDOBA': ['QDOBA'],
-            'SUBWAY': ['SUBWAY'],
-            'ALDI': ['ALDI'],
-            'SPROUTS': ['SPROUTS'],
-            'SAFEWAY': ['SAFEWAY'],
-            'KROGER': ['KROGER'],
-            'PUBLIX': ['PUBLIX'],
-            'WINN DIXIE': ['WINN DIXIE'],
-            'H MART': ['H MART'],
-            'EBAY': ['EBAY'],
-            'KOHLS': ['KOHLS'],
-            'JCPENNEY': ['JCPENNEY'],
-            'TJ MAXX': ['TJ MAXX'],
-            'MARSHALLS': ['MARSHALLS'],
-            'ROSS': ['ROSS'],
-            'BURLINGTON': ['BURLINGTON'],
-            'H&M': ['H&M'],
-            'ZARA': ['ZARA'],
-            'NORDSTROM': ['NORDSTROM'],
-            'NIKE': ['NIKE'],
-            'ADIDAS': ['ADIDAS'],
-            'PUMA': ['PUMA'],
-            'NEW BALANCE': ['NEW BALANCE'],
-            'DSW': ['DSW'],
-            'FOOT LOCKER': ['FOOT LOCKER'],
-            'HULU': ['HULU'],
-            'DISNEY+': ['DISNEY+'],
-            'AMAZON PRIME': ['AMAZON PRIME'],
-            'APPLE MUSIC': ['APPLE MUSIC'],
-            'YOUTUBE MUSIC': ['YOUTUBE MUSIC'],
-            'AMAZON MUSIC': ['AMAZON MUSIC'],
-            'PANDORA': ['PANDORA'],
-            'REGAL': ['REGAL'],
-            'AMC': ['AMC'],
-            'CIRCLE K': ['CIRCLE K'],
-            'SHEETZ': ['SHEETZ'],
-            'SPEEDWAY': ['SPEEDWAY'],
-            'CASEYS': ['CASEYS'],
-            'LOVES': ['LOVES'],
-            'PILOT': ['PILOT'],
-            'FLYING J': ['FLYING J'],
-            'NETFLIX': ['NETFLIX'],
-            'SPOTIFY': ['SPOTIFY'],
-            'APPLE': ['APPLE'],
-            'GOOGLE': ['GOOGLE'],
-            'MICROSOFT': ['MICROSOFT'],
-            'FACEBOOK': ['FACEBOOK'],
-            'INSTAGRAM': ['INSTAGRAM'],
-            'TWITTER': ['TWITTER'],
-            'LINKEDIN': ['LINKEDIN'],
-            'YOUTUBE': ['YOUTUBE'],
-            'TIKTOK': ['TIKTOK'],
-            'SNAPCHAT': ['SNAPCHAT'],
-            'DISCORD': ['DISCORD'],
-            'TWITCH': ['TWITCH'],
-            'REDDIT': ['REDDIT'],
-            'PINTEREST': ['PINTEREST'],
-            'TUMBLR': ['TUMBLR'],
-            'MEDIUM': ['MEDIUM'],
-            'QUORA': ['QUORA'],
-            'STACKOVERFLOW': ['STACKOVERFLOW'],
-            'GITHUB': ['GITHUB'],
-            'GITLAB': ['GITLAB'],
-            'BITBUCKET': ['BITBUCKET'],
-            'JIRA': ['JIRA'],
-            'CONFLUENCE': ['CONFLUENCE'],
-            'SLACK': ['SLACK'],
-            'TEAMS': ['TEAMS'],
-            'ZOOM': ['ZOOM'],
-            'SKYPE': ['SKYPE'],
-            'WHATSAPP': ['WHATSAPP'],
-            'TELEGRAM': ['TELEGRAM'],
-            'SIGNAL': ['SIGNAL'],
-            'VIBER': ['VIBER'],
-            'WECHAT': ['WECHAT'],
-            'LINE': ['LINE'],
-            'KAKAOTALK': ['KAKAOTALK']
-        }
-        
         for _, row in expenses.iterrows():
             desc = str(row['Description']).upper()
             amount = row['Amount']
             
-            # Try to match merchant patterns
-            merchant = None
-            for merchant_name, patterns in merchant_patterns.items():
-                for pattern in patterns:
-                    if pattern in desc:
-                        merchant = merchant_name
-                        break
-                if merchant:
-                    break
+            # Known merchant, exact or fuzzy ("WHOLEFDS", "STARBUKS")
+            merchant = _MERCHANT_RESOLVER.resolve(desc)
             
             # If no pattern match, try to extract from first word
             if not merchant:
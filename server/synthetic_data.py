@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic transaction generator for scale and load testing.
+
+Learns merchant templates, per-category amount distributions and the daily /
+weekday transaction rate from sample_transactions_1000.csv and descriptions.csv,
+then streams arbitrarily many realistic rows to disk chunk by chunk, so memory
+stays constant no matter how many rows are requested.
+
+Output formats:
+    csv    Date, Description, Amount, Category (the upload format)
+    first  Date, Description, Deposits, Withdrawls, Balance (the first.csv layout)
+    json   a JSON array of row objects, optionally wrapped as {"<key>": [...]}
+    xlsx   same columns as csv (needs openpyxl; written in write-only mode)
+
+Dates advance at the learned rows/day, raised for large sets so that n rows span at
+most MAX_SPAN_DAYS (set it explicitly with --rows-per-day); a date range that would
+run past the calendar wraps back to the start date.
+
+Run with:
+    PYTHONPATH=. python3 -m server.synthetic_data --rows 1000000 --format csv --out big.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import re
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+SAMPLE_PATH = os.path.join(PROJECT_ROOT, "sample_transactions_1000.csv")
+DESCRIPTIONS_PATH = os.path.join(PROJECT_ROOT, "descriptions.csv")
+
+DEFAULT_CHUNK_ROWS = 50_000
+DEFAULT_NOISE = 0.3
+MAX_SPAN_DAYS = 3650
+_LAST_DAY = date(9999, 1, 1)  # wrap before date arithmetic overflows
+FORMATS = ["csv", "first", "json", "xlsx"]
+
+_DIGITS = re.compile(r"\d+")
+_PLACEHOLDER = "<N>"
+_PLACEHOLDER_RE = re.compile(re.escape(_PLACEHOLDER))
+_NOISE_SUFFIXES = [" PURCHASE", " POS", " DEBIT", " ONLINE", " RECURRING", " CARD 1234", " AUTH"]
+_LOCATIONS = [" NEW YORK NY", " NEW BRUNSWICK NJ", " SAN FRANCISCO CA", " SEATTLE WA", " CHICAGO IL", " AUSTIN TX"]
+
+
+class TransactionModel:
+    """Distributions learned from the repo's sample data."""
+
+    def __init__(self, templates, template_categories, template_weights, amount_params,
+                 weekday_weights, rows_per_day, start_date):
+        self.templates = templates                       # description templates (digit runs → "<N>")
+        self.template_categories = template_categories   # category per template
+        self.template_weights = template_weights         # sampling probability per template
+        self.amount_params = amount_params               # category -> (p_positive, log_mu, log_sigma)
+        self.weekday_weights = weekday_weights           # relative rate Mon..Sun (mean 1.0)
+        self.rows_per_day = rows_per_day
+        self.start_date = start_date
+        # (p_positive, log_mu, log_sigma) per template, so sampling is a single fancy-index
+        self.template_params = np.array([amount_params[c] for c in template_categories], dtype=float)
+
+    @classmethod
+    def fit(cls, sample_path=SAMPLE_PATH, descriptions_path=DESCRIPTIONS_PATH):
+        sample = pd.read_csv(sample_path, on_bad_lines="skip").dropna(subset=["Description"])
+        sample["Amount"] = pd.to_numeric(sample["Amount"], errors="coerce")
+        sample = sample.dropna(subset=["Amount"])
+        frames = [sample[["Description", "Category"]]]
+        if descriptions_path and os.path.exists(descriptions_path):
+            frames.append(pd.read_csv(descriptions_path, on_bad_lines="skip").dropna(subset=["Description", "Category"]))
+        texts = pd.concat(frames, ignore_index=True)
+        texts["Template"] = texts["Description"].astype(str).str.upper().str.replace(_DIGITS, _PLACEHOLDER, regex=True)
+
+        # one row per (template, category), weighted by how often it was observed
+        counts = texts.groupby(["Template", "Category"]).size().reset_index(name="n")
+        weights = counts["n"].to_numpy(dtype=float)
+
+        # per-category sign and log-normal magnitude; unseen categories use the global fit
+        def params(amounts):
+            mags = np.log(np.abs(amounts[amounts != 0]).clip(0.01))
+            sigma = float(mags.std()) if len(mags) > 1 else 0.5
+            return float((amounts > 0).mean()), float(mags.mean()) if len(mags) else 3.0, max(sigma, 0.1)
+
+        global_params = params(sample["Amount"].to_numpy())
+        amount_params = {cat: params(g["Amount"].to_numpy()) for cat, g in sample.groupby("Category")}
+        for cat in counts["Category"].unique():
+            amount_params.setdefault(cat, global_params)
+
+        dates = pd.to_datetime(sample["Date"], errors="coerce").dropna()
+        if len(dates):
+            span_days = max(1, (dates.max() - dates.min()).days + 1)
+            per_weekday = dates.dt.weekday.value_counts().reindex(range(7), fill_value=0).to_numpy(dtype=float)
+            weekday_weights = (per_weekday + 1.0) / (per_weekday + 1.0).mean()
+            rows_per_day = len(dates) / span_days
+            start_date = dates.min().date()
+        else:
+            weekday_weights, rows_per_day, start_date = np.ones(7), 2.0, date(2024, 1, 1)
+
+        return cls(
+            templates=counts["Template"].to_numpy(dtype=object),
+            template_categories=counts["Category"].to_numpy(dtype=object),
+            template_weights=weights / weights.sum(),
+            amount_params=amount_params,
+            weekday_weights=weekday_weights,
+            rows_per_day=rows_per_day,
+            start_date=start_date,
+        )
+
+
+class TransactionGenerator:
+    """Streams chunks of synthetic rows; state (date cursor, balance) carries across chunks."""
+
+    def __init__(self, model: TransactionModel, seed: int = 42, noise: float = DEFAULT_NOISE,
+                 rows_per_day: float = None, start_date: date = None):
+        self.model = model
+        self.rng = np.random.default_rng(seed)
+        self.py_rng = random.Random(seed)  # cheaper than numpy for per-row string noise
+        self.noise = float(noise)
+        self.rows_per_day = rows_per_day or model.rows_per_day
+        self.start_date = start_date or model.start_date
+        self.day = self.start_date
+        self.balance = 5000.0
+
+    def _dates(self, n):
+        out = []
+        while len(out) < n:
+            rate = self.rows_per_day * self.model.weekday_weights[self.day.weekday()]
+            out.extend([self.day] * int(self.rng.poisson(rate)))
+            self.day = self.day + timedelta(days=1) if self.day < _LAST_DAY else self.start_date
+        extra = len(out) - n
+        if extra:
+            # the last day continues into the next chunk
+            self.day = out[-1]
+            out = out[:n]
+        return out
+
+    def _fill_digits(self, template):
+        if _PLACEHOLDER not in template:
+            return template
+        return _PLACEHOLDER_RE.sub(lambda _: str(self.py_rng.randint(1, 9999)), template)
+
+    def _add_noise(self, desc):
+        r = self.py_rng
+        kind = r.randrange(5)
+        if kind == 0 and len(desc) > 10:                       # truncated by the bank
+            return desc[:r.randrange(8, len(desc))]
+        if kind == 1 and len(desc) > 4:                        # dropped character (typo)
+            i = r.randrange(1, len(desc) - 1)
+            return desc[:i] + desc[i + 1:]
+        if kind == 2:
+            return desc + r.choice(_NOISE_SUFFIXES)
+        if kind == 3:
+            return desc + f" #{r.randint(100, 99999)}" + r.choice(_LOCATIONS)
+        return desc.lower() if r.random() < 0.5 else desc.title()
+
+    def chunk(self, n: int) -> pd.DataFrame:
+        m = self.model
+        idx = self.rng.choice(len(m.templates), size=n, p=m.template_weights)
+        cats = m.template_categories[idx]
+        p_pos, mu, sigma = m.template_params[idx].T
+        mags = np.round(np.exp(self.rng.normal(mu, sigma)), 2)
+        amounts = np.where(self.rng.random(n) < p_pos, mags, -mags)
+
+        noisy = self.rng.random(n) < self.noise
+        descs = [self._fill_digits(m.templates[i]) for i in idx]
+        descs = [self._add_noise(d) if z else d for d, z in zip(descs, noisy)]
+
+        return pd.DataFrame({
+            "Date": self._dates(n),
+            "Description": descs,
+            "Amount": amounts,
+            "Category": cats,
+        })
+
+    def chunks(self, n_rows: int, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        remaining = int(n_rows)
+        while remaining > 0:
+            n = min(chunk_rows, remaining)
+            yield self.chunk(n)
+            remaining -= n
+
+    def to_first_layout(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert a chunk to the first.csv Deposits/Withdrawls/Balance layout."""
+        amounts = df["Amount"].to_numpy()
+        balances = self.balance + np.cumsum(amounts)
+        self.balance = float(balances[-1]) if len(balances) else self.balance
+        def fmt(v):
+            return f"{v:,.2f}" if v else "0"
+        return pd.DataFrame({
+            "Date": [d.strftime("%d-%b-%y") for d in df["Date"]],
+            "Description": df["Description"],
+            "Deposits": [fmt(a) if a > 0 else "0" for a in amounts],
+            "Withdrawls": [fmt(-a) if a < 0 else "0" for a in amounts],
+            "Balance": [fmt(b) for b in balances],
+        })
+
+
+def scaled_rows_per_day(model: TransactionModel, n_rows: int) -> float:
+    """The learned rows/day, raised so that n_rows span at most MAX_SPAN_DAYS."""
+    return max(model.rows_per_day, n_rows / MAX_SPAN_DAYS)
+
+
+def generate_frame(n_rows: int, seed: int = 42, noise: float = DEFAULT_NOISE, model: TransactionModel = None,
+                   rows_per_day: float = None) -> pd.DataFrame:
+    """In-memory convenience for small/medium sets (benchmarks, tests)."""
+    model = model or TransactionModel.fit()
+    gen = TransactionGenerator(model, seed=seed, noise=noise,
+                               rows_per_day=rows_per_day or scaled_rows_per_day(model, n_rows))
+    return pd.concat(list(gen.chunks(n_rows)), ignore_index=True)
+
+
+def write_dataset(path: str, n_rows: int, fmt: str = "csv", seed: int = 42, noise: float = DEFAULT_NOISE,
+                  chunk_rows: int = DEFAULT_CHUNK_ROWS, json_key: str = None, rows_per_day: float = None):
+    """Stream n_rows synthetic transactions to path in the given format."""
+    model = TransactionModel.fit()
+    gen = TransactionGenerator(model, seed=seed, noise=noise,
+                               rows_per_day=rows_per_day or scaled_rows_per_day(model, n_rows))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    if fmt in ("csv", "first"):
+        with open(path, "w", newline="") as f:
+            for i, chunk in enumerate(gen.chunks(n_rows, chunk_rows)):
+                if fmt == "first":
+                    chunk = gen.to_first_layout(chunk)
+                else:
+                    chunk["Date"] = [d.isoformat() for d in chunk["Date"]]
+                chunk.to_csv(f, index=False, header=(i == 0), quoting=csv.QUOTE_MINIMAL)
+
+    elif fmt == "json":
+        with open(path, "w") as f:
+            f.write("{" + json.dumps(json_key) + ": [" if json_key else "[")
+            first = True
+            for chunk in gen.chunks(n_rows, chunk_rows):
+                chunk["Date"] = [d.isoformat() for d in chunk["Date"]]
+                for rec in chunk.to_dict(orient="records"):
+                    f.write(("" if first else ",\n") + json.dumps(rec))
+                    first = False
+            f.write("]}" if json_key else "]")
+
+    elif fmt == "xlsx":
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise SystemExit("❌ xlsx output needs openpyxl: pip install openpyxl")
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Transactions")
+        ws.append(["Date", "Description", "Amount", "Category"])
+        for chunk in gen.chunks(n_rows, chunk_rows):
+            for row in chunk.itertuples(index=False):
+                ws.append([row.Date, row.Description, float(row.Amount), row.Category])
+        wb.save(path)
+
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic bank transactions")
+    parser.add_argument("--rows", type=int, required=True, help="number of rows to generate")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", required=True, help="output file path")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--noise", type=float, default=DEFAULT_NOISE, help="fraction of rows with noisy descriptions")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--rows-per-day", type=float, default=None,
+                        help=f"transactions per day (default: learned from the sample, raised so the rows span <= {MAX_SPAN_DAYS} days)")
+    parser.add_argument("--json-key", default=None,
+                        help='wrap JSON output as {"<key>": [...]}, e.g. "rows" for /nlp/refine or "transactions" for /savings/analyze')
+    args = parser.parse_args()
+
+    write_dataset(args.out, args.rows, fmt=args.format, seed=args.seed, noise=args.noise,
+                  chunk_rows=args.chunk_rows, json_key=args.json_key, rows_per_day=args.rows_per_day)
+    print(f"✅ Wrote {args.rows} synthetic transactions to {args.out} ({args.format})")
+
+
+if __name__ == "__main__":
+    main()
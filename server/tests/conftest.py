@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+@pytest.fixture(scope="session")
+def sample_transactions():
+    """The labelled 336-row sample statement shipped with the repo."""
+    return pd.read_csv(os.path.join(PROJECT_ROOT, "sample_transactions_1000.csv"))
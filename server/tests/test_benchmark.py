@@ -0,0 +1,12 @@
+import json
+
+import pandas as pd
+
+from server import benchmark
+
+
+def test_rate_is_null_when_batches_are_below_timer_resolution(monkeypatch):
+    monkeypatch.setattr(benchmark.time, "perf_counter", lambda: 1.0)
+    stats = benchmark._latency_stats(lambda chunk: None, pd.DataFrame({"Description": ["a", "b", "c"]}), 1, 10)
+    assert stats["batches"] == 3 and stats["rows_per_sec"] is None
+    json.dumps(stats, allow_nan=False)
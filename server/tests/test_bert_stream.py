@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from server import bert_stream
+
+
+class Interrupted(Exception):
+    pass
+
+
+def upper_labels(calls, fail_after=None):
+    def classify(chunk):
+        if fail_after is not None and len(calls) == fail_after:
+            raise Interrupted
+        calls.append(list(chunk))
+        return [text.upper() for text in chunk]
+    return classify
+
+
+def test_resume_classifies_only_the_rows_left(tmp_path):
+    descriptions = [f"row {i}" for i in range(10)]
+    path = bert_stream.progress_path(descriptions, "v1", str(tmp_path))
+
+    first = []
+    with pytest.raises(Interrupted):
+        bert_stream.classify_streaming(descriptions, upper_labels(first, fail_after=2), path, chunk_rows=3)
+    assert sum(map(len, first)) == 6
+
+    second = []
+    labels = bert_stream.classify_streaming(descriptions, upper_labels(second), path, chunk_rows=3)
+    assert labels.tolist() == [d.upper() for d in descriptions]
+    assert [text for chunk in second for text in chunk] == descriptions[6:]
+
+    bert_stream.discard_progress(path)
+    assert not os.path.exists(path)
+
+
+def test_a_line_cut_off_by_a_crash_is_classified_again(tmp_path):
+    descriptions = ["a", "b", "c"]
+    path = bert_stream.progress_path(descriptions, "v1", str(tmp_path))
+    with open(path, "w") as f:
+        f.write('"A"\n"B')  # the crash hit while "B" was being written
+
+    calls = []
+    labels = bert_stream.classify_streaming(descriptions, upper_labels(calls), path, chunk_rows=2)
+    assert labels.tolist() == ["A", "B", "C"] and calls == [["b", "c"]]
+    assert open(path).read() == '"A"\n"B"\n"C"\n'
+
+
+def test_progress_files_are_per_input_and_model():
+    base = bert_stream.progress_path(["a", "b"], "v1")
+    assert base != bert_stream.progress_path(["a", "c"], "v1")
+    assert base != bert_stream.progress_path(["a", "b"], "v2")
+    assert base == bert_stream.progress_path(["a", "b"], "v1")
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from server.cluster_model import DRIFT_LIMITS, ClusterModel, place_transactions
+
+
+@pytest.fixture(scope="module")
+def fitted(sample_transactions):
+    rows = sample_transactions.dropna(subset=["Description", "Category"]).reset_index(drop=True)
+    fit, new = rows.iloc[:240], rows.iloc[240:]
+    vec = TfidfVectorizer().fit(fit["Description"].astype(str))
+    categories = sorted(fit["Category"].unique())
+    empty = ClusterModel(vec, np.zeros((1, 1)), [0], [], categories)
+    X = empty.features(fit["Description"], fit["Category"])
+    kmeans = KMeans(n_clusters=8, n_init=4, random_state=0).fit(X)
+    labels = [f"cluster {i}" for i in range(8)]
+    return vec, kmeans, X, labels, categories, new
+
+
+def model(fitted):
+    vec, kmeans, X, labels, categories, _ = fitted
+    return ClusterModel.from_fit(vec, kmeans, X, labels, categories, meta={"script": "test"})
+
+
+def test_update_keeps_each_centroid_the_running_mean(fitted):
+    m = model(fitted)
+    new = fitted[-1]
+    X = m.features(new["Description"], new["Category"])
+    cluster, _ = m.assign(X)
+    start, counts = m.centroids.copy(), m.counts.copy()
+
+    half = X.shape[0] // 2
+    m.update(X[:half], cluster[:half])
+    m.update(X[half:], cluster[half:])
+
+    dense = X.toarray()
+    for c in range(m.n_clusters):
+        rows = dense[cluster == c]
+        expected = (start[c] * counts[c] + rows.sum(axis=0)) / (counts[c] + len(rows))
+        np.testing.assert_allclose(m.centroids[c], expected, atol=1e-12)
+    np.testing.assert_array_equal(m.counts, counts + np.bincount(cluster, minlength=m.n_clusters))
+    assert m.meta["rows_added"] == X.shape[0]
+
+
+def test_drift_flags_rows_the_clusters_no_longer_describe(fitted):
+    m = model(fitted)
+    new = fitted[-1]
+    X = m.features(new["Description"], new["Category"])
+    report = m.drift(X, m.assign(X)[1])
+    assert report["rows"] == len(new) and not report["needs_recluster"]
+
+    # the same merchants now filed under other categories: no centroid has that mix
+    moved = np.roll(new["Category"].values, 7)
+    X = m.features(new["Description"], moved)
+    shifted = m.drift(X, m.assign(X)[1])
+    assert shifted["outlier_rate"] > DRIFT_LIMITS["outlier_rate"] and shifted["needs_recluster"]
+
+    X = m.features([f"QXZV{i} WRPLK" for i in range(40)], ["Shopping"] * 40)
+    unknown = m.drift(X, m.assign(X)[1])
+    assert unknown["unknown_rate"] == 1.0 and unknown["needs_recluster"]
+
+
+def test_saved_model_assigns_like_the_fitted_one(fitted, tmp_path):
+    m = model(fitted)
+    path = str(tmp_path / "clusters.bundle")
+    m.save(path)
+    loaded = ClusterModel.load(path)
+
+    assert loaded.labels == m.labels and loaded.categories == m.categories
+    assert loaded.baseline == m.baseline and loaded.meta["script"] == "test"
+    np.testing.assert_array_equal(loaded.counts, m.counts)
+    new = fitted[-1]
+    X, X_loaded = m.features(new["Description"], new["Category"]), loaded.features(new["Description"], new["Category"])
+    assert (X != X_loaded).nnz == 0
+    cluster, d2 = m.assign(X)
+    np.testing.assert_array_equal(loaded.assign(X_loaded)[0], cluster)
+    np.testing.assert_allclose(loaded.assign(X_loaded)[1], d2)
+
+    placed, placed_cluster, _ = place_transactions(path, new["Description"], new["Category"])
+    np.testing.assert_array_equal(placed_cluster, cluster)
+    assert ClusterModel.load(path).meta["rows_added"] == len(new)
+    np.testing.assert_allclose(ClusterModel.load(path).centroids, placed.centroids)
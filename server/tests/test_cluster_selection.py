@@ -0,0 +1,24 @@
+import numpy as np
+from sklearn.metrics import silhouette_score
+
+from server.cluster_selection import weighted_silhouette
+
+
+def test_weighted_silhouette_equals_silhouette_of_the_expanded_rows():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(40, 5))
+    labels = rng.integers(0, 4, size=40)
+    labels[0] = 4  # a singleton cluster scores 0
+    weights = rng.integers(1, 6, size=40)
+    weights[0] = 1
+
+    expanded = np.repeat(np.arange(40), weights)
+    expected = silhouette_score(X[expanded], labels[expanded])
+    assert np.isclose(weighted_silhouette(X, labels, weights), expected)
+
+
+def test_unit_weights_reduce_to_silhouette_score():
+    rng = np.random.default_rng(1)
+    X = np.vstack([rng.normal(0, 1, (30, 3)), rng.normal(6, 1, (30, 3))])
+    labels = np.repeat([0, 1], 30)
+    assert np.isclose(weighted_silhouette(X, labels, np.ones(60)), silhouette_score(X, labels))
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import pytest
+
+from server import app as api
+from server import clustering
+from server.jobs import JobRunner
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(clustering, "CLUSTER_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(clustering, "_MEMORY", OrderedDict())
+    monkeypatch.setattr(api, "_CLUSTER_JOBS", JobRunner(name="test-clusters"))
+    return api.app.test_client()
+
+
+@pytest.fixture
+def statement(sample_transactions):
+    # categories come with the rows, so the cache key doesn't depend on the NLP model
+    rows = sample_transactions[["Description", "Amount", "Category"]].dropna().head(80)
+    return {"rows": rows.astype(str).to_dict(orient="records")}
+
+
+def finished(key, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = api._CLUSTER_JOBS.status(key)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {key} still {job['status']}")
+
+
+def other_worker(monkeypatch):
+    """Same cache directory, but none of this worker's jobs or in-memory results."""
+    monkeypatch.setattr(api, "_CLUSTER_JOBS", JobRunner(name="other-worker"))
+    monkeypatch.setattr(clustering, "_MEMORY", OrderedDict())
+
+
+def test_submit_poll_and_cached_repost(client, statement, tmp_path, monkeypatch):
+    gate = threading.Event()
+    def held(key, rows):
+        gate.wait(10)
+        return clustering.run_clustering(key, rows)
+    monkeypatch.setattr(api, "run_clustering", held)
+
+    resp = client.post("/clusters", json=statement)
+    assert resp.status_code == 202 and resp.json["status"] in ("queued", "running")
+    key = resp.json["job_id"]
+    assert key == clustering.dataset_key(clustering.prepare_rows(pd.DataFrame(statement["rows"])))
+    assert client.post("/clusters", json=statement).json["job_id"] == key  # shares the running job
+    assert os.path.exists(tmp_path / f"{key}.pending")
+
+    runner = api._CLUSTER_JOBS
+    other_worker(monkeypatch)
+    assert client.get(f"/clusters/{key}").status_code == 202
+    assert client.get(f"/clusters/{key}").json["status"] == "pending"
+
+    monkeypatch.setattr(api, "_CLUSTER_JOBS", runner)
+    gate.set()
+    assert finished(key)["status"] == "done"
+    resp = client.get(f"/clusters/{key}")
+    assert resp.status_code == 200 and resp.json["status"] == "done"
+    result = resp.json["result"]
+    assert result["key"] == key and len(result["labels"]) == len(statement["rows"])
+    assert os.path.exists(tmp_path / f"{key}.json") and not os.path.exists(tmp_path / f"{key}.pending")
+    assert key in clustering._MEMORY
+
+    # another worker answers from the disk copy without starting a job
+    other_worker(monkeypatch)
+    resp = client.post("/clusters", json=statement)
+    assert resp.status_code == 200 and resp.json["result"] == result
+    assert api._CLUSTER_JOBS.status(key) is None and key in clustering._MEMORY
+
+
+def test_failed_job_is_reported_by_every_worker(client, statement, tmp_path, monkeypatch):
+    working = clustering.cluster_transactions
+    def broken(rows):
+        raise ValueError("no usable descriptions")
+    monkeypatch.setattr(clustering, "cluster_transactions", broken)
+
+    key = client.post("/clusters", json=statement).json["job_id"]
+    assert finished(key)["status"] == "failed"
+    resp = client.get(f"/clusters/{key}")
+    assert resp.status_code == 500 and resp.json["error"] == "no usable descriptions"
+    assert (tmp_path / f"{key}.failed").read_text() == "no usable descriptions"
+    assert not os.path.exists(tmp_path / f"{key}.pending")
+
+    other_worker(monkeypatch)
+    resp = client.get(f"/clusters/{key}")
+    assert resp.status_code == 500 and resp.json == {"job_id": key, "status": "failed",
+                                                     "error": "no usable descriptions"}
+
+    # posting the statement again retries it
+    monkeypatch.setattr(clustering, "cluster_transactions", working)
+    assert client.post("/clusters", json=statement).status_code == 202
+    assert finished(key)["status"] == "done"
+    assert client.get(f"/clusters/{key}").status_code == 200
+    assert os.listdir(tmp_path) == [f"{key}.json"]
+
+
+def test_unknown_and_malformed_job_ids(client, tmp_path):
+    assert client.get(f"/clusters/{'0' * 32}").status_code == 404
+    assert client.get("/clusters/..%2F..%2Fsecrets").status_code == 404
+    assert client.post("/clusters", json={"rows": []}).status_code == 400
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,34 @@
+import numpy as np
+
+from server.embedding_cache import EmbeddingCache, cached_forward
+
+
+def recording_forward(calls):
+    def forward(texts):
+        calls.append(list(texts))
+        # output depends on the exact text, including case and digits
+        codes = np.array([[sum(map(ord, t)), len(t)] for t in texts], dtype=np.float32)
+        return codes, codes[:, ::-1] * 2
+    return forward
+
+
+def test_model_sees_original_text_without_a_cache():
+    calls = []
+    texts = ["STARBUCKS #1234", "starbucks #99", "STARBUCKS #1234"]
+    emb, logits = cached_forward(texts, recording_forward(calls))
+    assert calls == [["STARBUCKS #1234", "starbucks #99"]]
+    expected, _ = recording_forward([])(texts)
+    np.testing.assert_array_equal(emb, expected)
+
+
+def test_cache_keys_on_normalized_text_but_runs_first_original(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.bin"), dim=2, n_labels=2)
+    calls = []
+    forward = recording_forward(calls)
+    emb, _ = cached_forward(["STARBUCKS #1234", "starbucks #99", "UBER TRIP"], forward, cache)
+    assert calls == [["STARBUCKS #1234", "UBER TRIP"]]
+    assert np.array_equal(emb[0], emb[1])
+
+    again, _ = cached_forward(["Starbucks #5", "UBER TRIP"], forward, cache)
+    assert len(calls) == 1  # both served from the cache
+    np.testing.assert_array_equal(again, emb[[0, 2]])
@@ -0,0 +1,115 @@
+import glob
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from server import feature_store as fs
+from server.model_bundle import load_text_classifier, save_text_classifier, vectorizer_fingerprint
+
+
+def batch(rng, n, n_features=20):
+    keys = rng.integers(0, 2 ** 63, size=n, dtype=np.uint64)
+    return keys, sparse.random(n, n_features, density=0.2, format="csr", random_state=int(rng.integers(1 << 30)))
+
+
+def test_lookup_returns_added_rows_across_merges(tmp_path):
+    store = fs.FeatureStore(str(tmp_path), 20)
+    rng = np.random.default_rng(0)
+    added = [batch(rng, int(rng.integers(1, 60))) for _ in range(200)]
+    for keys, X in added:
+        store.add(keys, X)
+    for keys, X in added[::17]:
+        found, rows = store.lookup(keys)
+        assert found.all()
+        np.testing.assert_allclose(rows.toarray(), X.toarray(), rtol=1e-6)
+
+
+def test_merges_are_size_tiered(tmp_path, monkeypatch):
+    written = []
+    store = fs.FeatureStore(str(tmp_path), 20)
+    original = store._write_segment
+    monkeypatch.setattr(store, "_write_segment", lambda keys, X, stamp=None: (written.append(len(keys)),
+                                                                                original(keys, X, stamp))[1])
+    rng = np.random.default_rng(1)
+    n_rows = 0
+    for _ in range(400):
+        keys, X = batch(rng, 50)
+        store.add(keys, X)
+        n_rows += 50
+    store.wait_for_merges()
+    # a full-store merge every 17 flushes would rewrite ~n_rows^2 / 1700 rows; tiers keep it ~n_rows * log(n_rows)
+    assert sum(written) < 8 * n_rows
+    store._dir_sig = None
+    store._refresh()
+    assert len(store._segments) <= 3 * 5
+
+
+def test_add_leaves_merging_to_a_background_thread(tmp_path, monkeypatch):
+    store = fs.FeatureStore(str(tmp_path), 20)
+    merged_on = []
+    merge = store.merge
+    monkeypatch.setattr(store, "merge", lambda: (merged_on.append(threading.current_thread()), merge())[1])
+    rng = np.random.default_rng(3)
+    added = [batch(rng, 30) for _ in range(3 * fs.MERGE_FANOUT)]
+    for keys, X in added:
+        store.add(keys, X)
+    store.wait_for_merges()
+
+    assert merged_on and threading.current_thread() not in merged_on
+    assert len(glob.glob(os.path.join(str(tmp_path), "*" + fs.SEGMENT_SUFFIX))) < len(added)
+    for keys, X in added:
+        found, rows = store.lookup(keys)
+        assert found.all()
+        np.testing.assert_allclose(rows.toarray(), X.toarray(), rtol=1e-6)
+
+    inline = fs.FeatureStore(str(tmp_path / "inline"), 20, background_merge=False)
+    for keys, X in added:
+        inline.add(keys, X)
+    assert inline._merger is None and len(inline._segments) < len(added)
+
+
+def test_oldest_segments_are_dropped_past_max_rows(tmp_path):
+    store = fs.FeatureStore(str(tmp_path), 20, max_rows=2000)
+    rng = np.random.default_rng(2)
+    last = None
+    for _ in range(200):
+        last = batch(rng, 100)
+        store.add(*last)
+    store.wait_for_merges()
+    store._dir_sig = None
+    store._refresh()
+    assert len(store) < 2000 * 2
+    assert store.lookup(last[0])[0].all()
+
+
+def test_opening_a_store_leaves_other_layouts_alone(tmp_path):
+    for i in range(4):
+        fs.open_feature_store(f"vec{i}", 10, root=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 4
+
+
+def test_prune_layouts_keeps_the_current_and_recent_ones(tmp_path):
+    for i in range(5):
+        store = fs.open_feature_store(f"vec{i}", 10, root=str(tmp_path))
+        os.utime(store.directory, (i, i))
+    current = os.path.join(str(tmp_path), fs.layout_id("vec0", None))
+    removed = fs.prune_layouts("vec0", root=str(tmp_path), keep=2)
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(d) for d in
+                                                  [current] + [os.path.join(str(tmp_path), fs.layout_id(f"vec{i}", None))
+                                                               for i in (3, 4)])
+    assert len(removed) == 2
+
+
+def test_published_vectorizer_keeps_its_fingerprint(tmp_path):
+    texts = ["coffee shop", "coffee beans", "gas station", "gas refill", "grocery market", "grocery store"]
+    vec = TfidfVectorizer(ngram_range=(1, 2)).fit(texts)
+    clf = SGDClassifier(random_state=0).fit(vec.transform(texts), ["a", "a", "b", "b", "c", "c"])
+    path = str(tmp_path / "model.bundle")
+    save_text_classifier(path, vec, clf, kind="nlp_refiner")
+    loaded_vec = load_text_classifier(path)[0]
+    # retrain prunes by the candidate's fingerprint; workers open stores by the loaded one
+    assert vectorizer_fingerprint(loaded_vec) == vectorizer_fingerprint(vec)
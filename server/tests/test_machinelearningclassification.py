@@ -0,0 +1,48 @@
+import joblib
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from server import machinelearningclassification as mlc
+
+
+@pytest.fixture
+def artifact_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(mlc, "BUNDLE_PATH", str(tmp_path / "classifier.bundle"))
+    monkeypatch.setattr(mlc, "VEC_PATH", str(tmp_path / "vectorizer.pkl"))
+    monkeypatch.setattr(mlc, "MODEL_PATH", str(tmp_path / "model.pkl"))
+    monkeypatch.setattr(mlc, "_ARTIFACTS_LOADED", False)
+    monkeypatch.setattr(mlc, "_VECTORIZER", None)
+    monkeypatch.setattr(mlc, "_MODEL", None)
+    return tmp_path
+
+
+def write_pickles(sample_transactions, model):
+    vec = TfidfVectorizer().fit(sample_transactions["Description"])
+    model.fit(vec.transform(sample_transactions["Description"]), sample_transactions["Category"])
+    joblib.dump(vec, mlc.VEC_PATH)
+    joblib.dump(model, mlc.MODEL_PATH)
+    return vec, model
+
+
+def test_linear_pickles_are_migrated_into_a_bundle(artifact_dir, sample_transactions):
+    vec, model = write_pickles(sample_transactions, SGDClassifier(random_state=0))
+    preds = mlc.predict_categories(sample_transactions)
+    assert (artifact_dir / "classifier.bundle").exists()
+    assert preds.tolist() == model.predict(vec.transform(sample_transactions["Description"])).tolist()
+
+
+def test_pickles_that_cant_be_bundled_are_loaded_directly(artifact_dir, sample_transactions, capsys):
+    vec, model = write_pickles(sample_transactions, DecisionTreeClassifier(random_state=0))
+    preds = mlc.predict_categories(sample_transactions)
+    assert not (artifact_dir / "classifier.bundle").exists()
+    assert "loading the pickles directly" in capsys.readouterr().out
+    assert isinstance(mlc._MODEL, DecisionTreeClassifier)
+    assert preds.tolist() == model.predict(vec.transform(sample_transactions["Description"])).tolist()
+
+
+def test_no_artifacts_fall_back_to_rules(artifact_dir):
+    preds = mlc.predict_categories(pd.DataFrame({"Description": ["NETFLIX.COM"], "Amount": [-15]}))
+    assert preds.tolist() == ["Subscriptions"]
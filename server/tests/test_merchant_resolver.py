@@ -0,0 +1,55 @@
+import pytest
+
+from server.merchant_resolver import MerchantResolver, one_edit
+from server.spending_analyzer import MERCHANT_ALIASES
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return MerchantResolver(MERCHANT_ALIASES)
+
+
+@pytest.mark.parametrize("description, merchant", [
+    # exact aliases
+    ("WHOLEFDS MKT 10234", "WHOLE FOODS"),
+    ("MCDONALD'S F1234", "MCDONALDS"),
+    ("CHICK FIL A #1234", "CHICK-FIL-A"),
+    # misspelled: one edit, or close by trigrams
+    ("SQ *STARBUKS 1234", "STARBUCKS"),
+    ("KROGR FUEL #123", "KROGER"),
+    ("SAFEWY STORE 12", "SAFEWAY"),
+    ("TARGT 00012", "TARGET"),
+    ("NORDSTRM RACK", "NORDSTROM"),
+    ("AMAZN MKTP US", "AMAZON"),
+    # truncated
+    ("SQ *STARBU", "STARBUCKS"),
+    ("CHIPOTL 0123", "CHIPOTLE"),
+    ("WALGREEN #455", "WALGREENS"),
+    ("BURLINGTN STORES", "BURLINGTON"),
+])
+def test_hits(resolver, description, merchant):
+    assert resolver.resolve(description) == merchant
+
+
+@pytest.mark.parametrize("description", [
+    "TELEGRAPH AVE",      # common word close to TELEGRAM
+    "MARSHALL FIELD",     # a prefix of MARSHALLS followed by another word
+    "US MARSHALS SERVICE",
+    "TEAM SPORTS",        # TEAMS, SIGNAL, PILOT, MEDIUM only match exactly
+    "SIGNL",
+    "PILAT",
+    "MEDIUN",
+    "QUOTA",
+    "BLAZE PIZZA 12",     # shorter than PIZZA HUT and not at the end
+    "DELTA AIR",
+    "INTEREST PAYMENT",   # doesn't start like PINTEREST
+    "AMZN",
+])
+def test_misses(resolver, description):
+    assert resolver.resolve(description) is None
+
+
+def test_one_edit():
+    assert one_edit("KROGR", "KROGER") and one_edit("TARGT", "TARGET") and one_edit("STARBUKS", "STARBUCKS")
+    assert one_edit("SAFEWY", "SAFEWAY") and one_edit("MEDIUN", "MEDIUM")
+    assert not one_edit("KROGER", "KROGER") and not one_edit("TELEGRAPH", "TELEGRAM") and not one_edit("AB", "BA")
@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from server.microbatch import MicroBatcher
+
+
+def submit_all(batcher, items):
+    results = [None] * len(items)
+    errors = [None] * len(items)
+
+    def call(i):
+        try:
+            results[i] = batcher.submit(items[i])
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(items))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    return results, errors
+
+
+def test_concurrent_calls_share_batches_and_get_their_own_results():
+    batches = []
+
+    def run(items):
+        batches.append(len(items))
+        return [[x * 10 for x in item] for item in items]
+
+    batcher = MicroBatcher(run, max_batch=1000, max_wait_ms=50)
+    items = [[i, i + 1] for i in range(20)]
+    results, errors = submit_all(batcher, items)
+
+    assert errors == [None] * 20
+    assert results == [[x * 10 for x in item] for item in items]
+    assert sum(batches) == 20 and len(batches) < 20
+
+
+def test_a_full_batch_is_flushed_without_waiting():
+    batcher = MicroBatcher(lambda items: items, max_batch=1, max_wait_ms=10_000)
+    assert submit_all(batcher, [[1], [2], [3]])[0] == [[1], [2], [3]]
+    assert batcher.batches == 3
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    def fail(items):
+        raise ValueError("model unavailable")
+
+    _, errors = submit_all(MicroBatcher(fail, max_wait_ms=20), [[1], [2]])
+    assert all(isinstance(e, ValueError) for e in errors)
+
+    with pytest.raises(RuntimeError, match="results"):
+        MicroBatcher(lambda items: [], max_wait_ms=1).submit([1])
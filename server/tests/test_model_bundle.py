@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from server.model_bundle import (BundleError, load_text_classifier, open_bundle, save_text_classifier,
+                                 vectorizer_fingerprint, write_bundle)
+
+
+def test_arrays_labels_and_meta_round_trip(tmp_path):
+    path = str(tmp_path / "m.bundle")
+    arrays = {"a": np.arange(10, dtype=np.float32).reshape(2, 5), "b": np.array([3, 1, 2], dtype=np.int64),
+              "empty": np.zeros(0, dtype=np.uint8)}
+    manifest = write_bundle(path, "test", arrays, labels=["x", "y"], meta={"k": 1})
+
+    b = open_bundle(path)
+    assert b.kind == "test" and b.labels == ["x", "y"] and b.meta == {"k": 1}
+    assert b.version == manifest["model_version"]
+    for name, a in arrays.items():
+        np.testing.assert_array_equal(b.arrays[name], a)
+        assert b.arrays[name].dtype == a.dtype
+    b.arrays["a"][0, 0] = 99  # copy-on-write: the file is untouched
+    assert open_bundle(path).arrays["a"][0, 0] == 0
+    assert open_bundle(str(tmp_path / "missing.bundle")) is None
+
+
+def test_corrupt_and_truncated_files_are_rejected(tmp_path):
+    path = str(tmp_path / "m.bundle")
+    write_bundle(path, "test", {"a": np.arange(100, dtype=np.int64)})
+    raw = bytearray(open(path, "rb").read())
+    raw[-40] ^= 0xFF  # inside the array (the file ends in alignment padding)
+    open(path, "wb").write(bytes(raw))
+    with pytest.raises(BundleError, match="checksum"):
+        open_bundle(path)
+    open(path, "wb").write(bytes(raw[:-40]))
+    with pytest.raises(BundleError, match="truncated"):
+        open_bundle(path)
+    open(path, "wb").write(b"nope")
+    with pytest.raises(BundleError):
+        open_bundle(path)
+
+
+@pytest.mark.parametrize("vectorizer", [TfidfVectorizer(ngram_range=(1, 2)), HashingVectorizer(n_features=2 ** 12)])
+def test_text_classifier_round_trip(tmp_path, sample_transactions, vectorizer):
+    text = sample_transactions["Description"].astype(str)
+    vec = vectorizer.fit(text)
+    clf = SGDClassifier(random_state=0).fit(vec.transform(text), sample_transactions["Category"])
+    path = str(tmp_path / "clf.bundle")
+    save_text_classifier(path, vec, clf, kind="classifier", meta={"features": "text"})
+
+    l_vec, l_clf, labels, bundle = load_text_classifier(path)
+    assert labels == clf.classes_.tolist() and bundle.meta["features"] == "text"
+    assert vectorizer_fingerprint(l_vec) == vectorizer_fingerprint(vec)
+    np.testing.assert_array_equal(l_clf.predict(l_vec.transform(text)), clf.predict(vec.transform(text)))
+
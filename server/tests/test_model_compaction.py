@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from server import model_compaction as mc
+from server import retrain
+from server.embedding_cache import normalize_description
+from server.model_bundle import load_text_classifier, save_text_classifier, trainable
+
+
+def labelled_rows(sample_transactions):
+    df = sample_transactions[["Description", "Amount", "Category"]].dropna().reset_index(drop=True)
+    return df.assign(Source="feedback", Key=df["Description"].map(normalize_description))
+
+
+def test_low_precision_weights_are_served_as_stored(tmp_path, sample_transactions):
+    vec, clf, _ = retrain.train_candidate(labelled_rows(sample_transactions), search=False)
+    path = str(tmp_path / "model.bundle")
+    save_text_classifier(path, vec, clf, kind="nlp_refiner", meta=retrain.BUNDLE_META, weights_dtype="float16")
+
+    _, loaded, _, bundle = load_text_classifier(path)
+    assert bundle.arrays["classifier.coef"].dtype == np.float16
+    assert loaded.coef_.dtype == np.float16 and isinstance(loaded.coef_.base, np.memmap)
+    X = mc.featurize(vec, retrain.BUNDLE_META, sample_transactions)
+    assert (loaded.predict(X) == clf.predict(X)).mean() > 0.98
+    np.testing.assert_allclose(loaded.predict_proba(X), clf.predict_proba(X), atol=0.02)
+
+    trainable(loaded)  # partial_fit gets its own float64 weights; serving never does
+    assert loaded.coef_.dtype == np.float64 and loaded.intercept_.dtype == np.float64
+
+
+def test_compaction_evaluates_on_the_retrain_holdout(tmp_path, sample_transactions, monkeypatch):
+    rows = labelled_rows(sample_transactions)
+    monkeypatch.setattr(retrain, "collect_training_data", lambda *a, **k: rows)
+    vec, clf, _ = retrain.train_candidate(rows, search=False)
+    src, dst = str(tmp_path / "model.bundle"), str(tmp_path / "compact.bundle")
+    save_text_classifier(src, vec, clf, kind="nlp_refiner", meta=retrain.BUNDLE_META)
+
+    report = mc.compact_bundle(src, dst, keep=0.5, force=True)
+    assert report["eval_source"] == "retrain holdout"
+    assert report["eval_rows"] == int(retrain.holdout_mask(rows["Key"]).sum()) > 0
+    assert set(pd.unique(rows["Category"])) >= set(load_text_classifier(dst)[1].classes_)
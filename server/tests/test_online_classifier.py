@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from server.model_bundle import load_text_classifier, save_text_classifier
+from server.online_classifier import grow_classes, learn_online
+
+AMOUNT_BUCKETS = 8
+
+
+def amount_buckets(amounts):
+    v = pd.to_numeric(pd.Series(amounts), errors="coerce").fillna(0.0).values
+    cols = np.digitize(v, [-100, -25, -5, 5, 25, 100]).clip(0, AMOUNT_BUCKETS - 1)
+    return sparse.csr_matrix((np.ones(len(v)), (np.arange(len(v)), cols)), shape=(len(v), AMOUNT_BUCKETS))
+
+
+@pytest.fixture(scope="module")
+def fitted(sample_transactions):
+    df = sample_transactions
+    vec = TfidfVectorizer(stop_words="english", ngram_range=(1, 2)).fit(list(df["Description"]) + ["PETCO STORE"])
+
+    def features(desc, amounts):
+        return sparse.hstack([vec.transform(pd.Series(desc).astype(str)), amount_buckets(amounts)], format="csr")
+
+    clf = SGDClassifier(loss="log_loss", alpha=1e-5, random_state=0)
+    clf.fit(features(df["Description"], df["Amount"]), df["Category"])
+    return df, features, clf
+
+
+def test_new_class_does_not_take_over_other_rows(fitted):
+    df, features, clf = fitted
+    X = features(df["Description"], df["Amount"])
+    before = clf.predict(X)
+    shared = np.arange(X.shape[1] - AMOUNT_BUCKETS, X.shape[1])
+
+    grown = learn_online(clf, features(["PETCO STORE 12"], [-30]), ["Pets"], shared_columns=shared)
+
+    assert "Pets" in grown.classes_
+    np.testing.assert_array_equal(grown.predict(X), before)
+    assert grown.predict(features(["PETCO STORE 12", "PETCO 99"], [-30, -80])).tolist() == ["Pets", "Pets"]
+
+
+def test_learn_online_leaves_the_original_untouched(fitted):
+    df, features, clf = fitted
+    coef = clf.coef_.copy()
+    learn_online(clf, features(["PETCO STORE 12"], [-30]), ["Pets"])
+    np.testing.assert_array_equal(clf.coef_, coef)
+    assert "Pets" not in clf.classes_
+
+
+def test_grow_classes_expands_binary_models():
+    X = sparse.csr_matrix(np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 0.1], [0.1, 1.0]]))
+    clf = SGDClassifier(random_state=0).fit(X, ["a", "b", "a", "b"])
+    grown = grow_classes(clf, ["c"])
+    assert grown.classes_.tolist() == ["a", "b", "c"]
+    np.testing.assert_array_equal(grown.predict(X), clf.predict(X))
+    assert grown.intercept_[2] <= grown.intercept_[:2].min()
+
+
+
+def test_grown_classes_survive_a_round_trip(tmp_path, sample_transactions):
+    text = sample_transactions["Description"].astype(str)
+    vec = TfidfVectorizer().fit(text)
+    X = vec.transform(text)
+    clf = SGDClassifier(random_state=0).fit(X, sample_transactions["Category"])
+    grown = grow_classes(clf, ["Pets"])
+    path = str(tmp_path / "clf.bundle")
+    save_text_classifier(path, vec, grown, kind="classifier")
+
+    _, loaded, labels, _ = load_text_classifier(path)
+    assert "Pets" in labels and loaded.classes_.tolist() == sorted(set(clf.classes_) | {"Pets"}, key=str)
+    np.testing.assert_array_equal(loaded.predict(X), clf.predict(X))
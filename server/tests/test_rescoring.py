@@ -0,0 +1,68 @@
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from server.online_classifier import writable_copy
+from server.rescoring import ScoredLedger, ledger_path
+
+
+def test_sync_after_updates_matches_a_full_predict_and_predict_proba(tmp_path, sample_transactions):
+    text = sample_transactions["Description"].astype(str)
+    y = sample_transactions["Category"].astype(str).values
+    X = TfidfVectorizer(ngram_range=(1, 2)).fit_transform(text).tocsr()
+    keys = np.arange(X.shape[0], dtype=np.uint64) * 7919
+    fetch = lambda k: (np.ones(len(k), dtype=bool), X[(k // 7919).astype(np.int64)])
+
+    clf = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=0).fit(X, y)
+    ledger = ScoredLedger(ledger_path(str(tmp_path)))
+    ledger.sync(clf, fetch)
+    ledger.record(keys, clf, X)
+
+    rng = np.random.default_rng(0)
+    rescored = []
+    for _ in range(5):
+        clf = writable_copy(clf)
+        batch = rng.choice(X.shape[0], 8, replace=False)
+        clf.partial_fit(X[batch], rng.permutation(y[batch]))  # feedback that moves the weights
+        stats = ledger.sync(clf, fetch)
+        rescored.append(stats["rescored"])
+        found, labels, conf = ledger.lookup(keys)
+        assert found.all()
+        np.testing.assert_array_equal(labels, clf.predict(X))
+        stale = np.isnan(conf)
+        conf[stale] = ledger.refresh_confidence(keys[stale], clf, X[stale])
+        np.testing.assert_allclose(conf, clf.predict_proba(X).max(axis=1), rtol=1e-5)
+
+    assert min(rescored) < X.shape[0]  # the bound spared some rows
+    assert ledger.sync(clf, fetch) == {}
+
+
+def test_rows_the_store_lost_are_dropped():
+    X = sparse.csr_matrix(np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]))
+    clf = SGDClassifier(random_state=0).fit(X, ["a", "b", "a"])
+    ledger = ScoredLedger()
+    ledger.sync(clf, None)
+    ledger.record(np.array([1, 2, 3], dtype=np.uint64), clf, X)
+
+    grown = SGDClassifier(random_state=0).fit(X, ["a", "b", "c"])  # new class set: everything is re-scored
+    stats = ledger.sync(grown, lambda k: (k != 2, X[(k[k != 2] - 1).astype(np.int64)]))
+    assert stats["dropped"] == 1 and len(ledger) == 2
+    found, labels, _ = ledger.lookup(np.array([1, 3], dtype=np.uint64))
+    assert found.all() and labels.tolist() == grown.predict(X[[0, 2]]).tolist()
+
+
+def test_refreshed_confidence_is_kept_for_the_synced_model_only():
+    X = sparse.csr_matrix(np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]))
+    keys = np.array([1, 2, 3], dtype=np.uint64)
+    clf = SGDClassifier(loss="log_loss", random_state=0).fit(X, ["a", "b", "a"])
+    ledger = ScoredLedger()
+    ledger.sync(clf, None)
+    ledger.record(keys, clf, X)
+    ledger.cols["conf"][:] = np.nan
+
+    other = SGDClassifier(loss="log_loss", random_state=1).fit(X, ["a", "b", "b"])
+    ledger.refresh_confidence(keys, other, X)
+    assert np.isnan(ledger.lookup(keys)[2]).all()
+    ledger.refresh_confidence(keys, clf, X)
+    np.testing.assert_allclose(ledger.lookup(keys)[2], clf.predict_proba(X).max(axis=1), rtol=1e-5)
@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from server import retrain
+from server.embedding_cache import normalize_description
+from server.model_bundle import open_bundle, save_text_classifier
+
+
+def labelled_rows():
+    rows = [("STARBUCKS COFFEE {}", -5, "Dining"), ("SHELL OIL {}", -40, "Transportation"),
+            ("KROGER MARKET {}", -60, "Groceries"), ("NETFLIX COM {}", -15, "Subscriptions")]
+    # distinct words, not digits: the holdout split is by normalized description
+    places = [a + b for a in ("north", "south", "east", "west", "upper") for b in ("field", "town", "port", "ville")]
+    df = pd.DataFrame([(d.format(p), a, c) for d, a, c in rows for p in places],
+                      columns=["Description", "Amount", "Category"])
+    return df.assign(Source="feedback", Key=df["Description"].map(normalize_description))
+
+
+@pytest.fixture
+def bundle_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "nlp_refiner.bundle")
+    monkeypatch.setattr(retrain, "BUNDLE_PATH", path)
+    monkeypatch.setattr(retrain, "prune_layouts", lambda *a, **k: [])
+    monkeypatch.setattr(retrain, "collect_training_data", lambda *a, **k: labelled_rows())
+    return path
+
+
+def publish_seed(path, labels):
+    df = labelled_rows()
+    vec, clf, _ = retrain.train_candidate(df[df["Category"].isin(labels)], search=False)
+    clf = retrain.grow_classes(clf, labels)
+    save_text_classifier(path, vec, clf, kind="nlp_refiner", meta=dict(retrain.BUNDLE_META, generation=1))
+
+
+def test_previous_labels_survive_a_retrain(bundle_path):
+    publish_seed(bundle_path, ["Dining", "Transportation", "Pets"])  # Pets has no rows now
+    report = retrain.retrain_once(search=False, distill=False, min_gain=-1.0)
+    assert report["published"]
+    assert "Pets" in open_bundle(bundle_path).labels
+
+
+def test_model_published_during_training_is_not_overwritten(bundle_path, monkeypatch):
+    publish_seed(bundle_path, ["Dining", "Transportation"])
+    train_candidate = retrain.train_candidate
+    calls = []
+
+    def train_while_feedback_publishes(train, search=True):
+        calls.append(1)
+        if len(calls) == 1:  # learn_feedback publishes while the first candidate trains
+            save_text_classifier(bundle_path, *train_candidate(train, search=False)[:2], kind="nlp_refiner",
+                                 meta=dict(retrain.BUNDLE_META, generation=2, feedback=True))
+        return train_candidate(train, search=search)
+
+    monkeypatch.setattr(retrain, "train_candidate", train_while_feedback_publishes)
+    report = retrain.retrain_once(search=False, distill=False, min_gain=-1.0)
+    assert report["attempts"] == 2 and report["published"]
+    assert open_bundle(bundle_path).meta["generation"] == 3
+
+
+def test_gives_up_after_repeated_conflicts(bundle_path, monkeypatch):
+    publish_seed(bundle_path, ["Dining", "Transportation"])
+    train_candidate = retrain.train_candidate
+
+    def always_conflicting(train, search=True):
+        out = train_candidate(train, search=False)
+        save_text_classifier(bundle_path, *out[:2], kind="nlp_refiner", meta=dict(retrain.BUNDLE_META, generation=7))
+        return out
+
+    monkeypatch.setattr(retrain, "train_candidate", always_conflicting)
+    report = retrain.retrain_once(search=False, distill=False, min_gain=-1.0, attempts=2)
+    assert not report["published"] and report["attempts"] == 2
+    assert open_bundle(bundle_path).meta["generation"] == 7
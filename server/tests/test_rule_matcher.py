@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+
+from server.model_bundle import PROJECT_ROOT
+from server.train_from_csv import DEFAULT_CATEGORY, RuleMatcher, categorize_series, categorize_transaction
+
+
+def test_matches_the_row_wise_rules(sample_transactions):
+    descriptions = pd.concat([sample_transactions["Description"],
+                              pd.read_csv(os.path.join(PROJECT_ROOT, "descriptions.csv"))["Description"]],
+                             ignore_index=True)
+    expected = [categorize_transaction(d, 0) for d in descriptions]
+    assert categorize_series(descriptions).tolist() == expected
+
+
+def test_first_rule_wins_for_overlapping_keywords():
+    matcher = RuleMatcher([("Fuel", ["shell"]), ("Dining", ["shell oil cafe", "cafe"]), ("Shopping", ["oil"])])
+    out = matcher.categorize(pd.Series(["SHELL OIL CAFE", "OIL CAFE", "BOIL", "nothing here", None]))
+    assert out.tolist() == ["Fuel", "Dining", "Shopping", DEFAULT_CATEGORY, DEFAULT_CATEGORY]
+
+
+def test_empty_rules_label_everything_default():
+    assert RuleMatcher([]).categorize(pd.Series(["anything"])).tolist() == [DEFAULT_CATEGORY]
@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from server import rule_mining as rm
+from server.rescoring import ScoredLedger
+
+
+def feedback(*rows):
+    """rows of (description, category, times)"""
+    return pd.DataFrame([(d, c) for d, c, n in rows for _ in range(n)], columns=["Description", "Category"])
+
+
+def test_keys_need_support_and_precision():
+    rules = rm.mine_rules(feedback(
+        ("CHEWY.COM 800-672-4399", "Pets", 3),
+        ("BLUE BOTTLE COFFEE", "Dining", 2),    # below MIN_SUPPORT
+        ("METRO MARKET #12", "Groceries", 3),
+        ("METRO MARKET #40", "Dining", 1),      # 3 of 4 agree: below MIN_PRECISION
+    ))
+    assert {r["key"]: r["category"] for r in rules} == {"chewy": "Pets"}
+    assert rules[0]["support"] == 3 and rules[0]["precision"] == 1.0
+    assert rules[0]["confidence"] == pytest.approx(4 / 5)
+
+    relaxed = {r["key"]: r["category"] for r in rm.mine_rules(feedback(
+        ("BLUE BOTTLE COFFEE", "Dining", 2)), min_support=2)}
+    assert relaxed == {"blue": "Dining", "bottle": "Dining", "coffee": "Dining"}
+
+
+def test_merchant_key_is_dropped_when_one_of_its_words_is_a_rule():
+    rules = {r["key"]: r["category"] for r in rm.mine_rules(feedback(
+        ("SHELL OIL 5712", "Transportation", 3),
+        ("SHELL BEACH CAFE", "Dining", 3),
+    ))}
+    # "shell" is split between two categories; "oil" already settles "shell oil"
+    assert rules == {"oil": "Transportation", "beach": "Dining", "cafe": "Dining"}
+
+    rules = {r["key"]: r["category"] for r in rm.mine_rules(feedback(
+        ("SHELL OIL 5712", "Transportation", 3),
+        ("SHELL BEACH CAFE", "Dining", 3),
+        ("OIL CHANGE EXPRESS", "Auto", 3),
+    ))}
+    # with "oil" split too, only the merchant key tells the two apart
+    assert rules["shell oil"] == "Transportation" and "oil" not in rules and "shell" not in rules
+
+
+def test_later_correction_relabels_earlier_rows(tmp_path):
+    log = tmp_path / "feedback_log.csv"
+    rows = feedback(("TARGET 00012", "Shopping", 3), ("TARGET 00012", "Groceries", 1))
+    rows.assign(Amount=-12.5).to_csv(log, index=False)
+    path = str(tmp_path / "mined_rules.json")
+
+    rules = rm.mine_feedback_rules(str(log), path)
+    assert {r["key"]: r["category"] for r in rules} == {"target": "Groceries"}
+    assert rules[0]["support"] == 4 and rules[0]["precision"] == 1.0
+    assert len(rm.load_rules(path)) == 1
+
+
+def test_match_tries_rules_in_mined_order(tmp_path):
+    path = str(tmp_path / "mined_rules.json")
+    rm.save_rules(rm.mine_rules(feedback(
+        ("AMAZON MKTP US*1A2", "Shopping", 24),
+        ("AMAZON PRIME*2K4 MEMBERSHIP", "Subscriptions", 1),
+        ("PRIME VIDEO", "Subscriptions", 4),
+    )), path)
+    rules = rm.load_rules(path)
+    assert rules.rules[-1]["key"] == "amazon"  # 24 of 25: tried after every fully precise rule
+
+    desc = pd.Series(["AMAZON PRIME*2K4 MEMBERSHIP", "AMAZON MKTP US*1A2", "PRIMEAUX DENTAL", None], index=[3, 5, 7, 9])
+    cats, conf = rules.match(desc)
+    assert cats.tolist() == ["Subscriptions", "Shopping", None, None]
+    np.testing.assert_allclose(conf.values, [6 / 7, 25 / 26, np.nan, np.nan])
+    assert list(cats.index) == [3, 5, 7, 9]
+
+
+def test_load_rules_rejects_other_format_versions(tmp_path):
+    path = tmp_path / "mined_rules.json"
+    assert rm.load_rules(str(path)) is None
+    path.write_text(json.dumps({"format_version": rm.FORMAT_VERSION + 1, "rules": []}))
+    with pytest.raises(ValueError, match="unsupported mined-rules format"):
+        rm.load_rules(str(path))
+
+
+def test_mined_rule_overrides_the_model(sample_transactions, monkeypatch):
+    from server import nlp_refiner
+    from server import retrain
+    from server.embedding_cache import normalize_description
+
+    rows = sample_transactions[["Description", "Amount", "Category"]].dropna().reset_index(drop=True)
+    vec, clf, _ = retrain.train_candidate(rows.assign(Source="feedback", Key=rows["Description"].map(normalize_description)),
+                                          search=False)
+    monkeypatch.setattr(nlp_refiner, "_ACTIVE", (vec, clf, None, ScoredLedger(None)))
+    model = nlp_refiner.predict_descriptions(rows)
+
+    target = rows["Description"].iloc[0]
+    override = next(c for c in clf.classes_ if c != model["PredictedCategory"].iloc[0])
+    key = rm.merchant_text(target).split()[0]
+    rules = rm.MinedRules([{"key": key, "category": override, "support": 9, "precision": 1.0, "confidence": 0.9}])
+    monkeypatch.setattr(nlp_refiner, "_RULES", ("test", rules))
+    out = nlp_refiner.predict_descriptions(rows)
+
+    hit = rules.match(rows["Description"])[0].notna()
+    assert hit.iloc[0] and not hit.all()
+    assert (out.loc[hit, "PredictedCategory"] == override).all()
+    assert (out.loc[hit, "Confidence"] == 0.9).all()
+    pd.testing.assert_frame_equal(out[~hit], model[~hit])
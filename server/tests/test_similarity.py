@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from server import similarity as sim
+
+
+def batch(rng, n, n_features=50):
+    keys = rng.integers(0, 2 ** 63, size=n, dtype=np.uint64)
+    texts = [f"row {k}" for k in keys]
+    return keys, texts, sparse.random(n, n_features, density=0.1, format="csr", random_state=int(rng.integers(1 << 30)))
+
+
+def test_rows_added_by_one_process_are_seen_by_another(tmp_path):
+    path = sim.index_path(str(tmp_path))
+    writer, reader = sim.SimilarityIndex(path, 50), sim.SimilarityIndex(path, 50)
+    keys, texts, X = batch(np.random.default_rng(0), 30)
+    writer.add(keys, texts, X)
+
+    assert reader.contains(keys).all()
+    assert reader.similar(keys[0]) is not None
+    assert len(sim.SimilarityIndex(path, 50)) == len(keys)
+
+
+def test_compaction_keeps_every_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(sim, "MIN_TAIL_ROWS", 64)
+    path = sim.index_path(str(tmp_path))
+    writer, reader = sim.SimilarityIndex(path, 50), sim.SimilarityIndex(path, 50)
+    rng = np.random.default_rng(1)
+    added = []
+    for _ in range(20):
+        keys, texts, X = batch(rng, 10)
+        writer.add(keys, texts, X)
+        added.append(keys)
+        reader.contains(keys[:1])  # the reader follows along, across compactions
+    added = np.concatenate(added)
+
+    assert os.path.exists(path)
+    assert len(os.listdir(path + sim.DELTA_SUFFIX)) < 20
+    assert reader.contains(added).all() and len(reader) == len(added)
+    assert len(sim.SimilarityIndex(path, 50)) == len(added)
+
+
+def test_neighbours_match_brute_force_cosine(tmp_path, sample_transactions):
+    text = sample_transactions["Description"].astype(str).drop_duplicates().tolist()
+    X = TfidfVectorizer().fit_transform(text)
+    keys = sim.description_keys(text)
+    index = sim.SimilarityIndex(None, X.shape[1])
+    index.add(keys[:200], text[:200], X[:200])  # folded into the inverted index
+    index._fold()
+    index.add(keys[200:], text[200:], X[200:])  # left in the tail
+
+    Xn = sim._normalized(X)
+    cosine = (Xn @ Xn.T).toarray()
+    for row in range(0, len(text), 17):
+        got = index.similar(keys[row], k=5)
+        scores = np.delete(cosine[row], row)
+        expected = np.sort(scores[scores > 0])[::-1][:5]
+        np.testing.assert_allclose([s for _, _, s in got], expected, rtol=1e-5)
+        for key, desc, score in got:
+            assert np.isclose(cosine[row, text.index(desc)], score, rtol=1e-5)
+    assert index.similar(np.uint64(12345)) is None
@@ -0,0 +1,38 @@
+from datetime import date
+
+import pytest
+
+from server.synthetic_data import MAX_SPAN_DAYS, TransactionGenerator, TransactionModel, scaled_rows_per_day
+
+
+@pytest.fixture(scope="module")
+def model():
+    return TransactionModel.fit()
+
+
+def test_ten_million_rows_stay_within_the_span(model):
+    rate = scaled_rows_per_day(model, 10_000_000)
+    assert rate * MAX_SPAN_DAYS >= 10_000_000
+    gen = TransactionGenerator(model, rows_per_day=rate)
+    dates = gen._dates(200_000)
+    assert len(dates) == 200_000
+    assert (dates[-1] - dates[0]).days < 200_000 / rate * 2
+
+
+def test_small_sets_keep_the_learned_rate(model):
+    assert scaled_rows_per_day(model, 1000) == model.rows_per_day
+
+
+def test_dates_wrap_instead_of_overflowing(model):
+    # at the learned ~2 rows/day, 6M+ rows used to run past year 9999
+    gen = TransactionGenerator(model, rows_per_day=2.0, start_date=date(9998, 12, 1))
+    dates = gen._dates(5000) + gen._dates(5000)
+    assert len(dates) == 10_000
+    assert max(dates) <= date(9999, 1, 1)
+    assert min(dates) == date(9998, 12, 1)
+
+
+def test_chunks_continue_the_date_cursor(model):
+    gen = TransactionGenerator(model, seed=1)
+    first, second = gen.chunk(500), gen.chunk(500)
+    assert first["Date"].iloc[-1] <= second["Date"].iloc[0]
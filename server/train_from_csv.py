@@ -4,10 +4,11 @@ Train NLP model using the actual stmt.csv data with rule-based categorization
 """
 
 import os
+import re
 import sys
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
 from sklearn.linear_model import SGDClassifier
 from sklearn.pipeline import FeatureUnion
 from scipy import sparse
@@ -16,27 +17,20 @@ import joblib
 # Add the server directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-def categorize_transaction(description, amount):
-    """Rule-based categorization based on common patterns in bank statements"""
-    desc_lower = str(description).lower()
-    # Handle comma-separated numbers
-    try:
-        amount = float(str(amount).replace(',', '')) if amount else 0.0
-    except (ValueError, TypeError):
-        amount = 0.0
-    
-    # Income patterns
-    if any(word in desc_lower for word in ["payroll", "salary", "direct deposit", "deposit", "refund"]):
-        return "Income"
-    
-    # Transfer patterns
-    if any(word in desc_lower for word in ["transfer", "venmo", "zelle", "paypal"]):
-        return "Transfers"
-    
-    # Dining patterns
-    if any(word in desc_lower for word in [
-        "starbucks", "chipotle", "mcdonalds", "pizza", "restaurant", "dining", 
-        "burger", "taco", "subway", "kfc", "pizza hut", "dominos", "moe's", 
+try:
+    from .model_bundle import NLP_BUNDLE_NAME, save_text_classifier
+except ImportError:
+    from model_bundle import NLP_BUNDLE_NAME, save_text_classifier
+
+NLP_BUNDLE_META = {"features": "text+amount_bucket", "amount_buckets": 8}
+
+# Ordered keyword rules: the first category with a matching substring wins
+CATEGORY_RULES = [
+    ("Income", ["payroll", "salary", "direct deposit", "deposit", "refund"]),
+    ("Transfers", ["transfer", "venmo", "zelle", "paypal"]),
+    ("Dining", [
+        "starbucks", "chipotle", "mcdonalds", "pizza", "restaurant", "dining",
+        "burger", "taco", "subway", "kfc", "pizza hut", "dominos", "moe's",
         "blaze pizza", "chick-fil-a", "popeyes", "taco bell", "five guys",
         "honeygrow", "tribos", "olde queens", "golden rail", "huey's", "scarlet pub",
         "the ale n wich", "smashville", "tacoria", "nirvanis", "schnur meyer",
@@ -44,91 +38,203 @@ def categorize_transaction(description, amount):
         "cook cafe", "r u hungry", "hidden grounds", "woody's cafe", "veganized",
         "mr. tacos", "the baked bear", "shokudo", "evelyns", "n thai palace",
         "playa bowls", "insomnia cookies", "tuta ice cream", "cafe west", "16 handles"
-    ]):
-        return "Dining"
-    
-    # Shopping patterns
-    if any(word in desc_lower for word in [
+    ]),
+    ("Shopping", [
         "amazon", "target", "walmart", "macy's", "best buy", "costco", "marshalls",
         "ulta", "sephora", "forever21", "foot locker", "party city", "zara",
         "box lunch", "lids", "dollartree", "hmart", "delta", "perfume club",
         "new hair culture", "proskatenj", "sp nj skateshop", "fan treaspro"
-    ]):
-        return "Shopping"
-    
-    # Groceries patterns
-    if any(word in desc_lower for word in [
+    ]),
+    ("Groceries", [
         "grocery", "whole foods", "trader joe", "safeway", "kroger", "shoprite",
         "stop & shop", "acme", "wal-mart", "wal mart", "costco", "butler food",
         "knights deli", "easton deli", "jaike's fine foods", "dollar brunswick"
-    ]):
-        return "Groceries"
-    
-    # Transportation patterns
-    if any(word in desc_lower for word in [
+    ]),
+    ("Transportation", [
         "uber", "lyft", "gas", "fuel", "metro", "subway", "toll", "parking",
         "exxon", "shell", "bp", "chevron", "lukoil", "njt", "mta", "parkmobile",
         "veo", "jetblue", "delta", "flight", "airline"
-    ]):
-        return "Transportation"
-    
-    # Health patterns
-    if any(word in desc_lower for word in [
+    ]),
+    ("Health", [
         "pharmacy", "cvs", "walgreens", "doctor", "dental", "medical", "health",
         "gym", "fitness", "hospital", "clinic", "drug", "medicine"
-    ]):
-        return "Health"
-    
-    # Entertainment patterns
-    if any(word in desc_lower for word in [
+    ]),
+    ("Entertainment", [
         "netflix", "spotify", "hulu", "prime video", "cinema", "movie", "theater",
         "concert", "entertainment", "rutgers cinema", "amc", "yestercades"
-    ]):
-        return "Entertainment"
-    
-    # Utilities patterns
-    if any(word in desc_lower for word in [
+    ]),
+    ("Utilities", [
         "electric", "water", "gas bill", "utility", "internet", "wifi", "phone",
         "cable", "new brunswick municipal", "canteen vending"
-    ]):
-        return "Utilities"
-    
-    # Education patterns
-    if any(word in desc_lower for word in [
+    ]),
+    ("Education", [
         "rutgers", "university", "college", "school", "tuition", "education",
         "bookstore", "oak hall", "graduation", "cap gown"
-    ]):
-        return "Education"
-    
-    # Subscriptions patterns
-    if any(word in desc_lower for word in [
+    ]),
+    ("Subscriptions", [
         "subscription", "monthly", "annual", "recurring", "openai", "chatgpt",
         "linkedin", "premium", "membership"
-    ]):
-        return "Subscriptions"
-    
-    # Fees patterns
-    if any(word in desc_lower for word in [
-        "fee", "charge", "penalty", "overdraft", "atm", "service charge"
-    ]):
-        return "Fees"
-    
-    # Travel patterns
-    if any(word in desc_lower for word in [
-        "hotel", "airbnb", "travel", "vacation", "trip", "booking", "expedia"
-    ]):
-        return "Travel"
-    
-    # Housing patterns
-    if any(word in desc_lower for word in [
-        "rent", "landlord", "lease", "mortgage", "housing", "apartment"
-    ]):
-        return "Housing"
-    
-    # Default to uncategorized
-    return "Uncategorized"
+    ]),
+    ("Fees", ["fee", "charge", "penalty", "overdraft", "atm", "service charge"]),
+    ("Travel", ["hotel", "airbnb", "travel", "vacation", "trip", "booking", "expedia"]),
+    ("Housing", ["rent", "landlord", "lease", "mortgage", "housing", "apartment"]),
+]
+DEFAULT_CATEGORY = "Uncategorized"
+
+class RuleMatcher:
+    """
+    Compiled form of ordered keyword rules for vectorized labeling.
+
+    All keywords go into one prefix-trie regex scanned with a lookahead, so each
+    description is searched once (not once per category) and overlapping keywords
+    are all seen. Each keyword carries the best rule rank of any keyword contained
+    in it, which keeps first-match-wins semantics identical to the row-wise loop.
+    """
+
+    def __init__(self, rules, default=DEFAULT_CATEGORY):
+        rank = {}
+        for r, (_, words) in enumerate(rules):
+            for w in words:
+                rank.setdefault(w.lower(), r)
+        # a hit on keyword K implies a hit on every keyword that is a substring of K
+        self.rank = {k: min(r for w, r in rank.items() if w in k) for k in rank}
+        self.categories = np.array([cat for cat, _ in rules] + [default], dtype=object)
+        self.regex = re.compile("(?=(" + self._trie_pattern(self.rank) + "))") if self.rank else None
+
+    @staticmethod
+    def _trie_pattern(words):
+        trie = {}
+        for w in words:
+            node = trie
+            for ch in w:
+                node = node.setdefault(ch, {})
+            node[""] = True
+
+        def build(node):
+            # greedy: longer continuations are tried before ending at this node
+            end = "" in node
+            alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+            if not alts:
+                return ""
+            body = alts[0] if len(alts) == 1 and not end else "(?:" + "|".join(alts) + ")"
+            return body + ("?" if end else "")
+
+        return build(trie)
+
+    def ranks(self, texts):
+        """Rule rank per lowercased text (len(rules) when nothing matches)."""
+        none = len(self.categories) - 1
+        if self.regex is None:
+            return np.full(len(texts), none, dtype=np.int64)
+        find, rank = self.regex.findall, self.rank
+        return np.array([min((rank[m] for m in find(t) if m), default=none) for t in texts], dtype=np.int64)
+
+    def categorize(self, descriptions: pd.Series) -> pd.Series:
+        desc_lower = descriptions.fillna("").astype(str).str.lower()
+        # bank histories repeat the same descriptions, so match each distinct one once
+        codes, uniques = pd.factorize(desc_lower)
+        cats = self.categories[self.ranks(uniques)[codes]] if len(uniques) else np.array([], dtype=object)
+        return pd.Series(cats, index=descriptions.index)
+
+_RULE_MATCHER = RuleMatcher(CATEGORY_RULES)
+
+def categorize_transaction(description, amount):
+    """Rule-based categorization based on common patterns in bank statements"""
+    desc_lower = str(description).lower()
+    for category, words in CATEGORY_RULES:
+        if any(word in desc_lower for word in words):
+            return category
+    return DEFAULT_CATEGORY
+
+def categorize_series(descriptions: pd.Series) -> pd.Series:
+    """Vectorized categorize_transaction over a Series of descriptions (same labels)."""
+    return _RULE_MATCHER.categorize(descriptions)
+
+def amount_bucket(x: pd.Series) -> sparse.csr_matrix:
+    """One-hot amount bins, same layout as nlp_refiner._amount_bucket."""
+    v = x.values.reshape(-1, 1)
+    bins = np.digitize(v, [-100, -25, -5, 5, 25, 100])
+    n = v.shape[0]; k = 8
+    rows = np.repeat(np.arange(n), 1)
+    cols = bins.flatten().clip(0, k-1)
+    data = np.ones(n)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(n, k))
+
+# Search space: each vectorizer setting is one pool task that tries every classifier setting
+VECTORIZER_GRID = [
+    {"ngram_range": (1, 1), "min_df": 1, "max_features": 10000},
+    {"ngram_range": (1, 2), "min_df": 1, "max_features": 10000},
+    {"ngram_range": (1, 2), "min_df": 2, "max_features": 10000},
+    {"ngram_range": (1, 2), "min_df": 2, "max_features": 50000},
+]
+CLASSIFIER_GRID = [
+    {"alpha": 1e-5}, {"alpha": 1e-4}, {"alpha": 1e-3},
+]
+DEFAULT_CONFIG = ({"ngram_range": (1, 2), "min_df": 2, "max_features": 10000}, {"alpha": 1e-4})
+HOLDOUT_FRACTION = 0.2
+MIN_ROWS_FOR_SEARCH = 50
+
+def _build_vectorizer(params):
+    return TfidfVectorizer(lowercase=True, stop_words="english", **params)
+
+def _build_classifier(params):
+    return SGDClassifier(loss="log_loss", random_state=42, max_iter=1000, **params)
 
-def train_model_from_csv(csv_path):
+# Worker state, set once per process by the pool initializer instead of pickled per task
+_SPLIT = None
+
+def _init_search_worker(split):
+    global _SPLIT
+    _SPLIT = split
+
+def _evaluate_vectorizer(vec_params):
+    """Fit one vectorizer on the training split and score every classifier setting on the holdout."""
+    from sklearn.metrics import f1_score
+    d_train, a_train, y_train, d_test, a_test, y_test = _SPLIT
+    vectorizer = _build_vectorizer(vec_params)
+    try:
+        X_train = sparse.hstack([vectorizer.fit_transform(d_train), amount_bucket(a_train)], format="csr")
+    except ValueError:  # e.g. empty vocabulary for this min_df
+        return []
+    X_test = sparse.hstack([vectorizer.transform(d_test), amount_bucket(a_test)], format="csr")
+    results = []
+    for clf_params in CLASSIFIER_GRID:
+        clf = _build_classifier(clf_params).fit(X_train, y_train)
+        pred = clf.predict(X_test)
+        results.append({
+            "vectorizer": vec_params,
+            "classifier": clf_params,
+            "macro_f1": float(f1_score(y_test, pred, average="macro", zero_division=0)),
+            "accuracy": float((pred == y_test).mean()),
+        })
+    return results
+
+def search_hyperparameters(descriptions, amounts, categories, n_jobs=None):
+    """
+    Parallel grid search with a held-out split. Returns (best_result, all_results);
+    best is chosen by holdout macro-F1, ties broken by accuracy.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from sklearn.model_selection import train_test_split
+
+    stratify = categories if categories.value_counts().min() >= 2 else None
+    d_train, d_test, a_train, a_test, y_train, y_test = train_test_split(
+        descriptions, amounts, categories.values,
+        test_size=HOLDOUT_FRACTION, random_state=42, stratify=stratify,
+    )
+    split = (d_train, a_train, y_train, d_test, a_test, y_test)
+    n_jobs = n_jobs or min(len(VECTORIZER_GRID), os.cpu_count() or 1)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_search_worker, initargs=(split,)) as pool:
+        for batch in pool.map(_evaluate_vectorizer, VECTORIZER_GRID):
+            results.extend(batch)
+    if not results:
+        return None, []
+    best = max(results, key=lambda r: (r["macro_f1"], r["accuracy"]))
+    return best, results
+
+def train_model_from_csv(csv_path, search=True, n_jobs=None):
     """Train the NLP model using the CSV data"""
     
     # Read the CSV
@@ -141,7 +247,7 @@ def train_model_from_csv(csv_path):
     
     # Apply rule-based categorization
     print("Applying rule-based categorization...")
-    df['Category'] = df.apply(lambda row: categorize_transaction(row['Description'], row['Amount']), axis=1)
+    df['Category'] = categorize_series(df['Description'])
     
     # Show category distribution
     category_counts = df['Category'].value_counts()
@@ -152,31 +258,23 @@ def train_model_from_csv(csv_path):
     # Prepare training data
     descriptions = df['Description'].fillna("").astype(str)
     # Handle comma-separated amounts
-    amounts = df['Amount'].astype(str).str.replace(',', '').astype(float, errors='ignore').fillna(0.0)
+    amounts = pd.to_numeric(df['Amount'].astype(str).str.replace(',', ''), errors='coerce').fillna(0.0)
     categories = df['Category']
     
-    # Create vectorizer
-    vectorizer = TfidfVectorizer(
-        lowercase=True,
-        stop_words="english",
-        ngram_range=(1, 2),
-        min_df=2,
-        max_features=10000
-    )
-    
-    # Fit vectorizer
+    # Pick vectorizer/classifier settings on a held-out split
+    vec_params, clf_params = DEFAULT_CONFIG
+    if search and len(df) >= MIN_ROWS_FOR_SEARCH and categories.nunique() > 1:
+        print(f"\nSearching {len(VECTORIZER_GRID) * len(CLASSIFIER_GRID)} configurations...")
+        best, results = search_hyperparameters(descriptions, amounts, categories, n_jobs=n_jobs)
+        for r in sorted(results, key=lambda r: -r["macro_f1"]):
+            print(f"  macro-F1 {r['macro_f1']:.3f}  acc {r['accuracy']:.2%}  {r['vectorizer']} {r['classifier']}")
+        if best is not None:
+            vec_params, clf_params = best["vectorizer"], best["classifier"]
+            print(f"Best holdout macro-F1 {best['macro_f1']:.3f} (accuracy {best['accuracy']:.2%})")
+    
+    # Refit the chosen configuration on all rows
+    vectorizer = _build_vectorizer(vec_params)
     X_text = vectorizer.fit_transform(descriptions)
-    
-    # Create amount features
-    def amount_bucket(x):
-        v = x.values.reshape(-1, 1)
-        bins = np.digitize(v, [-100, -25, -5, 5, 25, 100])
-        n = v.shape[0]; k = 8
-        rows = np.repeat(np.arange(n), 1)
-        cols = bins.flatten().clip(0, k-1)
-        data = np.ones(n)
-        return sparse.csr_matrix((data, (rows, cols)), shape=(n, k))
-    
     X_amount = amount_bucket(amounts)
     
     # Combine features
@@ -185,26 +283,17 @@ def train_model_from_csv(csv_path):
     
     # Train classifier
     print("\nTraining classifier...")
-    clf = SGDClassifier(loss="log_loss", random_state=42, max_iter=1000)
+    clf = _build_classifier(clf_params)
     clf.fit(X, y)
     
     # Save the model
     model_dir = os.path.join(os.path.dirname(csv_path), "models")
     os.makedirs(model_dir, exist_ok=True)
     
-    vec_path = os.path.join(model_dir, "tfidf.pkl")
-    clf_path = os.path.join(model_dir, "sgd.pkl")
-    labels_path = os.path.join(model_dir, "labels.pkl")
+    bundle_path = os.path.join(model_dir, NLP_BUNDLE_NAME)
+    save_text_classifier(bundle_path, vectorizer, clf, kind="nlp_refiner", meta=NLP_BUNDLE_META)
     
-    joblib.dump(vectorizer, vec_path)
-    joblib.dump(clf, clf_path)
-    joblib.dump(list(category_counts.index), labels_path)
-    
-    print(f"\nModel saved to {model_dir}")
-    print("Files created:")
-    print(f"  - {vec_path}")
-    print(f"  - {clf_path}")
-    print(f"  - {labels_path}")
+    print(f"\nModel saved to {bundle_path}")
     
     # Test the model
     print("\nTesting model accuracy...")
@@ -214,11 +303,158 @@ def train_model_from_csv(csv_path):
     
     return vectorizer, clf, list(category_counts.index)
 
+# ---------- Out-of-core training ----------
+# Streams the CSV in chunks through a stateless featurizer (HashingVectorizer needs no
+# fitted vocabulary) and partial_fit, so memory stays flat regardless of history size.
+
+STREAM_CHUNK_ROWS = 100_000
+STREAM_HASH_FEATURES = 2 ** 20
+STREAM_VALIDATION_ROWS = 20_000
+STREAM_CHECKPOINT_EVERY = 5  # chunks between validation checkpoints
+
+def build_hashing_vectorizer(n_features=STREAM_HASH_FEATURES):
+    return HashingVectorizer(
+        lowercase=True,
+        stop_words="english",
+        ngram_range=(1, 2),
+        n_features=n_features,
+        alternate_sign=False,
+        norm="l2",
+    )
+
+def _stream_columns(csv_path, label_column):
+    header = pd.read_csv(csv_path, nrows=0).columns
+    if "Description" not in header:
+        raise ValueError(f"{csv_path} has no Description column")
+    if label_column and label_column not in header:
+        raise ValueError(f"{csv_path} has no {label_column} column")
+    return [c for c in ("Description", "Amount", label_column) if c and c in header]
+
+def _stream_chunks(csv_path, chunk_rows, label_column):
+    """Yield (descriptions, amounts, labels) per chunk; labels come from the rules when no label column."""
+    usecols = _stream_columns(csv_path, label_column)
+    for chunk in pd.read_csv(csv_path, usecols=usecols, chunksize=chunk_rows, on_bad_lines="skip"):
+        chunk = chunk.dropna(subset=["Description"] + ([label_column] if label_column else []))
+        descriptions = chunk["Description"].astype(str)
+        chunk = chunk[descriptions.str.strip() != ""]
+        descriptions = chunk["Description"].astype(str)
+        if "Amount" in chunk.columns:
+            amounts = pd.to_numeric(chunk["Amount"].astype(str).str.replace(",", ""), errors="coerce").fillna(0.0)
+        else:
+            amounts = pd.Series(0.0, index=chunk.index)
+        labels = chunk[label_column].astype(str) if label_column else categorize_series(descriptions)
+        yield descriptions, amounts, labels
+
+def _stream_classes(csv_path, chunk_rows, label_column):
+    if not label_column:
+        return sorted({cat for cat, _ in CATEGORY_RULES} | {DEFAULT_CATEGORY})
+    classes = set()
+    for chunk in pd.read_csv(csv_path, usecols=[label_column], chunksize=chunk_rows, on_bad_lines="skip"):
+        classes.update(chunk[label_column].dropna().astype(str).unique())
+    return sorted(classes)
+
+def train_model_streaming(csv_path, model_dir=None, label_column=None, chunk_rows=STREAM_CHUNK_ROWS,
+                          epochs=1, checkpoint_every=STREAM_CHECKPOINT_EVERY, use_amount=True,
+                          alpha=1e-4, pipeline_path=None):
+    """
+    Out-of-core training: one pass (per epoch) over csv_path in chunks of chunk_rows.
+
+    A seeded, capped sample of rows (at most STREAM_VALIDATION_ROWS) is held out as
+    they stream past. Every checkpoint_every chunks the model is scored on it and the
+    artifacts are written only when holdout macro-F1 improves, so the files on disk
+    are always the best checkpoint so far.
+
+    Artifacts: the nlp_refiner model bundle in model_dir, or a
+    text-only sklearn Pipeline at pipeline_path when use_amount is False.
+    """
+    from sklearn.metrics import f1_score
+    from sklearn.pipeline import Pipeline
+
+    model_dir = model_dir or os.path.join(os.path.dirname(os.path.abspath(csv_path)), "models")
+    os.makedirs(model_dir, exist_ok=True)
+    classes = np.array(_stream_classes(csv_path, chunk_rows, label_column), dtype=object)
+    print(f"Streaming {csv_path} in chunks of {chunk_rows} rows ({len(classes)} classes)")
+
+    vectorizer = build_hashing_vectorizer()
+    clf = _build_classifier({"alpha": alpha})
+
+    def featurize(descriptions, amounts):
+        X_text = vectorizer.transform(descriptions)
+        return sparse.hstack([X_text, amount_bucket(amounts)], format="csr") if use_amount else X_text
+
+    def save():
+        if pipeline_path:
+            joblib.dump(Pipeline([("hash", vectorizer), ("clf", clf)]), pipeline_path)
+        else:
+            save_text_classifier(os.path.join(model_dir, NLP_BUNDLE_NAME), vectorizer, clf,
+                                 kind="nlp_refiner", meta=NLP_BUNDLE_META)
+
+    X_val, y_val = [], []
+    n_val = 0
+    hold_limits = []  # per chunk: cap on held-out rows, replayed in later epochs
+    best_f1 = -1.0
+    rows_seen = 0
+
+    def checkpoint(tag):
+        nonlocal best_f1
+        if not hasattr(clf, "coef_"):
+            return
+        if n_val == 0:
+            save()
+            print(f"  [{tag}] {rows_seen} rows trained (no holdout), checkpoint saved")
+            return
+        X, y = sparse.vstack(X_val, format="csr"), np.concatenate(y_val)
+        pred = clf.predict(X)
+        f1 = float(f1_score(y, pred, average="macro", zero_division=0))
+        improved = f1 > best_f1
+        if improved:
+            best_f1 = f1
+            save()
+        print(f"  [{tag}] {rows_seen} rows trained, holdout macro-F1 {f1:.3f}, "
+              f"accuracy {(pred == y).mean():.2%}{' (saved)' if improved else ''}")
+
+    for epoch in range(epochs):
+        for chunk_idx, (descriptions, amounts, labels) in enumerate(_stream_chunks(csv_path, chunk_rows, label_column)):
+            X = featurize(descriptions, amounts)
+            y = labels.values
+            # same seed per chunk index → the same rows are held out in every epoch
+            hold = np.random.default_rng([42, chunk_idx]).random(len(y)) < HOLDOUT_FRACTION
+            if epoch == 0:
+                hold_limits.append(STREAM_VALIDATION_ROWS - n_val)
+            hold &= np.cumsum(hold) <= hold_limits[chunk_idx]
+            if epoch == 0 and hold.any():
+                X_val.append(X[hold])
+                y_val.append(y[hold])
+                n_val += int(hold.sum())
+            if (~hold).any():
+                clf.partial_fit(X[~hold], y[~hold], classes=classes)
+                rows_seen += int((~hold).sum())
+            if (chunk_idx + 1) % checkpoint_every == 0:
+                checkpoint(f"epoch {epoch + 1}, chunk {chunk_idx + 1}")
+        checkpoint(f"epoch {epoch + 1} end")
+
+    print(f"\nBest holdout macro-F1: {best_f1:.3f}" if n_val else "\nTrained without holdout")
+    print(f"Model saved to {pipeline_path or model_dir}")
+    return vectorizer, clf, list(classes)
+
 if __name__ == "__main__":
-    # Train using the stmt.csv file
-    csv_path = os.path.join(os.path.dirname(__file__), "..", "stmt.csv")
-    if os.path.exists(csv_path):
-        train_model_from_csv(csv_path)
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the NLP model from a bank statement CSV")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(os.path.dirname(__file__), "..", "stmt.csv"))
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes for the hyper-parameter search")
+    parser.add_argument("--no-search", action="store_true", help="skip the search and use the default settings")
+    parser.add_argument("--streaming", action="store_true", help="out-of-core training for files too large to load")
+    parser.add_argument("--label-column", default=None, help="train on this column instead of rule labels (streaming)")
+    parser.add_argument("--chunk-rows", type=int, default=STREAM_CHUNK_ROWS)
+    parser.add_argument("--epochs", type=int, default=1)
+    args = parser.parse_args()
+
+    # Train using the stmt.csv file by default
+    csv_path = args.csv_path
+    if os.path.exists(csv_path) and args.streaming:
+        train_model_streaming(csv_path, label_column=args.label_column, chunk_rows=args.chunk_rows, epochs=args.epochs)
+    elif os.path.exists(csv_path):
+        train_model_from_csv(csv_path, search=not args.no_search, n_jobs=args.jobs)
     else:
         print(f"CSV file not found at {csv_path}")
         print("Please make sure stmt.csv is in the project root directory")
@@ -7,6 +7,22 @@ from typing import List, Dict, Optional
 from urllib.parse import quote_plus
 import json
 
+try:
+    from .merchant_resolver import MerchantResolver
+except ImportError:
+    from merchant_resolver import MerchantResolver
+
+# Deal sources per merchant kind, checked in this order
+MERCHANT_DEAL_KINDS = {
+    'restaurant': ['CHIPOTLE', 'STARBUCKS', 'MCDONALDS', 'SUBWAY', 'PIZZA HUT', 'CHICK-FIL-A', 'TACO BELL', 'BURGER KING', 'WENDYS', 'KFC', 'DOMINOS'],
+    'grocery': ['WALMART', 'TARGET', 'COSTCO', 'WHOLE FOODS', 'TRADER JOES', 'SAFEWAY', 'KROGER', 'SHOPRITE', 'STOP & SHOP'],
+    'online': ['AMAZON', 'MACYS', 'BEST BUY', 'SEPHORA', 'ULTA', 'NORDSTROM', 'KOHLS'],
+    'transportation': ['UBER', 'LYFT', 'SHELL', 'EXXON', 'BP', 'CHEVRON'],
+    'entertainment': ['NETFLIX', 'SPOTIFY', 'AMAZON PRIME', 'HULU', 'DISNEY+'],
+}
+_DEAL_KIND = {name: kind for kind, names in MERCHANT_DEAL_KINDS.items() for name in names}
+_DEAL_RESOLVER = MerchantResolver({name: [name] for name in _DEAL_KIND})
+
 class WebScraper:
     def __init__(self):
         self.headers = {
@@ -313,27 +329,22 @@ class WebScraper:
         merchant_upper = merchant.upper()
         
         try:
-            # Restaurant-specific scraping
-            if any(restaurant in merchant_upper for restaurant in ['CHIPOTLE', 'STARBUCKS', 'MCDONALDS', 'SUBWAY', 'PIZZA HUT', 'CHICK-FIL-A', 'TACO BELL', 'BURGER KING', 'WENDYS', 'KFC', 'DOMINOS']):
-                deals.extend(self._scrape_restaurant_deals_realtime(merchant, avg_amount))
+            # Known merchant, exact or fuzzy ("STARBUKS", "WHOLEFDS"); earlier kinds win
+            known = _DEAL_RESOLVER.resolve(merchant_upper)
+            kind = _DEAL_KIND.get(known, 'generic')
+            if known and known not in merchant_upper:
+                merchant = known  # misspelled: the per-merchant deal lookups match the canonical name
             
-            # Grocery store scraping
-            elif any(store in merchant_upper for store in ['WALMART', 'TARGET', 'COSTCO', 'WHOLE FOODS', 'TRADER JOES', 'SAFEWAY', 'KROGER', 'SHOPRITE', 'STOP & SHOP']):
+            if kind == 'restaurant':
+                deals.extend(self._scrape_restaurant_deals_realtime(merchant, avg_amount))
+            elif kind == 'grocery':
                 deals.extend(self._scrape_grocery_deals_realtime(merchant, avg_amount))
-            
-            # Online shopping scraping
-            elif any(store in merchant_upper for store in ['AMAZON', 'MACYS', 'BEST BUY', 'SEPHORA', 'ULTA', 'NORDSTROM', 'KOHLS']):
+            elif kind == 'online':
                 deals.extend(self._scrape_online_deals_realtime(merchant, avg_amount))
-            
-            # Transportation scraping
-            elif any(service in merchant_upper for service in ['UBER', 'LYFT', 'SHELL', 'EXXON', 'BP', 'CHEVRON']):
+            elif kind == 'transportation':
                 deals.extend(self._scrape_transportation_deals_realtime(merchant, avg_amount))
-            
-            # Entertainment streaming scraping
-            elif any(service in merchant_upper for service in ['NETFLIX', 'SPOTIFY', 'AMAZON PRIME', 'HULU', 'DISNEY+']):
+            elif kind == 'entertainment':
                 deals.extend(self._scrape_entertainment_deals_realtime(merchant, avg_amount))
-            
-            # Generic merchant scraping
             else:
                 deals.extend(self._scrape_generic_merchant_deals(merchant, total_spent, avg_amount))
                 
@@ -1,45 +1,103 @@
-import pandas as pd
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
-from datasets import Dataset
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer
+from datasets import DatasetDict, load_dataset, load_from_disk
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer, DataCollatorWithPadding
 import torch
 import numpy as np
-
-# Load data
-df = pd.read_csv("descriptions.csv").dropna(subset=["Description", "Category"])
-df = df.sample(frac=1, random_state=42)  # shuffle
-
-# Encode labels
-le = LabelEncoder()
-df["label"] = le.fit_transform(df["Category"])
-
-# Train-test split (stratify to keep balanced classes)
-train_texts, val_texts, train_labels, val_labels = train_test_split(
-    df["Description"].tolist(),
-    df["label"].tolist(),
-    test_size=0.2,
-    stratify=df["label"],
-    random_state=42,
+import argparse
+import hashlib
+import json
+import os
+import time
+
+MAX_LENGTH = 128
+TOKENIZED_CACHE_DIR = "./tokenized_cache"
+
+# Data-parallel CPU training: launch several local processes with torchrun, e.g.
+#   torchrun --standalone --nproc_per_node=4 trainBertclassifier.py
+# Each process trains on its shard of every batch and gradients are all-reduced over gloo.
+# A plain `python trainBertclassifier.py` still trains in a single process.
+parser = argparse.ArgumentParser(description="Fine-tune BERT on descriptions.csv")
+parser.add_argument("--data", default="descriptions.csv", help="labelled CSV with Description and Category columns")
+parser.add_argument("--output-dir", default="./bert_expense_classifier")
+parser.add_argument("--epochs", type=float, default=3)
+parser.add_argument("--metrics-out", default=None, help="write training metrics JSON here (rank 0)")
+parser.add_argument("--label-encoder-out", default="label_encoder.joblib",
+                    help="label encoder read by the root clustering/classification scripts")
+args = parser.parse_args()
+
+WORLD_SIZE = int(os.environ.get("WORLD_SIZE", 1))
+# torchrun pins OMP threads to 1 per process; split the cores between ranks instead
+torch.set_num_threads(int(os.environ.get("BERT_THREADS_PER_PROC", max(1, (os.cpu_count() or 1) // WORLD_SIZE))))
+
+# Training args (created early so ranks can coordinate the data preparation step)
+training_args = TrainingArguments(
+    output_dir=args.output_dir,
+    evaluation_strategy="epoch",   # evaluate once per epoch
+    save_strategy="epoch",          # save checkpoint once per epoch (must match evaluation_strategy)
+    learning_rate=2e-5,
+    per_device_train_batch_size=16,
+    per_device_eval_batch_size=32,
+    num_train_epochs=args.epochs,
+    weight_decay=0.01,
+    save_total_limit=1,
+    load_best_model_at_end=True,
+    metric_for_best_model="accuracy",
+    group_by_length=True,           # batch rows of similar length together → minimal padding
+    length_column_name="length",
+    use_cpu=True,
+    ddp_backend="gloo" if WORLD_SIZE > 1 else None,
 )
 
-# Create Hugging Face datasets
-train_dataset = Dataset.from_dict({"text": train_texts, "label": train_labels})
-val_dataset = Dataset.from_dict({"text": val_texts, "label": val_labels})
-
 # Load tokenizer and model
 model_name = "bert-base-uncased"
 tokenizer = AutoTokenizer.from_pretrained(model_name)
 
+# No padding here: bank descriptions are ~8-20 tokens, so each batch is padded only to
+# its own longest row by the collator below. "length" feeds the length-grouped sampler.
 def tokenize_function(examples):
-    return tokenizer(examples["text"], padding="max_length", truncation=True, max_length=128)
+    enc = tokenizer(examples["text"], truncation=True, max_length=MAX_LENGTH)
+    enc["length"] = [len(ids) for ids in enc["input_ids"]]
+    return enc
+
+def file_digest(path, chunk_bytes=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_bytes), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# The CSV is never loaded as a DataFrame: datasets converts it chunk by chunk into an
+# on-disk, memory-mapped Arrow table, and label encoding, the stratified split and
+# tokenization all run over that table batch by batch, so memory stays flat however
+# large the history is. The tokenized splits are saved keyed by the file contents and
+# tokenizer settings, so re-runs skip all of it.
+fingerprint = hashlib.sha1(repr((model_name, MAX_LENGTH, file_digest(args.data))).encode("utf-8")).hexdigest()[:16]
+cache_path = os.path.join(TOKENIZED_CACHE_DIR, fingerprint)
+# rank 0 prepares and saves; the other ranks wait, then load the saved copy
+with training_args.main_process_first(desc="tokenization"):
+    if os.path.isdir(cache_path):
+        tokenized = load_from_disk(cache_path)
+        print(f"✅ Loaded tokenized dataset from {cache_path}")
+    else:
+        t0 = time.perf_counter()
+        raw = load_dataset("csv", data_files=args.data, usecols=["Description", "Category"], dtype=str, split="train")
+        raw = raw.filter(lambda b: [bool(d) and bool(c) for d, c in zip(b["Description"], b["Category"])],
+                         batched=True)
+        # ClassLabel ids follow the sorted category names, the same order LabelEncoder uses
+        raw = raw.class_encode_column("Category").rename_columns({"Description": "text", "Category": "label"})
+        # Train-test split (stratify to keep balanced classes)
+        split = raw.train_test_split(test_size=0.2, stratify_by_column="label", seed=42)
+        tokenized = DatasetDict({"train": split["train"], "validation": split["test"]}).map(
+            tokenize_function, batched=True, remove_columns=["text"])
+        tokenized.save_to_disk(cache_path)
+        print(f"✅ Tokenized in {time.perf_counter() - t0:.1f}s, saved to {cache_path}")
 
-train_dataset = train_dataset.map(tokenize_function, batched=True)
-val_dataset = val_dataset.map(tokenize_function, batched=True)
+# Encode labels
+le = LabelEncoder().fit(tokenized["train"].features["label"].names)
 
-# Set format for PyTorch
-train_dataset.set_format("torch", columns=["input_ids", "attention_mask", "label"])
-val_dataset.set_format("torch", columns=["input_ids", "attention_mask", "label"])
+train_dataset = tokenized["train"]
+val_dataset = tokenized["validation"]
+data_collator = DataCollatorWithPadding(tokenizer=tokenizer)
 
 # Load pretrained model with classification head
 num_labels = len(le.classes_)
@@ -52,22 +110,6 @@ def compute_metrics(eval_pred):
     accuracy = (predictions == labels).mean()
     return {"accuracy": accuracy}
 
-# Training args
-training_args = TrainingArguments(
-    output_dir="./bert_expense_classifier",
-    evaluation_strategy="epoch",   # evaluate once per epoch
-    save_strategy="epoch",          # save checkpoint once per epoch (must match evaluation_strategy)
-    learning_rate=2e-5,
-    per_device_train_batch_size=16,
-    per_device_eval_batch_size=32,
-    num_train_epochs=3,
-    weight_decay=0.01,
-    save_total_limit=1,
-    load_best_model_at_end=True,
-    metric_for_best_model="accuracy",
-)
-
-
 # Trainer
 trainer = Trainer(
     model=model,
@@ -75,15 +117,30 @@ trainer = Trainer(
     train_dataset=train_dataset,
     eval_dataset=val_dataset,
     compute_metrics=compute_metrics,
+    data_collator=data_collator,
 )
 
 # Train
-trainer.train()
-
-# Save model and label encoder
-model.save_pretrained("./bert_expense_classifier")
-tokenizer.save_pretrained("./bert_expense_classifier")
-
-import joblib
-joblib.dump(le, "label_encoder.joblib")
-print("✅ Saved model and label encoder")
+train_result = trainer.train()
+metrics = train_result.metrics
+print(f"⚡ Training throughput: {metrics.get('train_samples_per_second', 0):.1f} samples/sec "
+      f"({metrics.get('train_runtime', 0):.1f}s for {len(train_dataset)} rows x {training_args.num_train_epochs} epochs)")
+
+# Save one consolidated checkpoint (all ranks hold identical weights after gradient sync)
+if trainer.is_world_process_zero():
+    model.save_pretrained(args.output_dir)
+    tokenizer.save_pretrained(args.output_dir)
+
+    from server.model_bundle import LABELS_BUNDLE_NAME, save_labels
+    save_labels(os.path.join(args.output_dir, LABELS_BUNDLE_NAME), le.classes_, meta={"base_model": model_name})
+
+    import joblib
+    joblib.dump(le, args.label_encoder_out)
+    print("✅ Saved model and label encoder")
+
+if args.metrics_out:
+    # evaluate() gathers predictions from every rank, so all of them must call it
+    eval_metrics = trainer.evaluate()
+    if trainer.is_world_process_zero():
+        with open(args.metrics_out, "w") as f:
+            json.dump({"world_size": WORLD_SIZE, "train": metrics, "eval": eval_metrics}, f, indent=2)
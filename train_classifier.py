@@ -7,6 +7,20 @@ from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 import joblib
+import sys
+
+# Out-of-core mode for histories too large to load into memory:
+#   python train_classifier.py --streaming [path/to/descriptions.csv]
+if "--streaming" in sys.argv:
+    from server.train_from_csv import train_model_streaming
+    args = [a for a in sys.argv[1:] if a != "--streaming"]
+    train_model_streaming(
+        args[0] if args else "descriptions.csv",
+        label_column="Category",
+        use_amount=False,
+        pipeline_path="transaction_classifier.joblib",
+    )
+    sys.exit(0)
 
 # Load and clean data
 df = pd.read_csv("descriptions.csv")